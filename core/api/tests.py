@@ -1,3 +1,140 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from unittest import mock
+
+from django.contrib.auth.models import User
+
+from files.models import ConversionEvent, FileChange, Notification, UploadedFile, UserActivity
+from files.notifications import apply_action, notify_users
+from files.telemetry import record_conversion
+from files.tests import FilesTestCase
+
+
+# -------------------------
+# Change feed
+# -------------------------
+class ChangeFeedTests(FilesTestCase):
+    def feed(self, **params):
+        return self.client.get('/api/changes/', params)
+
+    def test_feed_lists_every_change_in_order(self):
+        file_obj = self.upload()
+        self.client.post(f'/{file_obj.pk}/comment/', {'text': 'hi'})
+        self.edit(file_obj, 'changed')
+        self.client.post(f'/{file_obj.pk}/delete/')
+
+        data = self.feed().json()
+        self.assertEqual(
+            [change['action'] for change in data['changes']],
+            ['created', 'commented', 'edited', 'deleted'],
+        )
+        self.assertEqual({change['file'] for change in data['changes']}, {file_obj.pk})
+        self.assertEqual(data['changes'][2]['version'], '1.1')
+        self.assertEqual(data['next'], data['changes'][-1]['seq'])
+        self.assertFalse(data['has_more'])
+
+    def test_since_and_limit_page_through_the_feed(self):
+        for n in range(3):
+            self.upload(f'f{n}.txt')
+
+        first = self.feed(limit=2).json()
+        self.assertEqual(len(first['changes']), 2)
+        self.assertTrue(first['has_more'])
+
+        rest = self.feed(since=first['next'], limit=2).json()
+        self.assertEqual(len(rest['changes']), 1)
+        self.assertFalse(rest['has_more'])
+
+        caught_up = self.feed(since=rest['next']).json()
+        self.assertEqual((caught_up['changes'], caught_up['next']), ([], rest['next']))
+
+    def test_bad_parameters_and_anonymous_clients_are_rejected(self):
+        self.assertEqual(self.feed(since='x').status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.feed().status_code, 302)
+
+    def test_failed_delete_is_not_reported(self):
+        file_obj = self.upload()
+        with mock.patch.object(UploadedFile, 'delete', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(f'/{file_obj.pk}/delete/')
+
+        self.assertTrue(UploadedFile.objects.filter(pk=file_obj.pk).exists())
+        self.assertFalse(FileChange.objects.filter(action=FileChange.Actions.DELETED).exists())
+
+
+# -------------------------
+# Storage usage
+# -------------------------
+class StorageSummaryTests(FilesTestCase):
+    def test_totals_and_heaviest_users(self):
+        self.upload('a.txt', b'12345')
+        self.assertEqual(self.client.get('/api/storage/').status_code, 403)
+
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        data = self.client.get('/api/storage/').json()
+        self.assertEqual(data['totals'], {'files': 1, 'upload_bytes': 5, 'converted_bytes': 0})
+        self.assertEqual(data['users'], [{'username': 'owner', 'files': 1, 'upload_bytes': 5, 'converted_bytes': 0}])
+
+
+# -------------------------
+# Conversion metrics
+# -------------------------
+class ConversionMetricsTests(FilesTestCase):
+    def test_json_and_prometheus_output(self):
+        record_conversion(None, '.txt', 10, ConversionEvent.Outcomes.SUCCESS, converter='convert_text', runtime_ms=20)
+        self.assertEqual(self.client.get('/api/metrics/conversions/').status_code, 403)
+
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        rows = self.client.get('/api/metrics/conversions/').json()['conversions']
+        self.assertEqual([(row['extension'], row['count'], row['buckets']['50']) for row in rows], [('.txt', 1, 1)])
+        self.assertEqual(self.client.get('/api/metrics/conversions/', {'days': 'x'}).status_code, 400)
+
+        response = self.client.get('/api/metrics/conversions/', {'format': 'prometheus'})
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'file_editor_conversion_runtime_ms_count{extension=".txt"', response.content)
+
+
+# -------------------------
+# Notifications inbox
+# -------------------------
+class NotificationsApiTests(FilesTestCase):
+    def setUp(self):
+        super().setUp()
+        for n in range(3):
+            notify_users(User.objects.filter(pk=self.owner.pk), self.reviewer, Notification.Types.GENERAL, f"note {n}", None)
+
+    def post(self, payload):
+        return self.client.post('/api/notifications/', json.dumps(payload), content_type='application/json')
+
+    def unread(self):
+        return UserActivity.objects.get(user=self.owner).unread_notifications
+
+    def test_pages_newest_first(self):
+        first = self.client.get('/api/notifications/', {'limit': 2}).json()
+        self.assertEqual([n['message'] for n in first['notifications']], ['note 2', 'note 1'])
+        rest = self.client.get('/api/notifications/', {'cursor': first['next']}).json()
+        self.assertEqual(([n['message'] for n in rest['notifications']], rest['next']), (['note 0'], None))
+
+    def test_bulk_actions_keep_the_unread_counter(self):
+        ids = list(self.owner.notifications.values_list('id', flat=True))
+        self.assertEqual(self.post({'action': 'mark_read', 'ids': ids[:2]}).json(), {'updated': 2})
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(self.post({'action': 'dismiss', 'ids': ids}).json(), {'updated': 3})
+        self.assertEqual(self.unread(), 0)
+
+    def test_bad_bodies_are_rejected(self):
+        for body in ('[1, 2]', '"mark_read"', 'null', '{'):
+            response = self.client.post('/api/notifications/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.post({'action': 'explode', 'ids': [1]}).status_code, 400)
+        self.assertEqual(self.post({'action': 'mark_read', 'ids': 5}).status_code, 400)
+
+    def test_failed_counter_update_rolls_back_the_action(self):
+        ids = list(self.owner.notifications.values_list('id', flat=True))
+        with mock.patch.object(UserActivity, 'adjust', side_effect=RuntimeError('boom')):
+            for action in ('mark_read', 'dismiss'):
+                with self.assertRaises(RuntimeError):
+                    apply_action(self.owner, action, ids=ids)
+        self.assertEqual(self.owner.notifications.filter(is_read=False).count(), 3)
+        self.assertEqual(self.unread(), 3)
@@ -1,6 +1,13 @@
-from django.contrib import admin
-from django.urls import path,include
+from django.urls import path
 
-urlpatterns = [ 
-    path('login/',include())
-]
\ No newline at end of file
+from . import views
+
+urlpatterns = [
+    path('changes/', views.change_feed, name='api_change_feed'),
+    path('notifications/', views.notifications, name='api_notifications'),
+    path('review/queue/', views.review_queue, name='api_review_queue'),
+    path('review/claim/', views.review_claim, name='api_review_claim'),
+    path('storage/', views.storage_summary, name='api_storage_summary'),
+    path('metrics/conversions/', views.conversion_metrics, name='api_conversion_metrics'),
+    path('metrics/admission/', views.admission_metrics, name='api_admission_metrics'),
+]
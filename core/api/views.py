@@ -1,3 +1,231 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_http_methods
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+
+from files.models import FileChange, UserStorage, StatusCounter, FileStatus
+from files.notifications import inbox_page, apply_action, PAGE_SIZE
+from files.review import queue_page, claim, QUEUE_STATUSES, QUEUE_PAGE_SIZE
+from files.quota import storage_totals
+from files.telemetry import conversion_histograms, prometheus_text
+from files.admission import admission_stats, prometheus_text as admission_prometheus_text
+from files.views import is_program_super_user
+
+CHANGE_FEED_DEFAULT_LIMIT = 500
+CHANGE_FEED_MAX_LIMIT = 5000
+
+
+@login_required
+def change_feed(request):
+    """
+    Incremental sync feed: every change with seq > ``since``, oldest first.
+
+    Clients store ``next`` and pass it back as ``since`` on the next poll;
+    ``has_more`` tells them to keep paging before they are up to date.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = int(request.GET.get('limit', CHANGE_FEED_DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': "'since' and 'limit' must be integers."}, status=400)
+    limit = max(1, min(limit, CHANGE_FEED_MAX_LIMIT))
+
+    rows = list(
+        FileChange.objects.filter(seq__gt=since)
+        .order_by('seq')
+        .values_list('seq', 'file_id', 'action', 'filename', 'version_label', 'status', 'created_at')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = [
+        {
+            'seq': seq,
+            'file': file_id,
+            'action': action,
+            'filename': filename,
+            'version': version_label,
+            'status': status,
+            'at': created_at,
+        }
+        for seq, file_id, action, filename, version_label, status, created_at in rows
+    ]
+    return JsonResponse({
+        'changes': changes,
+        'next': changes[-1]['seq'] if changes else since,
+        'has_more': has_more,
+    })
+
+
+@login_required
+def storage_summary(request):
+    """
+    Storage dashboard data: site totals plus the heaviest users, read from the
+    maintained UserStorage aggregates (no filesystem access).
+    """
+    if not (request.user.is_staff or is_program_super_user(request.user)):
+        return HttpResponseForbidden("Only staff and program super users can view storage usage.")
+
+    top_users = (
+        UserStorage.objects.select_related('user')
+        .order_by('-upload_bytes')
+        .values_list('user__username', 'file_count', 'upload_bytes', 'converted_bytes')[:20]
+    )
+    return JsonResponse({
+        'totals': storage_totals(),
+        'users': [
+            {'username': username, 'files': files, 'upload_bytes': upload, 'converted_bytes': converted}
+            for username, files, upload, converted in top_users
+        ],
+    })
+
+
+@login_required
+def conversion_metrics(request):
+    """
+    Conversion runtime histograms per extension and size bucket. JSON by
+    default, Prometheus text with ?format=prometheus; ?days=N limits the window.
+    """
+    if not (request.user.is_staff or is_program_super_user(request.user)):
+        return HttpResponseForbidden("Only staff and program super users can view metrics.")
+    try:
+        days = int(request.GET['days']) if 'days' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': "'days' must be an integer."}, status=400)
+
+    histograms = conversion_histograms(days=days)
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(prometheus_text(histograms), content_type='text/plain; version=0.0.4')
+    return JsonResponse({'conversions': histograms})
+
+
+@login_required
+def admission_metrics(request):
+    """
+    In-flight and queued work per admission pool, plus admitted, rejected and
+    timed-out totals. JSON by default, Prometheus text with ?format=prometheus.
+    """
+    if not (request.user.is_staff or is_program_super_user(request.user)):
+        return HttpResponseForbidden("Only staff and program super users can view metrics.")
+    stats = admission_stats()
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(admission_prometheus_text(stats), content_type='text/plain; version=0.0.4')
+    return JsonResponse({'pools': stats})
+
+
+def _notification_json(notification):
+    return {
+        'id': notification.pk,
+        'type': notification.notification_type,
+        'message': notification.message,
+        'digest_count': notification.digest_count,
+        'sender': notification.sender.username if notification.sender else None,
+        'file': notification.related_file_id,
+        'filename': notification.related_file.filename if notification.related_file else None,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at,
+    }
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def notifications(request):
+    """
+    The current user's inbox.
+
+    GET: one page newest first (?cursor=, ?limit=, ?unread=1); pass ``next``
+    back as ``cursor`` for the following page.
+    POST (JSON or form): ``action`` (mark_read / mark_unread / dismiss) with
+    ``ids`` or an ``up_to`` cursor; returns the number of rows affected.
+    """
+    if request.method == 'POST':
+        if request.content_type == 'application/json':
+            try:
+                payload = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'error': "Invalid JSON body."}, status=400)
+            if not isinstance(payload, dict):
+                return JsonResponse({'error': "The JSON body must be an object."}, status=400)
+            ids = payload.get('ids') or []
+        else:
+            payload = request.POST
+            ids = request.POST.getlist('ids')
+        try:
+            count = apply_action(request.user, payload.get('action'), ids=ids, up_to=payload.get('up_to'))
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'updated': count})
+
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+        page, next_cursor = inbox_page(
+            request.user,
+            request.GET.get('cursor') or None,
+            limit=limit,
+            unread_only=request.GET.get('unread') == '1',
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'notifications': [_notification_json(n) for n in page],
+        'next': next_cursor,
+    })
+
+
+def _queue_file_json(file_obj):
+    return {
+        'id': file_obj.pk,
+        'filename': file_obj.filename,
+        'version': file_obj.version_label,
+        'status': file_obj.status,
+        'owner': file_obj.owner.username if file_obj.owner else None,
+        'reviewer': file_obj.reviewed_by.username if file_obj.reviewed_by else None,
+        'uploaded_at': file_obj.uploaded_at,
+    }
+
+
+@login_required
+def review_queue(request):
+    """
+    Reviewer queue, oldest first: ?status=pending|in_review, ?mine=1 for
+    files claimed by the caller, ?cursor= / ?limit= for paging. Includes the
+    maintained per-status totals.
+    """
+    if not is_program_super_user(request.user):
+        return HttpResponseForbidden("Only program super users can review files.")
+    status = request.GET.get('status', FileStatus.PENDING)
+    if status not in QUEUE_STATUSES:
+        return JsonResponse({'error': f"'status' must be one of {', '.join(QUEUE_STATUSES)}."}, status=400)
+    try:
+        files, next_cursor = queue_page(
+            status,
+            request.GET.get('cursor') or None,
+            reviewer=request.user if request.GET.get('mine') == '1' else None,
+            limit=int(request.GET.get('limit', QUEUE_PAGE_SIZE)),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'counts': StatusCounter.totals(),
+        'files': [_queue_file_json(f) for f in files],
+        'next': next_cursor,
+    })
+
+
+@login_required
+@require_http_methods(['POST'])
+def review_claim(request):
+    """
+    Claim a pending file for the caller: ``file`` to claim a specific one,
+    otherwise the oldest. 409 if it was already taken or the queue is empty.
+    """
+    if not is_program_super_user(request.user):
+        return HttpResponseForbidden("Only program super users can review files.")
+    pk = request.POST.get('file')
+    if pk is not None and not pk.isdigit():
+        return JsonResponse({'error': "'file' must be an integer."}, status=400)
+    file_obj = claim(request.user, int(pk) if pk else None)
+    if file_obj is None:
+        return JsonResponse({'error': "Nothing to claim."}, status=409)
+    return JsonResponse({'claimed': _queue_file_json(file_obj)})
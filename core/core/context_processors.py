@@ -1,9 +1,12 @@
 from typing import Dict
 
+from files.models import UserActivity
+
 
 def notifications_meta(request) -> Dict[str, int]:
     """
-    Inject unread notification counts into every template.
+    Inject unread notification counts into every template, read from the
+    maintained UserActivity row instead of counting notifications.
     """
     if not request.user.is_authenticated:
         return {
@@ -11,7 +14,10 @@ def notifications_meta(request) -> Dict[str, int]:
         }
 
     try:
-        unread_count = request.user.notifications.filter(is_read=False).count()
+        unread_count = (
+            UserActivity.objects.filter(user=request.user)
+            .values_list('unread_notifications', flat=True).first()
+        ) or 0
     except Exception:
         unread_count = 0
 
@@ -0,0 +1,112 @@
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(request):
+    """
+    Content codings the client accepts, ignoring any it refuses with q=0.
+    """
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.partition(';')
+        q = params.replace(' ', '').lower()
+        if q.startswith('q=') and q[2:].strip('0.') == '':
+            continue
+        if coding.strip():
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress text-like responses (HTML, JSON, text previews and text downloads),
+    streaming responses chunk by chunk instead of buffering them.
+
+    PDFs, images and anything else already compressed are left alone. HTML
+    may carry a CSRF token, so it is always gzipped with Django's random
+    header padding (the BREACH mitigation GZipMiddleware uses) and never
+    brotli-compressed; other types prefer brotli when the client accepts it
+    and the brotli package is installed.
+    """
+
+    min_length = 200
+    max_random_bytes = 100
+    compressible_types = (
+        'text/',
+        'application/json',
+        'application/javascript',
+        'application/xml',
+        'application/xhtml+xml',
+        'image/svg+xml',
+    )
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code == 206:
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(self.compressible_types):
+            return response
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+        if response.streaming and response.is_async:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.choose_encoding(request, content_type)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response.streaming_content, encoding, content_type)
+            # The compressed size is unknown until the stream is done.
+            del response.headers['Content-Length']
+        else:
+            compressed = self.compress(response.content, encoding, content_type)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def choose_encoding(self, request, content_type):
+        accepted = accepted_encodings(request)
+        if 'br' in accepted and brotli is not None and not self.is_breach_sensitive(content_type):
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def is_breach_sensitive(self, content_type):
+        return content_type in ('text/html', 'application/xhtml+xml')
+
+    def _random_bytes(self, content_type):
+        return self.max_random_bytes if self.is_breach_sensitive(content_type) else None
+
+    def compress(self, content, encoding, content_type):
+        if encoding == 'br':
+            return brotli.compress(content, quality=5)
+        return compress_string(content, max_random_bytes=self._random_bytes(content_type))
+
+    def compress_stream(self, chunks, encoding, content_type):
+        if encoding == 'gzip':
+            return compress_sequence(chunks, max_random_bytes=self._random_bytes(content_type))
+        return self._brotli_stream(chunks)
+
+    def _brotli_stream(self, chunks):
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
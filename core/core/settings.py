@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-change-in-production-1234567890'
@@ -17,10 +19,12 @@ INSTALLED_APPS = [
     'rest_framework',
     'files',
     'users',
+    'api',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,9 +76,139 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# collectstatic writes content-hashed names plus .gz/.br siblings (brotli is
+# optional) that core.views.serve_static picks by Accept-Encoding. While
+# DEBUG is on, {% static %} links the unhashed names, which collectstatic
+# also writes (with their own .gz/.br), so no manifest has to be current.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.storage.PrecompressedManifestStaticFilesStorage'},
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media in an S3-compatible bucket instead of MEDIA_ROOT, so several nodes can
+# share it (requires the `boto3` package). Set S3_ENDPOINT_URL for MinIO or
+# another self-hosted server, e.g. http://127.0.0.1:9000. Downloads redirect
+# to presigned URLs valid for S3_PRESIGNED_URL_SECONDS; files larger than
+# S3_MULTIPART_THRESHOLD are uploaded in parallel parts.
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', '')
+S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID', '')
+S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY', '')
+S3_PRESIGNED_URL_SECONDS = 300
+S3_MULTIPART_THRESHOLD = 16 * 1024 * 1024
+S3_MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+S3_MAX_CONCURRENCY = 8
+if S3_BUCKET:
+    STORAGES['default'] = {'BACKEND': 'files.storage.S3Storage'}
+
+# Local copies of remote media for conversions and editing (files/scratch.py),
+# evicted least recently used first above SCRATCH_MAX_BYTES. Copies used in
+# the last SCRATCH_MIN_AGE seconds are kept regardless.
+SCRATCH_DIR = os.environ.get('SCRATCH_DIR', str(BASE_DIR / 'scratch'))
+SCRATCH_MAX_BYTES = 2 * 1024 * 1024 * 1024
+SCRATCH_MIN_AGE = 600
+
+# Admission control for PDF conversions and DOCX/XLSX parsing (files/admission.py).
+# At most `slots` jobs per pool run at once across all worker processes on the
+# host; up to `queue` more wait ADMISSION_QUEUE_TIMEOUT seconds for a slot and
+# anything beyond that gets a 503 with Retry-After: ADMISSION_RETRY_AFTER.
+ADMISSION_DIR = os.environ.get('ADMISSION_DIR', os.path.join(SCRATCH_DIR, 'admission'))
+ADMISSION_POOLS = {
+    'convert': {'slots': int(os.environ.get('CONVERT_SLOTS', '2')), 'queue': 8},
+    'edit': {'slots': int(os.environ.get('EDIT_SLOTS', '4')), 'queue': 16},
+}
+ADMISSION_QUEUE_TIMEOUT = 15
+ADMISSION_RETRY_AFTER = 10
+
+
+# Cache used for rendered template fragments (file cards, version and comment
+# blocks). The local-memory default is per process; point CACHE_URL at a
+# shared backend when running several workers, e.g.
+#   CACHE_URL=file:///var/tmp/file_editor_cache
+#   CACHE_URL=redis://127.0.0.1:6379/1   (requires the `redis` package)
+CACHE_URL = os.environ.get('CACHE_URL', '')
+
+
+def _cache(url, name=''):
+    """Backend for CACHE_URL; ``name`` gives a cache its own key space."""
+    if url.startswith('redis://'):
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url, 'KEY_PREFIX': name}
+    if url.startswith('file://'):
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(url[len('file://'):], name)}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': '-'.join(filter(None, ['file-editor', name]))}
+
+
+CACHES = {
+    'default': _cache(CACHE_URL),
+    # For SESSION_BACKEND=cached_db; a separate key space so clearing or
+    # culling fragments never drops sessions.
+    'sessions': _cache(CACHE_URL, 'sessions'),
+}
+
+FRAGMENT_CACHE_TIMEOUT = 600
+
+# Where sessions live. 'db' reads django_session on every authenticated
+# request. 'cached_db' reads from the 'sessions' cache and only falls back to
+# the table on a miss (writes go to both); with several worker processes it
+# needs a shared CACHE_URL, or a logout in one worker isn't seen by the others
+# until their cached copy expires. 'signed_cookies' keeps the session in a
+# signed cookie and touches no storage, but a session can't be revoked
+# server-side before SESSION_COOKIE_AGE runs out.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'db')
+if SESSION_BACKEND not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f"SESSION_BACKEND={SESSION_BACKEND!r} is not one of: {', '.join(SESSION_ENGINES)}."
+    )
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Flash messages ride in a signed cookie, never in the session.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Read notifications older than this are removed by `manage.py prune_notifications`.
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Optional per-user storage quota (originals + converted PDFs), enforced while
+# uploads stream in. None disables the quota.
+USER_UPLOAD_QUOTA_BYTES = None
+
+# Stages run over every upload chunk as it streams in (see files/ingest.py).
+UPLOAD_INGEST_STAGES = [
+    'files.ingest.HashStage',
+    'files.ingest.SniffStage',
+    'files.ingest.SizeStage',
+    'files.ingest.TextWarmupStage',
+    'files.ingest.ScannerStage',
+]
+# Optional content scanner for ScannerStage: dotted path to a factory whose
+# objects provide feed(chunk) and verdict() (a non-empty verdict rejects).
+UPLOAD_SCANNER = None
+
+# Linearize ("fast web view") and recompress converted PDFs so PDF.js can draw
+# page one before the whole file has downloaded. Needs qpdf on PATH (or
+# QPDF_PATH) or the pikepdf package; without either, PDFs are left as-is.
+PDF_LINEARIZE = False
+QPDF_PATH = 'qpdf'
+
+# Threads that run deferred side effects (reviewer notifications, PDF
+# regeneration after edits) once the request's transaction commits. 0 runs
+# them inline on commit, e.g. for debugging.
+BACKGROUND_TASK_WORKERS = int(os.environ.get('BACKGROUND_TASK_WORKERS', '2'))
+
+# TTF font for plain text converted to PDF in-process (e.g. DejaVuSansMono.ttf).
+# Without one only Latin-1 text is drawn in-process. Text with characters the
+# font lacks, right-to-left or shaped scripts, and .html/.csv files are always
+# converted by LibreOffice.
+TEXT_PDF_FONT = os.environ.get('TEXT_PDF_FONT') or None
 
 LIBREOFFICE_PATH = r"C:\Program Files\LibreOffice\program\soffice.exe"
 
@@ -0,0 +1,92 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# The import/export rewrites support_js_module_import_aggregation applies to
+# *.js, plus the source map comment.
+MJS_PATTERNS = (
+    (
+        r"""(?P<matched>import(?s:(?P<import>[\s\{].*?|\*\s*as\s*\w+))\s*from\s*['"](?P<url>[./].*?)["']\s*;)""",
+        """import%(import)s from "%(url)s";""",
+    ),
+    (
+        r"""(?P<matched>export(?s:(?P<exports>[\s\{].*?))\s*from\s*["'](?P<url>[./].*?)["']\s*;)""",
+        """export%(exports)s from "%(url)s";""",
+    ),
+    (
+        r"""(?P<matched>import\s*['"](?P<url>[./].*?)["']\s*;)""",
+        """import"%(url)s";""",
+    ),
+    (
+        r"""(?P<matched>import\(["'](?P<url>.*?)["']\))""",
+        """import("%(url)s")""",
+    ),
+    (
+        r"(?m)^(?P<matched>//# (?-i:sourceMappingURL)=(?P<url>.*))$",
+        "//# sourceMappingURL=%(url)s",
+    ),
+)
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes .gz (and .br when the brotli
+    package is installed) siblings for text assets at collectstatic time, so
+    core.views.serve_static never compresses on the fly.
+    """
+    compressible_extensions = {
+        '.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.xml',
+        '.ftl', '.properties', '.bcmap', '.pfb', '.ttf', '.otf', '.wasm',
+    }
+    min_compress_size = 256
+    # Rewrite ES module imports to hashed names, in .js files (Django's own
+    # patterns) and in .mjs files, which PDF.js ships its modules as.
+    support_js_module_import_aggregation = True
+    patterns = ManifestStaticFilesStorage.patterns + (('*.mjs', MJS_PATTERNS),)
+    # Files missing from the manifest are hashed on first use, or linked by
+    # their plain name when they have not been collected at all (see
+    # stored_name), instead of failing the page with a 500.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        written = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                written.add(name)
+                if hashed_name:
+                    written.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for name in sorted(written):
+            if os.path.splitext(name)[1].lower() in self.compressible_extensions:
+                self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < self.min_compress_size:
+            return
+
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
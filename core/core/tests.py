@@ -0,0 +1,213 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.templatetags.static import static
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from files.tests import FilesTestCase
+
+from .middleware import CompressionMiddleware, accepted_encodings
+
+
+# -------------------------
+# Precompressed static assets
+# -------------------------
+class StaticPipelineTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix='static-tests-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        source = os.path.join(root, 'source')
+        self.write(source, 'pdfjs/viewer.mjs', 'import { x } from "./dep.mjs";\n' + '// padding\n' * 40)
+        self.write(source, 'pdfjs/dep.mjs', 'export const x = 1;\n')
+        self.write(source, 'app.css', 'body { color: red; }\n')
+        self.static_root = os.path.join(root, 'collected')
+        settings_override = override_settings(STATIC_ROOT=self.static_root, STATICFILES_DIRS=[source])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self, root, name, text):
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.static_root, 'staticfiles.json')) as f:
+            return json.load(f)['paths']
+
+    def read(self, name, suffix=''):
+        with open(os.path.join(self.static_root, name + suffix), 'rb') as f:
+            return f.read()
+
+    def test_module_imports_point_at_hashed_names(self):
+        paths = self.collect()
+        viewer, dep = paths['pdfjs/viewer.mjs'], paths['pdfjs/dep.mjs']
+        self.assertNotEqual(dep, 'pdfjs/dep.mjs')
+        self.assertIn(f'from "./{os.path.basename(dep)}";'.encode(), self.read(viewer))
+
+    def test_text_assets_get_gzip_siblings_above_the_size_floor(self):
+        paths = self.collect()
+        for name in ('pdfjs/viewer.mjs', paths['pdfjs/viewer.mjs']):
+            self.assertEqual(gzip.decompress(self.read(name, '.gz')), self.read(name))
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, paths['app.css'] + '.gz')))
+
+    def test_serving_picks_the_precompressed_file_and_caches_hashed_names(self):
+        hashed = self.collect()['pdfjs/viewer.mjs']
+
+        response = self.client.get(f'/static/{hashed}', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(b''.join(response.streaming_content), self.read(hashed, '.gz'))
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get('/static/pdfjs/viewer.mjs')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        self.assertEqual(
+            self.client.get('/static/pdfjs/viewer.mjs', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+            304,
+        )
+        self.assertEqual(self.client.get('/static/pdfjs/missing.mjs').status_code, 404)
+
+    def test_links_use_hashed_names_once_collected(self):
+        self.assertEqual(static('app.css'), '/static/app.css')
+        paths = self.collect()
+        with override_settings(STATIC_ROOT=self.static_root):  # reload the manifest
+            self.assertEqual(static('app.css'), f"/static/{paths['app.css']}")
+
+    @override_settings(DEBUG=True)
+    def test_debug_links_plain_names_and_serves_uncollected_files(self):
+        self.assertEqual(static('app.css'), '/static/app.css')
+        response = self.client.get('/static/app.css')
+        self.assertEqual(b''.join(response.streaming_content), b'body { color: red; }\n')
+
+        self.collect()
+        self.assertEqual(static('pdfjs/viewer.mjs'), '/static/pdfjs/viewer.mjs')
+        response = self.client.get('/static/pdfjs/viewer.mjs', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+# -------------------------
+# Response compression
+# -------------------------
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'line of preview text\n' * 50
+
+    def respond(self, response, accept='gzip, deflate'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_accepted_encodings_skip_refused_codings(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0.5, deflate;q=0.0, identity')
+        self.assertEqual(accepted_encodings(request), {'br', 'identity'})
+
+    def test_text_is_gzipped(self):
+        original = HttpResponse(self.body, content_type='text/plain; charset=utf-8')
+        original['ETag'] = '"abc"'
+        response = self.respond(original)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual((response['Vary'], response['ETag']), ('Accept-Encoding', 'W/"abc"'))
+
+    def test_streamed_downloads_are_compressed_chunk_by_chunk(self):
+        response = self.respond(StreamingHttpResponse(iter([self.body, self.body]), content_type='text/csv'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body * 2)
+
+    def test_other_responses_are_left_alone(self):
+        partial = HttpResponse(self.body, content_type='text/plain', status=206)
+        encoded = HttpResponse(self.body, content_type='text/plain', headers={'Content-Encoding': 'br'})
+        for response in (
+            HttpResponse(self.body, content_type='application/pdf'),
+            HttpResponse(b'short', content_type='text/plain'),
+            partial,
+            encoded,
+            FileResponse(iter([self.body]), content_type='image/png'),
+        ):
+            self.assertIs(self.respond(response), response)
+            self.assertNotEqual(response.get('Content-Encoding'), 'gzip')
+        plain = self.respond(JsonResponse({'text': self.body.decode()}), accept='identity')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain['Vary'], 'Accept-Encoding')
+
+    @mock.patch('core.middleware.brotli', object())
+    def test_html_is_never_brotli_compressed(self):
+        middleware = CompressionMiddleware(lambda request: None)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(middleware.choose_encoding(request, 'text/html'), 'gzip')
+        self.assertEqual(middleware.choose_encoding(request, 'application/json'), 'br')
+
+    def test_html_pages_are_gzipped_with_padding(self):
+        first = self.respond(HttpResponse(self.body, content_type='text/html'))
+        second = self.respond(HttpResponse(self.body, content_type='text/html'))
+        self.assertEqual(gzip.decompress(first.content), self.body)
+        self.assertEqual(gzip.decompress(second.content), self.body)
+        self.assertNotEqual(first.content, second.content)
+
+    def test_pages_are_compressed_end_to_end(self):
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+
+
+# -------------------------
+# Sessions and messages
+# -------------------------
+class SessionSettingsTests(FilesTestCase):
+    def settings_in_subprocess(self, backend):
+        return subprocess.run(
+            [sys.executable, '-c', "import django; django.setup(); from django.conf import settings; print(settings.SESSION_ENGINE)"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'core.settings', 'SESSION_BACKEND': backend},
+        )
+
+    def test_session_backend_is_validated(self):
+        result = self.settings_in_subprocess('cached_db')
+        self.assertEqual(result.stdout.strip(), 'django.contrib.sessions.backends.cached_db')
+        result = self.settings_in_subprocess('redis')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("SESSION_BACKEND='redis' is not one of", result.stderr)
+
+    def test_messages_ride_in_a_cookie(self):
+        file_obj = self.upload()
+        response = self.client.post(f'/{file_obj.pk}/delete/')
+        self.assertIn('messages', response.cookies)
+        self.assertNotIn('_messages', self.client.session.keys())
+
+    def session_queries(self, engine):
+        with override_settings(SESSION_ENGINE=engine):
+            client = Client()
+            client.force_login(self.owner)
+            client.get('/')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(client.get('/').status_code, 200)
+        return sum('django_session' in query['sql'] for query in queries)
+
+    def test_cached_and_cookie_sessions_skip_the_table(self):
+        self.assertEqual(self.session_queries('django.contrib.sessions.backends.db'), 1)
+        self.assertEqual(self.session_queries('django.contrib.sessions.backends.cached_db'), 0)
+        self.assertEqual(self.session_queries('django.contrib.sessions.backends.signed_cookies'), 0)
+
+    def test_bench_sessions_reports_every_setup_and_keeps_nothing(self):
+        self.upload()
+        sessions = Session.objects.count()
+        out = io.StringIO()
+        call_command('bench_sessions', requests=2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 7)
+        self.assertEqual(Session.objects.count(), sessions)
@@ -1,9 +1,10 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 import mimetypes
 from django.contrib.auth import views as auth_views
+from .views import serve_static
 
 
 mimetypes.add_type("text/javascript", ".mjs")
@@ -13,10 +14,11 @@ urlpatterns = [
     path('users/', include('users.urls')),
     path('admin/', admin.site.urls),
     path("admin/logout/", auth_views.LogoutView.as_view(), name="logout"),
-    path('api/', include('api.urls'))
-    
+    path('api/', include('api.urls')),
+    # Collected static files with precompressed variants and immutable caching
+    # (runserver serves static files itself while DEBUG is on).
+    re_path(rf"^{settings.STATIC_URL.strip('/')}/(?P<path>.*)$", serve_static),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,6 +1,69 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import FileResponse, Http404, HttpResponseNotModified
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
 
+from .middleware import accepted_encodings
 
 
 def home_page(request):
-    return render(request,'base.html')
\ No newline at end of file
+    return render(request,'base.html')
+
+
+# Names produced by ManifestStaticFilesStorage: <name>.<12 hex chars>.<ext>
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+
+def serve_static(request, path):
+    """
+    Serve a collected static file, preferring the precompressed .br / .gz
+    sibling written by collectstatic when the client accepts it. Hashed
+    names get a year-long immutable Cache-Control. With DEBUG on, files not
+    collected yet are found in the source directories.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    except ValueError:
+        raise Http404("Invalid path")
+    if not fullpath.is_file() and settings.DEBUG:
+        # Not collected yet: serve it straight from the app / project dirs.
+        found = finders.find(path)
+        fullpath = Path(found) if found else fullpath
+    if not fullpath.is_file():
+        raise Http404("File not found")
+
+    content_type, _ = mimetypes.guess_type(str(fullpath))
+    accepted = accepted_encodings(request)
+    served, encoding = fullpath, None
+    for coding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        candidate = Path(f"{fullpath}{suffix}")
+        if coding in accepted and candidate.is_file():
+            served, encoding = candidate, coding
+            break
+
+    stat = served.stat()
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(served.open('rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(os.path.basename(path)) else REVALIDATE_CACHE_CONTROL
+    )
+    return response
@@ -0,0 +1,157 @@
+# files/admission.py
+"""
+Admission control for expensive work: PDF conversion and DOCX/XLSX parses
+and rewrites.
+
+Each pool in settings.ADMISSION_POOLS has a fixed number of slots shared by
+every worker process on the host. A slot is an advisory lock on
+ADMISSION_DIR/<pool>/slot-<n>.lock, so a crashed worker frees its slot
+automatically. A request that finds every slot busy takes one of the pool's
+queue places (also lock files) and polls for a slot for up to
+ADMISSION_QUEUE_TIMEOUT seconds. When the queue is full, or the wait runs
+out, it raises Overloaded, which @shed_load turns into a 503 with
+Retry-After.
+
+In-flight and queued counts are read by probing the lock files. Admission,
+rejection and timeout totals are counted in the default cache, so they are
+host-wide only when CACHE_URL points at a shared cache.
+"""
+import os
+import time
+
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+from .locks import acquire_any, release
+
+POLL_INTERVAL = 0.1
+COUNTERS = ('admitted', 'rejected', 'timed_out')
+
+
+class Overloaded(Exception):
+    def __init__(self, pool, message):
+        super().__init__(message)
+        self.pool = pool
+        self.retry_after = settings.ADMISSION_RETRY_AFTER
+
+
+def _lock_paths(pool, kind, count):
+    directory = os.path.join(settings.ADMISSION_DIR, pool)
+    os.makedirs(directory, exist_ok=True)
+    return [os.path.join(directory, f"{kind}-{n}.lock") for n in range(count)]
+
+
+def _counter_key(pool, counter):
+    return f"admission:{pool}:{counter}"
+
+
+def _count(pool, counter):
+    key = _counter_key(pool, counter)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:  # evicted between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+@contextmanager
+def admit(pool, background=False):
+    """
+    Hold one of ``pool``'s slots for the duration of the block. Background
+    tasks are already bounded by their thread pool, so they wait for a slot
+    as long as it takes instead of using a queue place.
+    """
+    config = settings.ADMISSION_POOLS[pool]
+    slots = _lock_paths(pool, 'slot', config['slots'])
+    fd = acquire_any(slots)
+    if fd is None:
+        place = None
+        deadline = None
+        if not background:
+            place = acquire_any(_lock_paths(pool, 'queue', config['queue']))
+            if place is None:
+                _count(pool, 'rejected')
+                raise Overloaded(pool, "The server is busy with other documents. Please try again shortly.")
+            deadline = time.monotonic() + settings.ADMISSION_QUEUE_TIMEOUT
+        try:
+            while fd is None:
+                if deadline is not None and time.monotonic() >= deadline:
+                    _count(pool, 'timed_out')
+                    raise Overloaded(pool, "Timed out waiting for a free worker. Please try again shortly.")
+                time.sleep(POLL_INTERVAL)
+                fd = acquire_any(slots)
+        finally:
+            if place is not None:
+                release(place)
+    _count(pool, 'admitted')
+    try:
+        yield
+    finally:
+        release(fd)
+
+
+def _held(paths):
+    """How many of ``paths`` are locked right now (a momentary probe)."""
+    held = 0
+    for path in paths:
+        fd = acquire_any([path])
+        if fd is None:
+            held += 1
+        else:
+            release(fd)
+    return held
+
+
+def admission_stats():
+    """Per pool: capacity, current in-flight and queued work, and totals."""
+    stats = {}
+    for pool, config in settings.ADMISSION_POOLS.items():
+        row = {
+            'slots': config['slots'],
+            'queue_depth': config['queue'],
+            'in_flight': _held(_lock_paths(pool, 'slot', config['slots'])),
+            'queued': _held(_lock_paths(pool, 'queue', config['queue'])),
+        }
+        totals = cache.get_many([_counter_key(pool, counter) for counter in COUNTERS])
+        for counter in COUNTERS:
+            row[f"{counter}_total"] = totals.get(_counter_key(pool, counter), 0)
+        stats[pool] = row
+    return stats
+
+
+def prometheus_text(stats):
+    lines = []
+    for metric, kind in (
+        ('in_flight', 'gauge'), ('queued', 'gauge'), ('slots', 'gauge'),
+        ('admitted_total', 'counter'), ('rejected_total', 'counter'), ('timed_out_total', 'counter'),
+    ):
+        name = f"file_editor_admission_{metric}"
+        lines.append(f"# TYPE {name} {kind}")
+        for pool, row in stats.items():
+            lines.append(f'{name}{{pool="{pool}"}} {row[metric]}')
+    return "\n".join(lines) + "\n"
+
+
+def shed_load(json=False):
+    """
+    View decorator: answer Overloaded with 503 and Retry-After, as JSON for
+    views fetched by scripts and as plain text otherwise.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except Overloaded as e:
+                if json:
+                    response = JsonResponse({'error': str(e), 'retry_after': e.retry_after}, status=503)
+                else:
+                    response = HttpResponse(str(e), status=503, content_type='text/plain')
+                response['Retry-After'] = str(e.retry_after)
+                return response
+        return wrapped
+    return decorator
@@ -0,0 +1,53 @@
+# files/cache.py
+"""
+Helpers for the template fragment cache used by file_list and the paginated
+version and comment panes of file_detail.
+
+File cards are keyed by (file id, version, status, comment count) and are
+deleted whenever the file row is saved or deleted. The counters move by
+queryset update, which sends no signal, so they are part of the key.
+
+Version and comment blocks are keyed by a per-file generation number that
+is bumped whenever a version or comment is written, so every cached page of
+those blocks goes stale at once.
+"""
+import time
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+FILE_CARD_FRAGMENT = 'file_card'
+VERSIONS_BLOCK = 'versions'
+COMMENTS_BLOCK = 'comments'
+
+
+def file_card_key(file_obj):
+    return make_template_fragment_key(
+        FILE_CARD_FRAGMENT, [file_obj.pk, file_obj.version_label, file_obj.status, file_obj.comment_count]
+    )
+
+
+def invalidate_file_card(file_obj):
+    cache.delete(file_card_key(file_obj))
+
+
+def _generation_key(file_id, block):
+    return f"files:{block}:gen:{file_id}"
+
+
+def _fresh_generation():
+    # Time based so a generation key that was evicted never comes back with a
+    # value that older fragments were cached under.
+    return time.time_ns()
+
+
+def fragment_generation(file_id, block):
+    return cache.get_or_set(_generation_key(file_id, block), _fresh_generation, timeout=None)
+
+
+def bump_fragment_generation(file_id, block):
+    key = _generation_key(file_id, block)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_generation(), timeout=None)
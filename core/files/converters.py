@@ -0,0 +1,176 @@
+# files/converters.py
+"""
+PDF converters keyed by file extension.
+
+Each converter takes the input path and a private job directory, writes a PDF
+into that directory and returns its path, or raises ConversionError. Types
+that can be rendered in-process (plain text, images, PDFs) skip LibreOffice
+entirely; everything else falls back to ``soffice --headless``. So does
+plain text the in-process renderer cannot draw faithfully.
+"""
+import logging
+import os
+import unicodedata
+import shutil
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from .extensions import TEXT_EXTENSIONS, IMAGE_EXTENSIONS, PDF_EXTENSIONS
+from .locks import acquire_any, release
+
+LIBREOFFICE_TIMEOUT = 120
+# Markup and tables: LibreOffice lays these out as a page or a grid, where
+# the in-process text converter would only list their source.
+LAYOUT_TEXT_EXTENSIONS = {'.html', '.csv'}
+# Warm LibreOffice user profiles kept under SCRATCH_DIR/libreoffice
+LIBREOFFICE_PROFILES = 4
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionError(Exception):
+    pass
+
+
+CONVERTERS = {}
+
+
+def register_converter(extensions):
+    def decorator(func):
+        for extension in extensions:
+            CONVERTERS[extension] = func
+        return func
+    return decorator
+
+
+def get_converter(extension):
+    return CONVERTERS.get(extension.lower(), convert_with_libreoffice)
+
+
+def _output_path(input_path, job_dir):
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(job_dir, f"{base_name}.pdf")
+
+
+def _draws_in_process(text, has_glyph):
+    """
+    True when fpdf2 can draw ``text`` on its own: the font has a glyph for
+    every character and nothing needs right-to-left reordering or shaping
+    (combining marks), which only LibreOffice does.
+    """
+    for char in set(text):
+        if unicodedata.category(char) == 'Cc':
+            continue
+        if not has_glyph(ord(char)):
+            return False
+        if unicodedata.bidirectional(char) in ('R', 'AL', 'AN') or unicodedata.combining(char):
+            return False
+    return True
+
+
+@register_converter(TEXT_EXTENSIONS - LAYOUT_TEXT_EXTENSIONS)
+def convert_text(input_path, job_dir):
+    from fpdf import FPDF
+
+    try:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            text = f.read().expandtabs(4)
+    except UnicodeDecodeError:
+        # Another encoding: LibreOffice detects it.
+        return convert_with_libreoffice(input_path, job_dir)
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    if settings.TEXT_PDF_FONT:
+        pdf.add_font('TextPdfFont', fname=settings.TEXT_PDF_FONT)
+        pdf.set_font('TextPdfFont', size=9)
+        has_glyph = pdf.current_font.cmap.__contains__
+    else:
+        # The built-in Courier covers Latin-1 only.
+        pdf.set_font('Courier', size=9)
+        has_glyph = range(256).__contains__
+    if not _draws_in_process(text, has_glyph):
+        return convert_with_libreoffice(input_path, job_dir)
+    pdf.multi_cell(0, 4, text or ' ')
+
+    output_path = _output_path(input_path, job_dir)
+    pdf.output(output_path)
+    return output_path
+
+
+@register_converter(IMAGE_EXTENSIONS)
+def convert_image(input_path, job_dir):
+    from PIL import Image
+
+    output_path = _output_path(input_path, job_dir)
+    try:
+        with Image.open(input_path) as image:
+            if image.mode not in ('RGB', 'L', 'CMYK'):
+                image = image.convert('RGB')
+            image.save(output_path, 'PDF', resolution=100.0)
+    except OSError as e:
+        raise ConversionError(f"Could not read image: {e}")
+    return output_path
+
+
+@register_converter(PDF_EXTENSIONS)
+def convert_pdf(input_path, job_dir):
+    # Already a PDF: hard-link it (no bytes copied), or copy across filesystems.
+    output_path = _output_path(input_path, job_dir)
+    try:
+        os.link(input_path, output_path)
+    except OSError:
+        shutil.copyfile(input_path, output_path)
+    else:
+        # A link shares the original's mtime; stamp it as new output so
+        # gc_media's --min-age guard does not take it for an old orphan.
+        os.utime(output_path)
+    return output_path
+
+
+@contextmanager
+def _libreoffice_profile(job_dir):
+    """
+    soffice refuses to run two conversions on one user profile at once.
+    Hold one of the LIBREOFFICE_PROFILES warm profiles under
+    SCRATCH_DIR/libreoffice (claimed with a file lock, so shared by every
+    worker on the host) or, when all are busy, use a throwaway profile in
+    the job directory, which is removed with it. Either way the number of
+    profiles left on disk is bounded.
+    """
+    root = os.path.join(settings.SCRATCH_DIR, 'libreoffice')
+    os.makedirs(root, exist_ok=True)
+    for n in range(LIBREOFFICE_PROFILES):
+        fd = acquire_any([os.path.join(root, f"profile-{n}.lock")])
+        if fd is not None:
+            try:
+                yield os.path.join(root, f"profile-{n}")
+            finally:
+                release(fd)
+            return
+    yield os.path.join(job_dir, 'profile')
+
+
+def convert_with_libreoffice(input_path, job_dir):
+    try:
+        with _libreoffice_profile(job_dir) as profile_dir:
+            subprocess.run([
+                'soffice', f'-env:UserInstallation={Path(profile_dir).resolve().as_uri()}',
+                '--headless', '--convert-to', 'pdf',
+                input_path, '--outdir', job_dir
+            ], check=True, capture_output=True, timeout=LIBREOFFICE_TIMEOUT)
+
+    except subprocess.TimeoutExpired:
+        raise ConversionError(f"Conversion timed out after {LIBREOFFICE_TIMEOUT} seconds.")
+    except subprocess.CalledProcessError as e:
+        error_output = e.stderr.decode(errors='ignore') if e.stderr else 'No error output'
+        logger.warning("LibreOffice failed on %s: %s", input_path, error_output)
+        raise ConversionError(f"Conversion failed with error code {e.returncode}")
+    except OSError as e:
+        raise ConversionError(f"Conversion failed: {e}")
+
+    return _output_path(input_path, job_dir)
@@ -0,0 +1,257 @@
+# files/docx_patch.py
+"""
+Paragraph-level editing of DOCX packages.
+
+The editor shows a document as its body paragraphs joined by blank lines.
+A line break inside a paragraph is a newline, except where a newline would
+read as part of a paragraph separator (at either end of the paragraph, or
+next to another break); those are U+2028 LINE SEPARATOR, so the text splits
+back into exactly the paragraphs it came from. On save the submitted
+paragraphs are diffed against the ones currently in the main document part,
+and only paragraphs that actually changed have their runs rewritten;
+unchanged paragraphs, tables, images, section properties and every other
+ZIP member are carried over as-is.
+"""
+import difflib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+
+from copy import copy, deepcopy
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+DEFAULT_DOCUMENT_PART = "word/document.xml"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+PARAGRAPH_SEPARATOR = "\n\n"
+LINE_SEPARATOR = "\u2028"
+LINE_BREAKS = re.compile("[\n\u2028]")
+
+
+def _w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+
+P, R, T, TAB, BR, CR, RPR, PPR, DEL, BODY = (
+    _w(tag) for tag in ("p", "r", "t", "tab", "br", "cr", "rPr", "pPr", "del", "body")
+)
+TEXT_TAGS = {T, TAB, BR, CR}
+
+
+class DocxPatchError(ValueError):
+    pass
+
+
+def _document_part(zf):
+    """Name of the main document part, from the package relationships."""
+    try:
+        rels = etree.fromstring(zf.read("_rels/.rels"))
+    except KeyError:
+        return DEFAULT_DOCUMENT_PART
+    for rel in rels.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("Type") == OFFICE_DOCUMENT_REL:
+            return posixpath.normpath(rel.get("Target").lstrip("/"))
+    return DEFAULT_DOCUMENT_PART
+
+
+def _load(zf):
+    part = _document_part(zf)
+    try:
+        root = etree.fromstring(zf.read(part))
+    except KeyError:
+        raise DocxPatchError(f"Package has no {part} part.")
+    body = root.find(BODY)
+    if body is None:
+        raise DocxPatchError("Document has no body.")
+    return part, root, body
+
+
+def _own_runs(p):
+    """
+    Runs belonging to ``p`` itself: not the content of nested paragraphs
+    (text boxes) and not tracked deletions.
+    """
+    for run in p.iter(R):
+        ancestor = run.getparent()
+        while ancestor is not p:
+            if ancestor.tag in (P, DEL):
+                break
+            ancestor = ancestor.getparent()
+        else:
+            yield run
+
+
+def _paragraph_text(p):
+    parts = []  # text, or None for a line break
+    for run in _own_runs(p):
+        for child in run:
+            if child.tag == T and child.text:
+                parts.append(child.text)
+            elif child.tag == TAB:
+                parts.append("\t")
+            elif child.tag in (BR, CR):
+                parts.append(None)
+    text = []
+    for index, part in enumerate(parts):
+        if part is not None:
+            text.append(part)
+            continue
+        before = parts[index - 1] if index else None
+        after = parts[index + 1] if index + 1 < len(parts) else None
+        text.append("\n" if before is not None and after is not None else LINE_SEPARATOR)
+    return "".join(text)
+
+
+def _fill_run(run, text):
+    """Append ``text`` to ``run`` as w:t segments split by w:tab / w:br."""
+    for line_index, line in enumerate(LINE_BREAKS.split(text)):
+        if line_index:
+            etree.SubElement(run, BR)
+        for segment_index, segment in enumerate(line.split("\t")):
+            if segment_index:
+                etree.SubElement(run, TAB)
+            if segment:
+                t = etree.SubElement(run, T)
+                t.text = segment
+                t.set(XML_SPACE, "preserve")
+
+
+def _set_paragraph_text(p, text):
+    """
+    Replace the text of ``p`` keeping its paragraph properties, the
+    formatting of its first text run and any non-text runs (drawings,
+    fields, bookmarks).
+    """
+    target = None
+    for run in list(_own_runs(p)):
+        text_children = [child for child in run if child.tag in TEXT_TAGS]
+        if not text_children:
+            continue
+        if target is None:
+            target = run
+        for child in text_children:
+            run.remove(child)
+        if run is not target and all(child.tag == RPR for child in run):
+            run.getparent().remove(run)
+
+    if target is None:
+        target = etree.SubElement(p, R)
+    _fill_run(target, text)
+
+
+def _new_paragraph(template, text):
+    """A paragraph styled like ``template`` (or unstyled) holding ``text``."""
+    p = etree.Element(P)
+    run = None
+    if template is not None:
+        ppr = template.find(PPR)
+        if ppr is not None:
+            p.append(deepcopy(ppr))
+        for existing in _own_runs(template):
+            rpr = existing.find(RPR)
+            if rpr is not None:
+                run = etree.SubElement(p, R)
+                run.append(deepcopy(rpr))
+                break
+    if run is None:
+        run = etree.SubElement(p, R)
+    _fill_run(run, text)
+    return p
+
+
+def split_paragraphs(text):
+    return text.replace("\r\n", "\n").split(PARAGRAPH_SEPARATOR)
+
+
+def extract_text(path):
+    """Body paragraphs of the document joined with blank lines."""
+    with zipfile.ZipFile(path) as zf:
+        _, _, body = _load(zf)
+    return PARAGRAPH_SEPARATOR.join(_paragraph_text(p) for p in body.iterchildren(P))
+
+
+def patch_docx(path, new_text):
+    """
+    Apply ``new_text`` to the DOCX at ``path`` in place. Returns the number
+    of paragraphs changed, inserted or removed; the file is not rewritten
+    when that is zero.
+    """
+    with zipfile.ZipFile(path) as zf:
+        part, root, body = _load(zf)
+
+        paragraphs = list(body.iterchildren(P))
+        old = [_paragraph_text(p) for p in paragraphs]
+        new = split_paragraphs(new_text)
+
+        matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+        touched = 0
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            paired = min(i2 - i1, j2 - j1)
+            for offset in range(paired):
+                _set_paragraph_text(paragraphs[i1 + offset], new[j1 + offset])
+            for p in paragraphs[i1 + paired:i2]:
+                body.remove(p)
+            extra = new[j1 + paired:j2]
+            if extra:
+                anchor = paragraphs[i1 + paired - 1] if i1 + paired else None
+                template = anchor if anchor is not None else (paragraphs[i2] if i2 < len(paragraphs) else None)
+                _insert_paragraphs(body, anchor, template, extra)
+            touched += max(i2 - i1, j2 - j1)
+
+        if not touched:
+            return 0
+
+        document_xml = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+        _rewrite_package(zf, path, part, document_xml)
+    return touched
+
+
+def _insert_paragraphs(body, anchor, template, texts):
+    """
+    Insert new paragraphs after ``anchor``; with no anchor they go before
+    the first body paragraph (or the section properties of an empty body).
+    """
+    new_elements = [_new_paragraph(template, text) for text in texts]
+    if anchor is not None:
+        for element in reversed(new_elements):
+            anchor.addnext(element)
+        return
+    first = next(body.iterchildren(P), None)
+    if first is None:
+        first = body.find(_w("sectPr"))
+    for element in new_elements:
+        if first is not None:
+            first.addprevious(element)
+        else:
+            body.append(element)
+
+
+def _rewrite_package(zf, path, part, document_xml):
+    """
+    Write a copy of the package with ``part`` replaced next to ``path`` and
+    move it into place, so readers never see a half-written file. Every
+    other member keeps its name, timestamp, compression and attributes.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".docx")
+    try:
+        with os.fdopen(fd, "wb") as out, zipfile.ZipFile(out, "w") as zout:
+            for info in zf.infolist():
+                if info.filename == part:
+                    zout.writestr(copy(info), document_xml)
+                    continue
+                with zf.open(info) as src, zout.open(copy(info), "w") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
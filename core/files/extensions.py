@@ -0,0 +1,8 @@
+# files/extensions.py
+# File-type groups shared by the views and the PDF converters.
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.py', '.json', '.csv', '.html', '.css', '.js'}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+PDF_EXTENSIONS = {'.pdf'}
+DOCX_EXTENSIONS = {'.docx'}
+EXCEL_EXTENSIONS = {'.xlsx'}
@@ -0,0 +1,201 @@
+# files/formats.py
+"""
+Format handlers keyed by file extension.
+
+A handler knows how the editor should preview a file type, how to turn it
+into editable text and back, and how to convert it to PDF. Third-party
+libraries (python-docx/lxml, openpyxl, Pillow, fpdf2) are imported inside
+the methods that need them, so importing this module, and the views that
+use it, costs nothing until a file of that type is actually opened.
+``available()`` checks for those libraries without importing them.
+"""
+import csv
+import hashlib
+import importlib.util
+
+from io import StringIO
+
+from .converters import get_converter
+from .extensions import (
+    TEXT_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    PDF_EXTENSIONS,
+    DOCX_EXTENSIONS,
+    EXCEL_EXTENSIONS,
+)
+from .ingest import cached_text, warm_text
+
+# Larger active sheets are browse-only in the grid instead of a CSV textarea.
+EXCEL_INLINE_EDIT_MAX_CELLS = 5000
+
+HANDLERS = {}
+
+
+class FormatHandler:
+    """
+    Base handler. ``preview`` names the editor pane ('text', 'image', 'pdf'
+    or 'grid'); ``requires`` lists top-level modules the handler imports.
+    Reads and writes of ``heavy`` formats parse the whole document and run
+    under the 'edit' admission pool (files.admission).
+    """
+    extensions = ()
+    requires = ()
+    preview = None
+    editable = False
+    heavy = False
+    label = "file"
+
+    def available(self):
+        return all(importlib.util.find_spec(name) is not None for name in self.requires)
+
+    def read(self, file_obj, path):
+        """
+        (editable_text, text_preview) for the editor; either may be None.
+        """
+        return None, None
+
+    def write(self, file_obj, path, text):
+        """
+        Save edited ``text`` to ``path``. Returns the sha256 of the bytes
+        written, or '' when the handler doesn't know it.
+        """
+        raise NotImplementedError(f"Inline editing is not supported for {self.label} files.")
+
+    def converter(self, extension):
+        """
+        PDF converter for ``extension``: a callable taking (input_path,
+        job_dir) and returning the PDF path (see files.converters).
+        """
+        return get_converter(extension)
+
+
+def register(cls):
+    handler = cls()
+    for extension in cls.extensions:
+        HANDLERS[extension] = handler
+    return cls
+
+
+def get_handler(extension):
+    """Handler for ``extension``, or a preview-less default."""
+    return HANDLERS.get(extension.lower(), _DEFAULT)
+
+
+@register
+class TextFormat(FormatHandler):
+    extensions = TEXT_EXTENSIONS
+    preview = 'text'
+    editable = True
+    label = "text"
+
+    def read(self, file_obj, path):
+        # Small text files were decoded into the cache while uploading.
+        text = cached_text(file_obj.content_sha256)
+        if text is None:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    text = f.read()
+            except Exception as e:
+                return None, f"Unable to read file: {e}"
+        return text, text
+
+    def write(self, file_obj, path, text):
+        # The content hash and cached text come from the submitted bytes.
+        data = text.encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(data)
+        digest = hashlib.sha256(data).hexdigest()
+        warm_text(digest, text)
+        return digest
+
+
+@register
+class ImageFormat(FormatHandler):
+    extensions = IMAGE_EXTENSIONS
+    requires = ('PIL',)
+    preview = 'image'
+    label = "image"
+
+
+@register
+class PdfFormat(FormatHandler):
+    extensions = PDF_EXTENSIONS
+    preview = 'pdf'
+    label = "PDF"
+
+
+@register
+class DocxFormat(FormatHandler):
+    """Body paragraphs separated by blank lines; saves patch only what changed."""
+    extensions = DOCX_EXTENSIONS
+    requires = ('lxml',)
+    editable = True
+    heavy = True
+    label = "DOCX"
+
+    def read(self, file_obj, path):
+        from .docx_patch import extract_text
+
+        try:
+            text = extract_text(path)
+        except Exception as e:
+            return None, f"Unable to read DOCX content: {e}"
+        return text, text
+
+    def write(self, file_obj, path, text):
+        from .docx_patch import patch_docx
+
+        patch_docx(path, text)
+        return ''
+
+
+@register
+class XlsxFormat(FormatHandler):
+    """
+    Every sheet is browsable through the grid API; small active sheets can
+    also be edited inline as CSV.
+    """
+    extensions = EXCEL_EXTENSIONS
+    requires = ('openpyxl',)
+    preview = 'grid'
+    editable = True
+    heavy = True
+    label = "Excel"
+
+    def read(self, file_obj, path):
+        from openpyxl import load_workbook
+
+        try:
+            wb = load_workbook(path, read_only=True)
+            try:
+                ws = wb.active
+                if (ws.max_row or 0) * (ws.max_column or 0) > EXCEL_INLINE_EDIT_MAX_CELLS:
+                    return None, None
+                buffer = StringIO()
+                writer = csv.writer(buffer, lineterminator="\n")
+                for row in ws.iter_rows(values_only=True):
+                    writer.writerow("" if v is None else v for v in row)
+            finally:
+                wb.close()
+        except Exception as e:
+            return None, f"Unable to read Excel content: {e}"
+        text = buffer.getvalue()
+        return text, text
+
+    def write(self, file_obj, path, text):
+        from openpyxl import load_workbook
+
+        # Rebuild the active sheet from CSV-like text
+        wb = load_workbook(path)
+        ws = wb.active
+        for row in ws.iter_rows():
+            for cell in row:
+                cell.value = None
+        for r_idx, row in enumerate(csv.reader(StringIO(text)), start=1):
+            for c_idx, value in enumerate(row, start=1):
+                ws.cell(row=r_idx, column=c_idx, value=value)
+        wb.save(path)
+        return ''
+
+
+_DEFAULT = FormatHandler()
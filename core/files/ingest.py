@@ -0,0 +1,261 @@
+# files/ingest.py
+"""
+Single-pass upload ingest.
+
+IngestUploadHandler sits in front of Django's storage handlers and runs a
+chain of stages over every chunk as it streams in, so by the time the view
+saves the model the upload already has a profile (sha256, sniffed type,
+size, warmed text cache) and nothing has to re-open the stored file.
+
+Stages are listed in settings.UPLOAD_INGEST_STAGES as dotted paths; each is
+constructed with the handler and gets ``start`` / ``feed`` / ``finish``
+calls. ``feed`` may raise Rejected to abort the upload.
+"""
+import codecs
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils.module_loading import import_string
+
+from .extensions import TEXT_EXTENSIONS
+from .quota import remaining_quota
+
+QUOTA_EXCEEDED_MESSAGE = "Upload exceeds your storage quota."
+
+SNIFF_BYTES = 64 * 1024
+TEXT_WARMUP_MAX_BYTES = 512 * 1024
+TEXT_CACHE_TIMEOUT = 60 * 60
+
+# (offset, signature, mime type); the first match wins.
+MAGIC_SIGNATURES = [
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+]
+# OOXML packages are ZIPs; the part names in the first local headers tell
+# Word from Excel.
+OOXML_MARKERS = [
+    (b'word/', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    (b'xl/', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+]
+
+
+class Rejected(Exception):
+    """Raised by a stage to refuse an upload; the message is shown to the user."""
+
+
+def text_cache_key(sha256):
+    return f"ingest:text:{sha256}"
+
+
+def cached_text(sha256):
+    """Decoded text of a small text file with this content hash, if warmed."""
+    if not sha256:
+        return None
+    return cache.get(text_cache_key(sha256))
+
+
+def warm_text(sha256, text):
+    """
+    Cache ``text`` as the editor would read it back from disk (universal
+    newlines); texts over the warm-up limit are skipped.
+    """
+    if len(text) > TEXT_WARMUP_MAX_BYTES:
+        return
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    cache.set(text_cache_key(sha256), text, timeout=TEXT_CACHE_TIMEOUT)
+
+
+def sniff_type(head):
+    """Best-effort MIME type from the first bytes of a file."""
+    for offset, signature, mime in MAGIC_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if mime == 'application/zip':
+                for marker, ooxml_mime in OOXML_MARKERS:
+                    if marker in head:
+                        return ooxml_mime
+            return mime
+    if not head:
+        return 'application/x-empty'
+    if b'\x00' in head:
+        return 'application/octet-stream'
+    try:
+        # A multi-byte character may be cut at the end of the sample.
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+    except UnicodeDecodeError:
+        return 'application/octet-stream'
+    return 'text/plain'
+
+
+# -------------------------
+# Stages
+# -------------------------
+class IngestStage:
+    def __init__(self, handler):
+        self.handler = handler
+
+    def start(self, file_name, content_type):
+        pass
+
+    def feed(self, chunk):
+        pass
+
+    def finish(self, profile):
+        pass
+
+
+class HashStage(IngestStage):
+    def start(self, file_name, content_type):
+        self.digest = hashlib.sha256()
+
+    def feed(self, chunk):
+        self.digest.update(chunk)
+
+    def finish(self, profile):
+        profile['sha256'] = self.digest.hexdigest()
+
+
+class SniffStage(IngestStage):
+    def start(self, file_name, content_type):
+        self.head = bytearray()
+
+    def feed(self, chunk):
+        if len(self.head) < SNIFF_BYTES:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+
+    def finish(self, profile):
+        profile['detected_type'] = sniff_type(bytes(self.head))
+
+
+class SizeStage(IngestStage):
+    """Counts bytes and enforces the uploader's remaining storage quota."""
+
+    def start(self, file_name, content_type):
+        self.size = 0
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        remaining = self.handler.quota_remaining
+        if remaining is not None and self.size > remaining:
+            self.handler.exceeded = True
+            raise Rejected(QUOTA_EXCEEDED_MESSAGE)
+
+    def finish(self, profile):
+        profile['size'] = self.size
+
+
+class TextWarmupStage(IngestStage):
+    """
+    Keeps the decoded text of small text uploads and caches it under the
+    content hash, so the first editor load does not read the file back.
+    """
+
+    def start(self, file_name, content_type):
+        extension = os.path.splitext(file_name or '')[1].lower()
+        self.buffer = bytearray() if extension in TEXT_EXTENSIONS else None
+
+    def feed(self, chunk):
+        if self.buffer is None:
+            return
+        if len(self.buffer) + len(chunk) > TEXT_WARMUP_MAX_BYTES:
+            self.buffer = None
+        else:
+            self.buffer += chunk
+
+    def finish(self, profile):
+        if self.buffer is not None and profile.get('sha256'):
+            warm_text(profile['sha256'], bytes(self.buffer).decode('utf-8', errors='ignore'))
+
+
+class ScannerStage(IngestStage):
+    """
+    Hook for a content scanner. settings.UPLOAD_SCANNER is a dotted path to
+    a factory returning an object with ``feed(chunk)`` and ``verdict()``;
+    a non-empty verdict is the rejection reason. Without it this is a no-op.
+    """
+
+    def start(self, file_name, content_type):
+        path = getattr(settings, 'UPLOAD_SCANNER', None)
+        self.scanner = import_string(path)() if path else None
+
+    def feed(self, chunk):
+        if self.scanner:
+            self.scanner.feed(chunk)
+
+    def finish(self, profile):
+        if self.scanner:
+            verdict = self.scanner.verdict()
+            profile['scan'] = verdict or 'clean'
+            if verdict:
+                self.handler.rejected = f"Upload rejected by scanner: {verdict}"
+
+
+# -------------------------
+# Handler
+# -------------------------
+class IngestUploadHandler(FileUploadHandler):
+    """
+    Runs the ingest stages over each chunk and passes the data on unchanged
+    to the handler that stores it. Must be installed before request.POST /
+    request.FILES are accessed.
+    """
+
+    def __init__(self, request=None, quota_remaining=None):
+        super().__init__(request)
+        self.quota_remaining = quota_remaining
+        self.stage_classes = [import_string(path) for path in settings.UPLOAD_INGEST_STAGES]
+        self.profiles = {}
+        self.exceeded = False
+        self.rejected = None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.stages = [cls(self) for cls in self.stage_classes]
+        for stage in self.stages:
+            stage.start(file_name, content_type)
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            for stage in self.stages:
+                stage.feed(raw_data)
+        except Rejected as e:
+            self.rejected = str(e)
+            # Drain the rest of the request without storing it so the user
+            # still gets a normal error page.
+            raise StopUpload(connection_reset=False)
+        return raw_data
+
+    def file_complete(self, file_size):
+        profile = {}
+        for stage in self.stages:
+            stage.finish(profile)
+        self.profiles[self.field_name] = profile
+        return None
+
+    def profile(self, field_name='file'):
+        return self.profiles.get(field_name, {})
+
+    def apply(self, file_obj, field_name='file'):
+        """Copy the ingest profile of ``field_name`` onto an UploadedFile."""
+        profile = self.profile(field_name)
+        file_obj.content_sha256 = profile.get('sha256', '')
+        file_obj.detected_type = profile.get('detected_type', '')
+
+
+def install_ingest_handler(request, credit=0):
+    """
+    Put an IngestUploadHandler in front of the default handlers, once the
+    caller has checked the user may upload at all. ``credit`` is added back
+    to the quota for uploads that replace an existing file.
+    """
+    handler = IngestUploadHandler(request, remaining_quota(request.user, credit=credit))
+    request.upload_handlers.insert(0, handler)
+    return handler
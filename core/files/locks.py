@@ -0,0 +1,118 @@
+# files/locks.py
+"""
+Coordination helpers: advisory file locks that work across processes (one
+at a time, or the first free one of a set, used as semaphore slots by
+files.admission) and a thread-level single-flight group that lets
+concurrent callers share one in-flight result.
+"""
+import os
+import threading
+import time
+
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _try_lock(fd):
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path, blocking=True, poll_interval=0.05):
+    """
+    Hold an exclusive advisory lock on ``path`` (created if missing).
+    Yields True once the lock is held; with ``blocking=False`` yields False
+    immediately if another holder has it.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    acquired = False
+    try:
+        if fcntl and blocking:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            acquired = True
+        else:
+            acquired = _try_lock(fd)
+            while blocking and not acquired:
+                time.sleep(poll_interval)
+                acquired = _try_lock(fd)
+        yield acquired
+    finally:
+        if acquired:
+            _unlock(fd)
+        os.close(fd)
+
+
+def acquire_any(paths):
+    """
+    Take the first free lock among ``paths`` without blocking. Returns the
+    open descriptor that holds it (pass it to release()), or None when every
+    lock is held.
+    """
+    for path in paths:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if _try_lock(fd):
+            return fd
+        os.close(fd)
+    return None
+
+
+def release(fd):
+    _unlock(fd)
+    os.close(fd)
+
+
+class SingleFlight:
+    """
+    Run ``fn`` once per key at a time within this process. Callers that
+    arrive while a call for the same key is running wait for it and receive
+    the same result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -0,0 +1,64 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from files.converters import CONVERTERS, convert_with_libreoffice, get_converter
+
+
+class Command(BaseCommand):
+    help = (
+        "Time PDF conversion per file type over a sample corpus (dummy_files by default), "
+        "comparing the registered converter with LibreOffice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Files to convert (default: every file in dummy_files/).")
+        parser.add_argument('--repeat', type=int, default=5, help="Conversions per file and converter.")
+        parser.add_argument('--with-libreoffice', action='store_true', help="Also time soffice for natively handled types.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_corpus()
+        self.stdout.write(f"{'file':<32} {'converter':<26} {'median ms':>10} {'min ms':>9} {'pdf bytes':>10}")
+
+        for path in paths:
+            extension = os.path.splitext(path)[1].lower()
+            converters = [get_converter(extension)]
+            if options['with_libreoffice'] and extension in CONVERTERS:
+                converters.append(convert_with_libreoffice)
+            for converter in converters:
+                self.report(path, converter, options['repeat'])
+
+    def default_corpus(self):
+        corpus = os.path.join(settings.BASE_DIR, 'dummy_files')
+        return sorted(os.path.join(corpus, name) for name in os.listdir(corpus))
+
+    def report(self, path, converter, repeat):
+        timings = []
+        size = 0
+        error = None
+        for _ in range(repeat):
+            job_dir = tempfile.mkdtemp(prefix='bench-')
+            try:
+                started = time.perf_counter()
+                output = converter(path, job_dir)
+                timings.append((time.perf_counter() - started) * 1000)
+                size = os.path.getsize(output)
+            except Exception as e:
+                error = e
+                break
+            finally:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+        name = os.path.basename(path)[:32]
+        if error is not None:
+            self.stdout.write(f"{name:<32} {converter.__name__:<26} failed: {error}")
+            return
+        self.stdout.write(
+            f"{name:<32} {converter.__name__:<26} {statistics.median(timings):>10.1f} "
+            f"{min(timings):>9.1f} {size:>10}"
+        )
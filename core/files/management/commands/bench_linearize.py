@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from files.converters import get_converter
+from files.pdf_optimize import optimize_pdf, first_page_bytes
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert a sample corpus (dummy_files by default) to PDF, run the fast-web-view "
+        "optimisation and report size reduction and estimated time to first page."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Files to test (default: every file in dummy_files/).")
+        parser.add_argument('--mbps', type=float, default=10.0, help="Link speed used for the time-to-first-page estimate.")
+
+    def handle(self, *args, **options):
+        corpus = os.path.join(settings.BASE_DIR, 'dummy_files')
+        paths = options['paths'] or sorted(os.path.join(corpus, name) for name in os.listdir(corpus))
+        bytes_per_ms = options['mbps'] * 1_000_000 / 8 / 1000
+
+        self.stdout.write(
+            f"{'file':<28} {'before':>9} {'after':>9} {'saved':>7} {'opt ms':>7} "
+            f"{'first page before':>18} {'first page after':>17}"
+        )
+        for path in paths:
+            job_dir = tempfile.mkdtemp(prefix='bench-linearize-')
+            try:
+                extension = os.path.splitext(path)[1].lower()
+                try:
+                    pdf = get_converter(extension)(path, job_dir)
+                except Exception as e:
+                    self.stdout.write(f"{os.path.basename(path)[:28]:<28} conversion failed: {e}")
+                    continue
+
+                started = time.perf_counter()
+                optimized = optimize_pdf(pdf, force=True)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if optimized == pdf:
+                    self.stdout.write(f"{os.path.basename(path)[:28]:<28} not optimised (no qpdf/pikepdf, or invalid PDF)")
+                    continue
+
+                before = os.path.getsize(pdf)
+                after = os.path.getsize(optimized)
+                # Without linearization the viewer needs the whole file (xref is at the end).
+                first_before = first_page_bytes(pdf) or before
+                first_after = first_page_bytes(optimized) or after
+                self.stdout.write(
+                    f"{os.path.basename(path)[:28]:<28} {before:>9} {after:>9} {1 - after / before:>7.1%} {elapsed_ms:>7.1f} "
+                    f"{first_before / bytes_per_ms:>15.1f} ms {first_after / bytes_per_ms:>14.1f} ms"
+                )
+            finally:
+                shutil.rmtree(job_dir, ignore_errors=True)
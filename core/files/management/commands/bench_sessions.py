@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from files.models import UploadedFile
+
+# (label, SESSION_ENGINE, MESSAGE_STORAGE); the first row is Django's default
+# setup, i.e. how every request was served before SESSION_BACKEND existed.
+SETUPS = [
+    ('db + fallback messages', 'django.contrib.sessions.backends.db',
+     'django.contrib.messages.storage.fallback.FallbackStorage'),
+    ('cached_db + cookie messages', 'django.contrib.sessions.backends.cached_db',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+    ('signed_cookies + cookie messages', 'django.contrib.sessions.backends.signed_cookies',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Count database queries per request on file_list and file_detail for a "
+        "logged-in user under each session / message storage setup. Runs in a "
+        "transaction that is rolled back, so the sessions it creates are not kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Username to browse as (default: the first active user).")
+        parser.add_argument('--file', type=int, help="File id for file_detail (default: the newest file).")
+        parser.add_argument('--requests', type=int, default=20, help="Measured requests per page and setup.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        user = (users.filter(username=options['user']) if options['user'] else users.order_by('pk')).first()
+        if user is None:
+            raise CommandError("No matching active user.")
+        files = UploadedFile.objects.all()
+        file_obj = (files.filter(pk=options['file']) if options['file'] else files.order_by('-pk')).first()
+        if file_obj is None:
+            raise CommandError("No file to open; upload one or pass --file.")
+        pages = [
+            ('file_list', reverse('file_list')),
+            ('file_detail', reverse('file_detail', args=[file_obj.pk])),
+        ]
+
+        self.stdout.write(f"{'setup':<34} {'page':<12} {'queries/req':>11} {'session/req':>11}")
+        with transaction.atomic():
+            for label, engine, storage in SETUPS:
+                with override_settings(SESSION_ENGINE=engine, MESSAGE_STORAGE=storage):
+                    client = Client()
+                    client.force_login(user)
+                    for page, url in pages:
+                        queries, session_queries = self.measure(client, url, options['requests'])
+                        self.stdout.write(f"{label:<34} {page:<12} {queries:>11.1f} {session_queries:>11.1f}")
+            transaction.set_rollback(True)
+
+    def measure(self, client, url, count):
+        client.get(url)  # warm the fragment and session caches
+        total = session = 0
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url} returned {response.status_code}.")
+            total += len(captured)
+            session += sum('django_session' in query['sql'] for query in captured)
+        return total / count, session / count
@@ -0,0 +1,108 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter per sample so nothing is already imported.
+PROBE = r"""
+import importlib, json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+t2 = time.perf_counter()
+first_request_ms = None
+try:
+    from django.test import Client
+    started = time.perf_counter()
+    Client().get('/admin/login/')
+    first_request_ms = (time.perf_counter() - started) * 1000
+except Exception as e:
+    first_request_ms = repr(e)
+heavy = [m for m in ('docx', 'openpyxl', 'lxml', 'PIL', 'fpdf', 'pikepdf') if m in sys.modules]
+handlers = {}
+from files.formats import HANDLERS
+for handler in dict.fromkeys(HANDLERS.values()):
+    started = time.perf_counter()
+    for name in handler.requires:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    handlers[type(handler).__name__] = (time.perf_counter() - started) * 1000
+print(json.dumps({
+    'setup_ms': (t1 - t0) * 1000,
+    'urls_ms': (t2 - t1) * 1000,
+    'boot_ms': (t2 - t0) * 1000,
+    'first_request_ms': first_request_ms,
+    'loaded_at_boot': heavy,
+    'handler_first_use_ms': handlers,
+}))
+"""
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker cold start in fresh interpreters: django.setup(), URLconf and WSGI "
+        "app load, first request, and the deferred import cost of each format handler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters to sample.")
+        parser.add_argument('--top', type=int, default=10, help="Slowest top-level imports to list.")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        samples = []
+        importtime = ''
+        for index in range(options['repeat']):
+            cmd = [sys.executable, '-c', PROBE]
+            if index == 0:
+                cmd[1:1] = ['-X', 'importtime']
+            result = subprocess.run(cmd, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            if result.returncode:
+                self.stderr.write(result.stderr)
+                return
+            samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            if index == 0:
+                importtime = result.stderr
+        # The first run pays for -X importtime and cold file caches.
+        warm = samples[1:] or samples
+
+        for key in ('setup_ms', 'urls_ms', 'boot_ms'):
+            values = [s[key] for s in warm]
+            self.stdout.write(f"{key:<18} median {statistics.median(values):8.1f}  min {min(values):8.1f}")
+        first = [s['first_request_ms'] for s in warm if isinstance(s['first_request_ms'], float)]
+        if first:
+            self.stdout.write(f"{'first_request_ms':<18} median {statistics.median(first):8.1f}  min {min(first):8.1f}")
+        else:
+            self.stdout.write(f"first request failed: {warm[0]['first_request_ms']}")
+
+        loaded = warm[0]['loaded_at_boot']
+        self.stdout.write(f"heavy modules loaded at boot: {', '.join(loaded) if loaded else 'none'}")
+        self.stdout.write("format handler first use (ms, in registry order, shared deps counted once):")
+        for name, ms in warm[0]['handler_first_use_ms'].items():
+            self.stdout.write(f"  {name:<16} {ms:8.1f}")
+
+        self.stdout.write("slowest top-level imports over the whole probe (cumulative ms, -X importtime):")
+        for ms, name in self.top_imports(importtime, options['top']):
+            self.stdout.write(f"  {name:<32} {ms:8.1f}")
+
+    def top_imports(self, importtime, top):
+        totals = []
+        for match in IMPORTTIME_RE.finditer(importtime):
+            cumulative, indent, name = match.group(2), match.group(3), match.group(4)
+            if len(indent) == 1:  # top-level entries only
+                totals.append((int(cumulative) / 1000, name))
+        return sorted(totals, reverse=True)[:top]
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from files.telemetry import conversion_histograms, RUNTIME_BUCKETS_MS
+
+
+class Command(BaseCommand):
+    help = "Summarise conversion telemetry per input type, most expensive first."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Only include conversions from the last N days.")
+
+    def handle(self, *args, **options):
+        rows = conversion_histograms(days=options['days'])
+        if not rows:
+            self.stdout.write("No conversions recorded.")
+            return
+
+        total_runtime = sum(row['runtime_ms_sum'] or 0 for row in rows) or 1
+        self.stdout.write(
+            f"{'ext':<8} {'size':<10} {'converter':<26} {'count':>6} {'fail':>5} {'reuse':>5} "
+            f"{'avg ms':>9} {'p50<=':>7} {'p95<=':>7} {'wait ms':>8} {'share':>6}"
+        )
+        for row in rows:
+            runtime = row['runtime_ms_sum'] or 0
+            converted = row['count'] - row['reused']
+            self.stdout.write(
+                f"{row['extension']:<8} {row['size_bucket']:<10} {row['converter'][:26]:<26} "
+                f"{row['count']:>6} {row['failed']:>5} {row['reused']:>5} "
+                f"{runtime / converted if converted else 0:>9.1f} "
+                f"{self.quantile(row, 0.5):>7} {self.quantile(row, 0.95):>7} "
+                f"{row['queue_wait_ms_avg'] or 0:>8.1f} {runtime / total_runtime:>6.1%}"
+            )
+
+    def quantile(self, row, q):
+        # Smallest histogram bound that covers q of the observations.
+        target = q * row['count']
+        for limit in RUNTIME_BUCKETS_MS:
+            if row['buckets'][str(limit)] >= target:
+                return limit
+        return '+Inf'
@@ -0,0 +1,146 @@
+import os
+import shutil
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from files.models import UploadedFile
+
+MEDIA_SUBDIRS = ('uploads', 'converted', 'edits')
+RECHECK_BATCH = 500
+
+
+def _scan(root, subdir):
+    """
+    Walk MEDIA_ROOT/<subdir> with os.scandir and return (name, size, mtime)
+    for every file, where name is relative to MEDIA_ROOT using '/' like
+    FileField names. Dot-directories (scratch space) are skipped.
+    """
+    found = []
+    stack = [subdir]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    rel = f"{rel_dir}/{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(rel)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        found.append((rel, st.st_size, st.st_mtime))
+        except FileNotFoundError:
+            continue
+    return found
+
+
+def _referenced(names):
+    """The subset of ``names`` that some UploadedFile references right now."""
+    referenced = set()
+    for start in range(0, len(names), RECHECK_BATCH):
+        batch = names[start:start + RECHECK_BATCH]
+        rows = UploadedFile.objects.filter(Q(file__in=batch) | Q(converted__in=batch)).values_list('file', 'converted')
+        for row in rows:
+            referenced.update(row)
+    return referenced.intersection(names)
+
+
+class Command(BaseCommand):
+    help = (
+        "Find files under uploads/, converted/ and edits/ in media storage (MEDIA_ROOT "
+        "or the S3 bucket) that no UploadedFile references, and report, delete or "
+        "quarantine them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help="Delete orphans (default is a dry run).")
+        parser.add_argument('--quarantine', metavar='DIR', help="Move orphans into DIR instead of deleting them.")
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help="Ignore files modified in the last N seconds (in-flight uploads and conversions).",
+        )
+        parser.add_argument('--list', action='store_true', dest='list_orphans', help="Print every orphan.")
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        storage = UploadedFile._meta.get_field('file').storage
+        # Object storage lists a whole prefix per request instead.
+        remote_scan = getattr(storage, 'scan', None)
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=len(MEDIA_SUBDIRS)) as pool:
+            if remote_scan:
+                scans = pool.map(lambda subdir: list(remote_scan(f"{subdir}/")), MEDIA_SUBDIRS)
+            else:
+                scans = pool.map(lambda subdir: _scan(root, subdir), MEDIA_SUBDIRS)
+            # Fetch referenced names while the scans run.
+            referenced = set()
+            for name, converted in UploadedFile.objects.values_list('file', 'converted').iterator(chunk_size=2000):
+                if name:
+                    referenced.add(name.replace('\\', '/'))
+                if converted:
+                    referenced.add(converted.replace('\\', '/'))
+            found = [item for scan in scans for item in scan]
+
+        scan_seconds = time.perf_counter() - started
+        cutoff = time.time() - options['min_age']
+        orphans = [(name, size) for name, size, mtime in found if name not in referenced and mtime < cutoff]
+
+        scanned_bytes = sum(size for _, size, _ in found)
+        orphan_bytes = sum(size for _, size in orphans)
+        rate = len(found) / scan_seconds if scan_seconds else 0
+        self.stdout.write(
+            f"Scanned {len(found)} file(s), {scanned_bytes} bytes in {scan_seconds:.3f}s "
+            f"({rate:.0f} files/s); {len(referenced)} referenced."
+        )
+
+        if options['list_orphans']:
+            for name, size in orphans:
+                self.stdout.write(f"  {name} ({size} bytes)")
+
+        if not (options['apply'] or options['quarantine']):
+            self.stdout.write(f"[dry run] {len(orphans)} orphan(s), {orphan_bytes} bytes reclaimable.")
+            return
+
+        # Uploads, edits and conversions that finished during the scan
+        # reference their files by now; never remove those.
+        taken = _referenced([name for name, _ in orphans])
+        if taken:
+            orphans = [(name, size) for name, size in orphans if name not in taken]
+            orphan_bytes = sum(size for _, size in orphans)
+            self.stdout.write(f"Skipping {len(taken)} file(s) referenced since the scan.")
+
+        started = time.perf_counter()
+        removed = 0
+        failed = 0
+        for name, _ in orphans:
+            path = os.path.join(root, *name.split('/'))
+            try:
+                target = None
+                if options['quarantine']:
+                    target = os.path.join(options['quarantine'], *name.split('/'))
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                if remote_scan:
+                    if target:
+                        storage.download(name, target)
+                    storage.delete(name)
+                elif target:
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+                removed += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Could not remove {name}: {e}")
+
+        verb = "Quarantined" if options['quarantine'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {removed} orphan(s), {orphan_bytes} bytes in {time.perf_counter() - started:.3f}s"
+            + (f"; {failed} failed." if failed else ".")
+        ))
@@ -0,0 +1,117 @@
+import json
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from files.models import Notification, UserActivity
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete (optionally archiving) read notifications older than the retention window, "
+        "and collapse unread ones that old about the same file and of the same type into one digest row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+            help="Delete read notifications older than this many days.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per DELETE statement.")
+        parser.add_argument('--archive', metavar='PATH', help="Append deleted rows to this JSON-lines file first.")
+        parser.add_argument('--no-compact', action='store_true', help="Skip collapsing repeated notifications.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would change.")
+
+    def handle(self, *args, **options):
+        before = Notification.objects.count()
+        self.stdout.write(f"Notifications before: {before}")
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        collapsed = 0 if options['no_compact'] else self.compact(cutoff, options['dry_run'])
+        pruned = self.prune(cutoff, options['batch_size'], options['archive'], options['dry_run'])
+
+        after = Notification.objects.count()
+        prefix = "[dry run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Collapsed {collapsed} row(s) into digests, pruned {pruned} read row(s). "
+            f"Notifications after: {after} (was {before})."
+        ))
+
+    def compact(self, cutoff, dry_run):
+        """
+        Unread notifications older than ``cutoff`` are never pruned. Collapse
+        those about the same file and of the same type into the newest one,
+        whose digest_count says how many updates it replaces.
+        """
+        stale_unread = Notification.objects.filter(
+            related_file__isnull=False, is_read=False, created_at__lt=cutoff,
+        )
+        # Materialized first: the loop rewrites the table the GROUP BY reads.
+        groups = list(
+            stale_unread
+            .values('recipient_id', 'related_file_id', 'notification_type')
+            .annotate(total=Count('id'), latest_id=Max('id'))
+            .filter(total__gt=1)
+            .order_by()
+        )
+        if dry_run:
+            return sum(group['total'] - 1 for group in groups)
+
+        collapsed = 0
+        for group in groups:
+            # One transaction per group so the rows and the unread counter
+            # never disagree, even if the command dies halfway.
+            with transaction.atomic():
+                latest = stale_unread.select_for_update().filter(pk=group['latest_id']).first()
+                if latest is None:  # read or dismissed since the GROUP BY
+                    continue
+                older = list(
+                    stale_unread.select_for_update()
+                    .filter(
+                        recipient_id=group['recipient_id'],
+                        related_file_id=group['related_file_id'],
+                        notification_type=group['notification_type'],
+                        id__lt=latest.pk,
+                    )
+                    .values_list('id', 'digest_count')
+                )
+                if not older:
+                    continue
+                latest.digest_count += sum(1 + digest_count for _, digest_count in older)
+                latest.save(update_fields=['digest_count'])
+                Notification.objects.filter(id__in=[pk for pk, _ in older]).delete()
+                UserActivity.adjust(group['recipient_id'], unread_notifications=-len(older))
+            collapsed += len(older)
+        return collapsed
+
+    def prune(self, cutoff, batch_size, archive_path, dry_run):
+        expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('id')
+        if dry_run:
+            return expired.count()
+
+        archive = open(archive_path, 'a', encoding='utf-8') if archive_path else None
+        pruned = 0
+        try:
+            while True:
+                batch = list(expired.values(
+                    'id', 'recipient_id', 'sender_id', 'notification_type',
+                    'message', 'digest_count', 'related_file_id', 'created_at',
+                )[:batch_size])
+                if not batch:
+                    break
+                if archive:
+                    for row in batch:
+                        row['created_at'] = row['created_at'].isoformat()
+                        archive.write(json.dumps(row) + "\n")
+                    archive.flush()
+                Notification.objects.filter(id__in=[row['id'] for row in batch]).delete()
+                pruned += len(batch)
+        finally:
+            if archive:
+                archive.close()
+        return pruned
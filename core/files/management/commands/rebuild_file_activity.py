@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from files.models import UploadedFile, UploadedFileVersion, Comment
+
+
+def _per_file(model, aggregate):
+    return Subquery(
+        model.objects.filter(file=OuterRef('pk'))
+        .order_by().values('file').annotate(value=aggregate).values('value')
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount comments and versions per file and recompute last activity, "
+        "overwriting the maintained columns on UploadedFile in one UPDATE. Only "
+        "needed to repair drift, e.g. after rows were changed outside the app."
+    )
+
+    def handle(self, *args, **options):
+        updated = UploadedFile.objects.update(
+            comment_count=Coalesce(_per_file(Comment, Count('pk')), 0),
+            version_count=Coalesce(_per_file(UploadedFileVersion, Count('pk')), 0),
+            last_activity_at=Greatest(
+                F('uploaded_at'),
+                Coalesce(_per_file(Comment, Max('created_at')), F('uploaded_at')),
+                Coalesce(_per_file(UploadedFileVersion, Max('created_at')), F('uploaded_at')),
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt activity counters for {updated} file(s)."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from files.models import UploadedFile, StatusCounter
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount files per status and overwrite StatusCounter. Only needed to "
+        "repair drift, e.g. after rows were changed outside the app."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = dict(
+                UploadedFile.objects.order_by().values_list('status').annotate(total=Count('id'))
+            )
+            StatusCounter.objects.all().delete()
+            StatusCounter.objects.bulk_create(
+                [StatusCounter(status=status, count=total) for status, total in counts.items()]
+            )
+        for status, total in sorted(counts.items()):
+            self.stdout.write(f"{status}: {total}")
+        self.stdout.write(self.style.SUCCESS("Status counters rebuilt."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from files.models import UploadedFile, UploadedFileVersion, UserStorage
+from files.quota import refresh_storage_usage
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure every stored file once and rebuild UserStorage totals from scratch. "
+        "Only needed to backfill existing data or repair drift."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            UserStorage.objects.all().delete()
+            UploadedFile.objects.update(file_size=0, converted_size=0)
+            count = 0
+            for file_obj in UploadedFile.objects.iterator():
+                refresh_storage_usage(file_obj, new_file=True)
+                UploadedFileVersion.objects.filter(file=file_obj, file_size=0).update(file_size=file_obj.file_size)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt storage usage for {count} file(s)."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from files.models import UploadedFile, Notification, UserActivity, AWAITING_REVIEW
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount each user's files awaiting review and unread notifications and "
+        "overwrite UserActivity. Only needed to repair drift, e.g. after rows were "
+        "changed outside the app."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            pending = dict(
+                UploadedFile.objects.filter(status__in=AWAITING_REVIEW, owner__isnull=False)
+                .order_by().values_list('owner_id').annotate(total=Count('id'))
+            )
+            unread = dict(
+                Notification.objects.filter(is_read=False)
+                .order_by().values_list('recipient_id').annotate(total=Count('id'))
+            )
+            UserActivity.objects.all().delete()
+            UserActivity.objects.bulk_create([
+                UserActivity(user_id=pk, pending_reviews=pending.get(pk, 0), unread_notifications=unread.get(pk, 0))
+                for pk in set(pending) | set(unread)
+            ], batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt activity counters for {len(set(pending) | set(unread))} user(s): "
+            f"{sum(pending.values())} file(s) awaiting review, {sum(unread.values())} unread notification(s)."
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_uploadedfile_reviewed_at_uploadedfile_reviewed_by_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('file_id', models.BigIntegerField(db_index=True)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('edited', 'Edited'), ('replaced', 'Replaced'), ('converted', 'Converted'), ('status_changed', 'Status changed'), ('commented', 'Commented'), ('deleted', 'Deleted')], max_length=20)),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('version_label', models.CharField(blank=True, max_length=10)),
+                ('status', models.CharField(blank=True, choices=[('pending', 'Pending'), ('in_review', 'In review'), ('approved', 'Approved'), ('rejected', 'Rejected')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_storage_accounting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='converted_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_converted_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_id', models.BigIntegerField(blank=True, null=True)),
+                ('extension', models.CharField(max_length=16)),
+                ('size_bucket', models.CharField(max_length=16)),
+                ('input_size', models.BigIntegerField(default=0)),
+                ('output_size', models.BigIntegerField(default=0)),
+                ('converter', models.CharField(blank=True, max_length=64)),
+                ('queue_wait_ms', models.FloatField(default=0)),
+                ('runtime_ms', models.FloatField(default=0)),
+                ('outcome', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed'), ('reused', 'Reused existing PDF')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_notification_inbox_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='content_sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='detected_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
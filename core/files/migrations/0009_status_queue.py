@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_status_counters(apps, schema_editor):
+    UploadedFile = apps.get_model('files', 'UploadedFile')
+    StatusCounter = apps.get_model('files', 'StatusCounter')
+    rows = UploadedFile.objects.order_by().values('status').annotate(total=Count('id'))
+    StatusCounter.objects.bulk_create([StatusCounter(status=row['status'], count=row['total']) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_upload_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusCounter',
+            fields=[
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_review', 'In review'), ('approved', 'Approved'), ('rejected', 'Rejected')], max_length=20, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['status', 'uploaded_at'], name='file_status_queue_idx'),
+        ),
+        migrations.RunPython(seed_status_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_user_activity(apps, schema_editor):
+    UploadedFile = apps.get_model('files', 'UploadedFile')
+    Notification = apps.get_model('files', 'Notification')
+    UserActivity = apps.get_model('files', 'UserActivity')
+    pending = dict(
+        UploadedFile.objects.filter(status__in=['pending', 'in_review'], owner__isnull=False)
+        .order_by().values_list('owner_id').annotate(total=Count('id'))
+    )
+    unread = dict(
+        Notification.objects.filter(is_read=False)
+        .order_by().values_list('recipient_id').annotate(total=Count('id'))
+    )
+    UserActivity.objects.bulk_create([
+        UserActivity(user_id=pk, pending_reviews=pending.get(pk, 0), unread_notifications=unread.get(pk, 0))
+        for pk in set(pending) | set(unread)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_status_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pending_reviews', models.IntegerField(default=0)),
+                ('unread_notifications', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(seed_user_activity, migrations.RunPython.noop),
+    ]
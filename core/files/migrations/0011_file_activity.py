@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:48
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def seed_file_activity(apps, schema_editor):
+    UploadedFile = apps.get_model('files', 'UploadedFile')
+    UploadedFileVersion = apps.get_model('files', 'UploadedFileVersion')
+    Comment = apps.get_model('files', 'Comment')
+
+    def per_file(model, aggregate):
+        return Subquery(
+            model.objects.filter(file=OuterRef('pk'))
+            .order_by().values('file').annotate(value=aggregate).values('value')
+        )
+
+    UploadedFile.objects.update(
+        comment_count=Coalesce(per_file(Comment, Count('pk')), 0),
+        version_count=Coalesce(per_file(UploadedFileVersion, Count('pk')), 0),
+        last_activity_at=Greatest(
+            F('uploaded_at'),
+            Coalesce(per_file(Comment, Max('created_at')), F('uploaded_at')),
+            Coalesce(per_file(UploadedFileVersion, Max('created_at')), F('uploaded_at')),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_user_activity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='version_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['-last_activity_at', '-id'], name='file_activity_idx'),
+        ),
+        migrations.RunPython(seed_file_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:20
+
+import re
+
+from django.db import migrations, models
+
+# Digests used to carry their count in the message text.
+OLD_DIGEST_SUFFIX = re.compile(r" \(\+(\d+) earlier update\(s\) about this file\)$")
+
+
+def move_digest_counts(apps, schema_editor):
+    Notification = apps.get_model('files', 'Notification')
+    digests = Notification.objects.filter(message__endswith=' earlier update(s) about this file)')
+    for notification in digests.only('id', 'message').iterator():
+        match = OLD_DIGEST_SUFFIX.search(notification.message)
+        if match:
+            Notification.objects.filter(pk=notification.pk).update(
+                message=notification.message[:match.start()],
+                digest_count=int(match.group(1)),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_file_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='digest_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(move_digest_counts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,20 @@
 # files/models
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 import os
 from decimal import Decimal
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import (
+    invalidate_file_card,
+    bump_fragment_generation,
+    VERSIONS_BLOCK,
+    COMMENTS_BLOCK,
+)
+from .scratch import discard
 
 
 class FileStatus(models.TextChoices):
@@ -17,6 +29,41 @@ class ChangeTypes(models.TextChoices):
     MAJOR = ('major', 'Major (+1.0)')
 
 
+ACTIVITY_FIELDS = ('comment_count', 'version_count', 'last_activity_at')
+# Changed by files.review.transition or resubmit(); save_content() leaves them alone.
+REVIEW_FIELDS = ('status', 'reviewed_by', 'reviewed_at')
+
+
+class UploadedFileQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Delete the files one by one through UploadedFile.delete(), so bulk
+        deletes (the admin's "delete selected" included) keep the counters
+        and clean up storage too. Deleting an owner still cascades in SQL:
+        run the rebuild_* commands and gc_media after removing users.
+        """
+        deleted, per_model = 0, {}
+        with transaction.atomic():
+            for file_obj in self.order_by('pk').select_for_update():
+                count, detail = file_obj.delete()
+                deleted += count
+                for label, n in detail.items():
+                    per_model[label] = per_model.get(label, 0) + n
+        return deleted, per_model
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+def _remove_stored(stored):
+    for storage, name in stored:
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+        discard(name)
+
+
 class UploadedFile(models.Model):
     file = models.FileField(upload_to="uploads/")
     filename = models.CharField(max_length=255, blank=True)
@@ -29,25 +76,119 @@ class UploadedFile(models.Model):
     reviewed_at = models.DateTimeField(blank=True, null=True)
     # owner: who uploaded this file
     owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='uploaded_files')
+    # bytes on disk, kept in sync by files.quota so totals never need a filesystem walk
+    file_size = models.BigIntegerField(default=0)
+    converted_size = models.BigIntegerField(default=0)
+    # sha256 of the original the current PDF was produced from
+    converted_sha256 = models.CharField(max_length=64, blank=True)
+    # Profile of the current original, filled in while it streamed in
+    # (files.ingest); content_sha256 is cleared when an editor rewrites the
+    # file without knowing the new bytes.
+    content_sha256 = models.CharField(max_length=64, blank=True)
+    detected_type = models.CharField(max_length=100, blank=True)
+    # Maintained by record_activity() as comments and versions are added, so
+    # list pages never count related rows (``manage.py rebuild_file_activity``
+    # repairs drift).
+    comment_count = models.IntegerField(default=0)
+    version_count = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    objects = UploadedFileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Reviewer queue: status = ? ORDER BY uploaded_at
+            models.Index(fields=['status', 'uploaded_at'], name='file_status_queue_idx'),
+            # File list sorted by activity: ORDER BY last_activity_at DESC, id DESC
+            models.Index(fields=['-last_activity_at', '-id'], name='file_activity_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if self.file and not self.filename:
             self.filename = os.path.basename(self.file.name)
-        super().save(*args, **kwargs)
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            StatusCounter.shift(None, self.status)
+            UserActivity.shift_status(self.owner_id, None, self.status)
+            return
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+        # Shift the status counters from the committed status, read under a
+        # row lock, not from whatever this instance was loaded with.
+        with transaction.atomic():
+            old_status = (
+                UploadedFile.objects.select_for_update()
+                .values_list('status', flat=True).get(pk=self.pk)
+            )
+            super().save(*args, **kwargs)
+            StatusCounter.shift(old_status, self.status)
+            UserActivity.shift_status(self.owner_id, old_status, self.status)
+
+    def save_content(self):
+        """
+        Save this file's content columns only. The activity counts and the
+        review state stay as committed, however long ago this instance was
+        loaded.
+        """
+        self.save(update_fields=self.content_fields())
+
+    @classmethod
+    def content_fields(cls):
+        """Columns save_content() writes."""
+        return [
+            f.name for f in cls._meta.concrete_fields
+            if not f.primary_key and f.name not in ACTIVITY_FIELDS + REVIEW_FIELDS
+        ]
+
+    def resubmit(self, change_type):
+        """
+        Save a new version of this file and send it back for review. Run it
+        inside a transaction: the row stays locked until commit, and the
+        version is bumped from the committed number, not this instance's.
+        """
+        self.version_number = (
+            UploadedFile.objects.select_for_update()
+            .values_list('version_number', flat=True).get(pk=self.pk)
+        )
+        self.bump_version(change_type)
+        self.status = FileStatus.PENDING
+        self.reviewed_at = None
+        self.reviewed_by = None
+        self.save(update_fields=self.content_fields() + list(REVIEW_FIELDS))
 
     def delete(self, *args, **kwargs):
-        # Remove file and converted file from disk if they exist
-        try:
-            if self.file and os.path.isfile(self.file.path):
-                os.remove(self.file.path)
-        except Exception:
-            pass
-        try:
-            if self.converted and os.path.isfile(self.converted.path):
-                os.remove(self.converted.path)
-        except Exception:
-            pass
-        super().delete(*args, **kwargs)
+        # The counters go down with the row in one transaction, by the
+        # committed status read under a row lock.
+        with transaction.atomic():
+            status = (
+                UploadedFile.objects.select_for_update()
+                .values_list('status', flat=True).filter(pk=self.pk).first()
+            )
+            if status is None:  # already deleted by another request
+                return 0, {}
+            UserStorage.adjust(
+                self.owner_id,
+                files=-1,
+                upload_bytes=-self.file_size,
+                converted_bytes=-self.converted_size,
+            )
+            StatusCounter.shift(status, None)
+            UserActivity.shift_status(self.owner_id, status, None)
+            # Unread notifications about this file go with it (CASCADE).
+            unread = (
+                Notification.objects.filter(related_file=self, is_read=False)
+                .order_by().values_list('recipient_id').annotate(total=models.Count('id'))
+            )
+            for recipient_id, total in unread:
+                UserActivity.adjust(recipient_id, unread_notifications=-total)
+            stored = [(field.storage, field.name) for field in (self.file, self.converted) if field]
+            deleted = super().delete(*args, **kwargs)
+            # Only once the row is really gone: remove the original and
+            # converted file from storage, and any local working copies.
+            transaction.on_commit(lambda: _remove_stored(stored))
+        return deleted
 
     def __str__(self):
         return self.filename or "Unnamed File"
@@ -65,12 +206,22 @@ class UploadedFile(models.Model):
     def version_label(self):
         return f"{self.version_number:.1f}"
 
+    @classmethod
+    def record_activity(cls, pk, comments=0, versions=0):
+        """Count new comments / versions on file ``pk`` and stamp its activity time."""
+        cls.objects.filter(pk=pk).update(
+            comment_count=F('comment_count') + comments,
+            version_count=F('version_count') + versions,
+            last_activity_at=timezone.now(),
+        )
+
 
 class UploadedFileVersion(models.Model):
     file = models.ForeignKey(UploadedFile, on_delete=models.CASCADE, related_name='versions')
     version_label = models.CharField(max_length=10)
     change_type = models.CharField(max_length=10, choices=ChangeTypes.choices)
     comment = models.TextField(blank=True)
+    file_size = models.BigIntegerField(default=0)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -106,9 +257,206 @@ class Notification(models.Model):
     related_file = models.ForeignKey(UploadedFile, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # Earlier notifications folded into this one by prune_notifications
+    digest_count = models.IntegerField(default=0)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Inbox keyset pages: recipient = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_inbox_idx'),
+        ]
 
     def __str__(self):
         return f"Notification to {self.recipient} - {self.notification_type}"
+
+
+class UserStorage(models.Model):
+    """
+    Per-user storage totals, updated incrementally whenever a file is uploaded,
+    edited, converted or deleted.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='storage')
+    file_count = models.IntegerField(default=0)
+    upload_bytes = models.BigIntegerField(default=0)
+    converted_bytes = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Storage for {self.user}"
+
+    @property
+    def total_bytes(self):
+        return self.upload_bytes + self.converted_bytes
+
+    @classmethod
+    def adjust(cls, user_id, files=0, upload_bytes=0, converted_bytes=0):
+        if user_id is None or not (files or upload_bytes or converted_bytes):
+            return
+        cls.objects.get_or_create(user_id=user_id)
+        cls.objects.filter(user_id=user_id).update(
+            file_count=F('file_count') + files,
+            upload_bytes=F('upload_bytes') + upload_bytes,
+            converted_bytes=F('converted_bytes') + converted_bytes,
+            updated_at=timezone.now(),
+        )
+
+
+class StatusCounter(models.Model):
+    """
+    Number of files in each status, adjusted by delta on every transition so
+    the reviewer queue never has to GROUP BY over UploadedFile.
+    """
+    status = models.CharField(max_length=20, choices=FileStatus.choices, primary_key=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+    @classmethod
+    def shift(cls, old_status=None, new_status=None):
+        """Move one file from ``old_status`` to ``new_status`` (either may be None)."""
+        if old_status == new_status:
+            return
+        for status, delta in ((old_status, -1), (new_status, 1)):
+            if status:
+                cls.objects.get_or_create(status=status)
+                cls.objects.filter(status=status).update(count=F('count') + delta)
+
+    @classmethod
+    def totals(cls):
+        counts = {status: 0 for status in FileStatus.values}
+        counts.update(cls.objects.values_list('status', 'count'))
+        return counts
+
+
+# Statuses that count as "awaiting review" for the uploader.
+AWAITING_REVIEW = (FileStatus.PENDING, FileStatus.IN_REVIEW)
+
+
+class UserActivity(models.Model):
+    """
+    Per-user counters for the user directory and the notification badge,
+    adjusted by delta wherever files change status and notifications are
+    created, read or removed (``manage.py rebuild_user_activity`` repairs
+    drift). Upload counts live in UserStorage.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='activity')
+    # Files owned by the user that are pending or in review
+    pending_reviews = models.IntegerField(default=0)
+    unread_notifications = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Activity for {self.user}"
+
+    @classmethod
+    def adjust(cls, user_ids, pending_reviews=0, unread_notifications=0):
+        """Add the deltas to every user in ``user_ids`` (a user id or a list)."""
+        if isinstance(user_ids, int):
+            user_ids = [user_ids]
+        user_ids = [pk for pk in user_ids if pk is not None]
+        if not user_ids or not (pending_reviews or unread_notifications):
+            return
+        existing = set(cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        missing = [cls(user_id=pk) for pk in set(user_ids) - existing]
+        if missing:
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+        cls.objects.filter(user_id__in=user_ids).update(
+            pending_reviews=F('pending_reviews') + pending_reviews,
+            unread_notifications=F('unread_notifications') + unread_notifications,
+        )
+
+    @classmethod
+    def shift_status(cls, user_id, old_status=None, new_status=None):
+        """Account for one of ``user_id``'s files moving between statuses."""
+        delta = (new_status in AWAITING_REVIEW) - (old_status in AWAITING_REVIEW)
+        cls.adjust(user_id, pending_reviews=delta)
+
+
+class ConversionEvent(models.Model):
+    """
+    One row per PDF conversion attempt, aggregated into histograms by
+    files.telemetry.
+    """
+    class Outcomes(models.TextChoices):
+        SUCCESS = ('success', 'Success')
+        FAILED = ('failed', 'Failed')
+        REUSED = ('reused', 'Reused existing PDF')
+
+    file_id = models.BigIntegerField(null=True, blank=True)
+    extension = models.CharField(max_length=16)
+    size_bucket = models.CharField(max_length=16)
+    input_size = models.BigIntegerField(default=0)
+    output_size = models.BigIntegerField(default=0)
+    converter = models.CharField(max_length=64, blank=True)
+    queue_wait_ms = models.FloatField(default=0)
+    runtime_ms = models.FloatField(default=0)
+    outcome = models.CharField(max_length=10, choices=Outcomes.choices)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.extension} {self.outcome} in {self.runtime_ms:.0f} ms"
+
+
+class FileChange(models.Model):
+    """
+    Append-only change log used by sync clients.
+
+    ``seq`` only ever grows, so a client that remembers the last seq it saw can
+    fetch everything that happened since with a single indexed range scan.
+    ``file_id`` is a plain integer (not a FK) so entries survive file deletion.
+    """
+    class Actions(models.TextChoices):
+        CREATED = ('created', 'Created')
+        EDITED = ('edited', 'Edited')
+        REPLACED = ('replaced', 'Replaced')
+        CONVERTED = ('converted', 'Converted')
+        STATUS_CHANGED = ('status_changed', 'Status changed')
+        COMMENTED = ('commented', 'Commented')
+        DELETED = ('deleted', 'Deleted')
+
+    seq = models.BigAutoField(primary_key=True)
+    file_id = models.BigIntegerField(db_index=True)
+    action = models.CharField(max_length=20, choices=Actions.choices)
+    filename = models.CharField(max_length=255, blank=True)
+    version_label = models.CharField(max_length=10, blank=True)
+    status = models.CharField(max_length=20, choices=FileStatus.choices, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+
+    def __str__(self):
+        return f"#{self.seq} {self.action} file {self.file_id}"
+
+    @classmethod
+    def record(cls, file_obj, action):
+        return cls.objects.create(
+            file_id=file_obj.pk,
+            action=action,
+            filename=file_obj.filename or '',
+            version_label=file_obj.version_label,
+            status=file_obj.status,
+        )
+
+
+# -------------------------
+# Fragment cache invalidation
+# -------------------------
+# Deferred to commit so a concurrent request cannot re-cache the old
+# fragment between the invalidation and the write becoming visible.
+@receiver([post_save, post_delete], sender=UploadedFile)
+def invalidate_uploaded_file_fragments(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_file_card(instance))
+
+
+@receiver([post_save, post_delete], sender=UploadedFileVersion)
+def invalidate_version_fragments(sender, instance, **kwargs):
+    file_id = instance.file_id
+    transaction.on_commit(lambda: bump_fragment_generation(file_id, VERSIONS_BLOCK))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_fragments(sender, instance, **kwargs):
+    file_id = instance.file_id
+    transaction.on_commit(lambda: bump_fragment_generation(file_id, COMMENTS_BLOCK))
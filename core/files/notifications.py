@@ -0,0 +1,125 @@
+# files/notifications.py
+"""
+Notification fan-out and the recipient's inbox.
+
+The inbox is paged with keyset cursors on (created_at, id), newest first,
+so every page is one index range scan no matter how deep the user pages.
+Bulk actions apply either to an explicit id list or to everything "up to"
+a cursor (that row and all older ones) as a single UPDATE or DELETE; the
+"up to" form lets "mark all as read" skip notifications that arrived after
+the page was rendered.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from users.models import Profile
+from . import pagination
+from .models import Notification, UserActivity
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+MAX_BULK_IDS = 1000
+
+
+# -------------------------
+# Fan-out
+# -------------------------
+def notify_users(user_qs, sender, notif_type, message, file_obj):
+    # Often called from deferred tasks, outside any request transaction:
+    # the rows and the unread counters go in together or not at all.
+    with transaction.atomic():
+        created = Notification.objects.bulk_create([
+            Notification(
+                recipient=recipient,
+                sender=sender,
+                notification_type=notif_type,
+                message=message,
+                related_file=file_obj,
+            )
+            for recipient in user_qs
+        ])
+        UserActivity.adjust([n.recipient_id for n in created], unread_notifications=1)
+
+
+def notify_super_reviewers(file_obj, sender, notif_type, message, version):
+    reviewers = User.objects.filter(profile__role=Profile.Roles.SUPER_REVIEWER, is_active=True)
+    notify_users(reviewers, sender, notif_type, message, file_obj)
+
+
+# -------------------------
+# Cursors
+# -------------------------
+def encode_cursor(notification):
+    return pagination.encode_cursor(notification.created_at, notification.pk)
+
+
+def _older_than(cursor, inclusive=False):
+    return pagination.past_cursor(cursor, 'created_at', descending=True, inclusive=inclusive)
+
+
+# -------------------------
+# Inbox
+# -------------------------
+def inbox_page(user, cursor=None, limit=PAGE_SIZE, unread_only=False):
+    """
+    One page of ``user``'s notifications after ``cursor``.
+    Returns (notifications, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    qs = (
+        Notification.objects.filter(recipient=user)
+        .select_related('sender', 'related_file')
+        .order_by('-created_at', '-id')
+    )
+    if unread_only:
+        qs = qs.filter(is_read=False)
+    if cursor:
+        qs = qs.filter(_older_than(cursor))
+
+    rows = list(qs[:limit + 1])
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def _targets(user, ids=None, up_to=None):
+    qs = Notification.objects.filter(recipient=user)
+    if ids:
+        ids = [int(pk) for pk in ids][:MAX_BULK_IDS]
+        return qs.filter(pk__in=ids)
+    if up_to:
+        return qs.filter(_older_than(up_to, inclusive=True))
+    raise ValueError("Pass notification ids or an 'up_to' cursor.")
+
+
+def mark_read(user, ids=None, up_to=None, read=True):
+    """Set is_read on the selected notifications; returns the number changed."""
+    with transaction.atomic():
+        changed = _targets(user, ids, up_to).exclude(is_read=read).update(is_read=read)
+        UserActivity.adjust(user.pk, unread_notifications=-changed if read else changed)
+    return changed
+
+
+def dismiss(user, ids=None, up_to=None):
+    """Delete the selected notifications; returns the number deleted."""
+    targets = _targets(user, ids, up_to)
+    # Delete the unread ones separately so the unread counter stays exact.
+    with transaction.atomic():
+        unread, _ = targets.filter(is_read=False).delete()
+        read, _ = targets.delete()
+        UserActivity.adjust(user.pk, unread_notifications=-unread)
+    return unread + read
+
+
+def apply_action(user, action, ids=None, up_to=None):
+    """
+    Dispatch an inbox action ('mark_read', 'mark_unread', 'dismiss');
+    returns the number of notifications affected.
+    """
+    if action == 'mark_read':
+        return mark_read(user, ids, up_to)
+    if action == 'mark_unread':
+        return mark_read(user, ids, up_to, read=False)
+    if action == 'dismiss':
+        return dismiss(user, ids, up_to)
+    raise ValueError(f"Unknown notification action: {action!r}")
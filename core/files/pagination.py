@@ -0,0 +1,62 @@
+# files/pagination.py
+"""
+Keyset cursors over (timestamp, id) orderings, used by the notifications
+inbox and the reviewer queue, and over a single unique text column (the
+user directory's usernames). A cursor is an opaque URL-safe token naming
+the last row of a page; the next page is everything strictly past it.
+"""
+import base64
+import binascii
+
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+
+
+def encode_cursor(timestamp, pk):
+    return _encode(f"{timestamp.isoformat()}|{pk}")
+
+
+def decode_cursor(cursor):
+    """'<cursor>' -> (timestamp, id)."""
+    try:
+        raw = _decode(cursor)
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+
+def past_cursor(cursor, field, descending=True, inclusive=False):
+    """
+    Filter for rows after ``cursor`` in ORDER BY ``field``, id (both
+    descending or both ascending); ``inclusive`` also matches the cursor row.
+    """
+    timestamp, pk = decode_cursor(cursor)
+    op = 'lt' if descending else 'gt'
+    pk_op = f"{op}e" if inclusive else op
+    return Q(**{f"{field}__{op}": timestamp}) | Q(**{field: timestamp, f"pk__{pk_op}": pk})
+
+
+def encode_key(value):
+    return _encode(value)
+
+
+def decode_key(cursor):
+    """Cursor of a single-column ordering -> the last value of the page."""
+    try:
+        return _decode(cursor)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
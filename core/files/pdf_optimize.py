@@ -0,0 +1,92 @@
+# files/pdf_optimize.py
+"""
+Optional post-conversion PDF optimisation ("fast web view").
+
+Linearized PDFs put the first page and its cross-reference data at the front
+of the file, so PDF.js can draw page one before the rest has arrived. The
+same pass also packs objects into object streams, drops unreferenced
+resources and recompresses streams. qpdf is used when it is on PATH
+(or QPDF_PATH), otherwise pikepdf if installed; if neither is available the
+PDF is left untouched.
+"""
+import logging
+import os
+import re
+import shutil
+import subprocess
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+QPDF_TIMEOUT = 60
+# Below this the whole file arrives about as fast as the first-page hint
+# tables would, and linearization overhead makes small files larger.
+MIN_LINEARIZE_BYTES = 64 * 1024
+
+_LINEARIZED_RE = re.compile(rb'/Linearized\s+[\d.]+.*?/E\s+(\d+)', re.S)
+
+
+def _optimize_with_qpdf(qpdf, input_path, output_path):
+    result = subprocess.run([
+        qpdf, '--linearize', '--object-streams=generate', '--compress-streams=y',
+        '--recompress-flate', '--remove-unreferenced-resources=yes',
+        input_path, output_path,
+    ], capture_output=True, timeout=QPDF_TIMEOUT)
+    # Exit code 3 means "succeeded with warnings".
+    return result.returncode in (0, 3)
+
+
+def _optimize_with_pikepdf(input_path, output_path):
+    try:
+        import pikepdf
+    except ImportError:
+        return False
+    with pikepdf.open(input_path) as pdf:
+        pdf.remove_unreferenced_resources()
+        pdf.save(
+            output_path,
+            linearize=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            compress_streams=True,
+            recompress_flate=True,
+        )
+    return True
+
+
+def optimize_pdf(input_path, force=False):
+    """
+    Write a linearized, recompressed copy next to ``input_path`` and return its
+    path. Returns ``input_path`` unchanged if the file is too small to benefit
+    (unless ``force``), no optimiser is available, or the optimiser fails.
+    """
+    if not force and os.path.getsize(input_path) < MIN_LINEARIZE_BYTES:
+        return input_path
+
+    output_path = f"{os.path.splitext(input_path)[0]}.optimized.pdf"
+    qpdf = shutil.which(getattr(settings, 'QPDF_PATH', 'qpdf'))
+    try:
+        if qpdf:
+            ok = _optimize_with_qpdf(qpdf, input_path, output_path)
+        else:
+            ok = _optimize_with_pikepdf(input_path, output_path)
+    except Exception:
+        logger.exception("PDF optimisation failed for %s", input_path)
+        ok = False
+
+    if not ok or not os.path.exists(output_path) or first_page_bytes(output_path) is None:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return input_path
+    return output_path
+
+
+def first_page_bytes(path):
+    """
+    For a linearized PDF, the offset (/E) at which the first page is complete;
+    None if the file is not linearized (the viewer needs the trailing xref).
+    """
+    with open(path, 'rb') as f:
+        head = f.read(1024)
+    match = _LINEARIZED_RE.search(head)
+    return int(match.group(1)) if match else None
@@ -0,0 +1,72 @@
+# files/quota.py
+"""
+Storage accounting and upload quotas.
+
+Sizes are measured once, when a file is written, and stored on the model;
+per-user totals live in UserStorage and are adjusted by deltas, so nothing
+here ever walks MEDIA_ROOT. The quota itself is enforced while uploads
+stream in, by files.ingest.SizeStage.
+"""
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import UploadedFile, UserStorage
+
+
+def _stored_size(field):
+    if not field:
+        return 0
+    try:
+        return field.size
+    except (OSError, ValueError):
+        return 0
+
+
+def refresh_storage_usage(file_obj, new_file=False, file_size=None):
+    """
+    Re-measure the original and converted files of ``file_obj`` and apply the
+    difference to the stored sizes and to the owner's totals. ``file_size``
+    is the size of an original that is about to be stored but isn't yet.
+    """
+    if file_size is None:
+        file_size = _stored_size(file_obj.file)
+    converted_size = _stored_size(file_obj.converted)
+    delta_upload = file_size - file_obj.file_size
+    delta_converted = converted_size - file_obj.converted_size
+
+    if delta_upload or delta_converted:
+        UploadedFile.objects.filter(pk=file_obj.pk).update(file_size=file_size, converted_size=converted_size)
+        file_obj.file_size = file_size
+        file_obj.converted_size = converted_size
+
+    UserStorage.adjust(
+        file_obj.owner_id,
+        files=1 if new_file else 0,
+        upload_bytes=delta_upload,
+        converted_bytes=delta_converted,
+    )
+
+
+def remaining_quota(user, credit=0):
+    """
+    Bytes ``user`` may still upload, or None when no quota is configured.
+    ``credit`` is added back for uploads that replace an existing file.
+    """
+    quota = getattr(settings, 'USER_UPLOAD_QUOTA_BYTES', None)
+    if quota is None:
+        return None
+    usage = UserStorage.objects.filter(user=user).first()
+    used = usage.total_bytes if usage else 0
+    return max(quota - used + credit, 0)
+
+
+def storage_totals():
+    """
+    Site-wide totals for the storage dashboard, from UserStorage only.
+    """
+    totals = UserStorage.objects.aggregate(
+        files=Sum('file_count'),
+        upload_bytes=Sum('upload_bytes'),
+        converted_bytes=Sum('converted_bytes'),
+    )
+    return {key: value or 0 for key, value in totals.items()}
@@ -0,0 +1,95 @@
+# files/review.py
+"""
+Reviewer work queue.
+
+Queue pages are keyset scans of the (status, uploaded_at) index, oldest
+first, and the per-status totals come from StatusCounter. Reviewer status
+changes are compare-and-set UPDATEs: a row only changes if it is still in
+the status the reviewer loaded, so parallel reviewers never claim or
+decide the same file twice. QuerySet.update() skips save() and the
+post_save signal, so the status counters, the change feed and the cached file card
+are updated here explicitly.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import pagination
+from .cache import invalidate_file_card
+from .models import UploadedFile, FileChange, FileStatus, StatusCounter, UserActivity
+
+QUEUE_PAGE_SIZE = 50
+MAX_QUEUE_PAGE_SIZE = 200
+# How many times "claim next" moves on to the next pending file after losing
+# a race for the previous one.
+CLAIM_ATTEMPTS = 5
+
+QUEUE_STATUSES = [FileStatus.PENDING, FileStatus.IN_REVIEW]
+
+
+def queue_page(status=FileStatus.PENDING, cursor=None, reviewer=None, limit=QUEUE_PAGE_SIZE):
+    """
+    Files in ``status`` oldest first (optionally only those ``reviewer`` is
+    working on). Returns (files, next_cursor).
+    """
+    limit = max(1, min(limit, MAX_QUEUE_PAGE_SIZE))
+    qs = (
+        UploadedFile.objects.filter(status=status)
+        .select_related('owner', 'reviewed_by')
+        .order_by('uploaded_at', 'id')
+    )
+    if reviewer is not None:
+        qs = qs.filter(reviewed_by=reviewer)
+    if cursor:
+        qs = qs.filter(pagination.past_cursor(cursor, 'uploaded_at', descending=False))
+
+    rows = list(qs[:limit + 1])
+    page = rows[:limit]
+    next_cursor = pagination.encode_cursor(page[-1].uploaded_at, page[-1].pk) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def transition(file_obj, new_status, reviewer):
+    """
+    Move ``file_obj`` from the status it was loaded with to ``new_status``.
+    Returns False, changing nothing, if another request changed the status
+    in the meantime.
+    """
+    old_status = file_obj.status
+    now = timezone.now()
+    with transaction.atomic():
+        updated = UploadedFile.objects.filter(pk=file_obj.pk, status=old_status).update(
+            status=new_status,
+            reviewed_by=reviewer,
+            reviewed_at=now,
+        )
+        if not updated:
+            return False
+        StatusCounter.shift(old_status, new_status)
+        UserActivity.shift_status(file_obj.owner_id, old_status, new_status)
+
+        file_obj.status = new_status
+        file_obj.reviewed_by = reviewer
+        file_obj.reviewed_at = now
+        FileChange.record(file_obj, FileChange.Actions.STATUS_CHANGED)
+        transaction.on_commit(lambda: invalidate_file_card(file_obj))
+    return True
+
+
+def claim(reviewer, pk=None):
+    """
+    Claim file ``pk``, or the oldest pending file, moving it from pending to
+    in review. Returns the claimed file, or None if there was nothing left
+    to claim.
+    """
+    candidates = UploadedFile.objects.filter(status=FileStatus.PENDING).order_by('uploaded_at', 'id')
+    if pk is not None:
+        candidates = candidates.filter(pk=pk)
+    for _ in range(CLAIM_ATTEMPTS):
+        file_obj = candidates.first()
+        if file_obj is None:
+            return None
+        if transition(file_obj, FileStatus.IN_REVIEW, reviewer):
+            return file_obj
+        if pk is not None:
+            return None
+    return None
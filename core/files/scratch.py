@@ -0,0 +1,202 @@
+# files/scratch.py
+"""
+Local working copies of stored media.
+
+Converters, the DOCX/XLSX editors and spreadsheet reads need a real path.
+With FileSystemStorage that is the stored file itself. With a remote
+storage (files.storage.S3Storage) the object is downloaded once into
+SCRATCH_DIR and reused for as long as its fingerprint (the ETag, or size
+and modification time) is unchanged. Editors change a stage_copy() and
+then publish() it.
+
+The cache is kept under SCRATCH_MAX_BYTES, evicting least recently used
+entries first. Entries used in the last SCRATCH_MIN_AGE seconds are never
+evicted, so a path handed to a running conversion stays in place.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.base import File
+
+from .locks import file_lock
+
+OBJECTS_DIR = 'objects'
+STAGING_DIR = 'staging'
+# Sidecar files next to each cached object.
+FINGERPRINT_SUFFIX = '.fp'
+LOCK_SUFFIX = '.lock'
+PARTIAL_SUFFIX = '.part'
+
+
+def _storage_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def _entry_path(name):
+    # Keep the original base name: converters name their output after it and
+    # openpyxl insists on a spreadsheet extension.
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(settings.SCRATCH_DIR, OBJECTS_DIR, f"{digest}-{os.path.basename(name)}")
+
+
+def _fingerprint(storage, name):
+    fingerprint = getattr(storage, 'fingerprint', None)
+    if fingerprint:
+        return fingerprint(name)
+    return f"{storage.size(name)}:{storage.get_modified_time(name).timestamp()}"
+
+
+def _read_fingerprint(entry):
+    try:
+        with open(entry + FINGERPRINT_SUFFIX, encoding='ascii') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_fingerprint(entry, fingerprint):
+    with open(entry + FINGERPRINT_SUFFIX, 'w', encoding='ascii') as f:
+        f.write(fingerprint)
+
+
+def _upload(storage, path, name):
+    upload = getattr(storage, 'upload', None)
+    if upload:
+        upload(path, name)
+        return
+    # Generic storages rename on collision, so clear the name first.
+    storage.delete(name)
+    with open(path, 'rb') as f:
+        storage.save(name, File(f))
+
+
+def staging_root(storage, subdir):
+    """
+    Directory for scratch output that will end up at ``subdir`` in
+    ``storage``: inside the media tree for local storage, so publish() is a
+    same-filesystem rename, otherwise under SCRATCH_DIR.
+    """
+    local = _storage_path(storage, subdir)
+    root = os.path.join(local, '.staging') if local else os.path.join(settings.SCRATCH_DIR, STAGING_DIR)
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def local_path(field_file):
+    """
+    Path of a local file holding the current content of ``field_file``.
+    Raises FileNotFoundError if the stored file is gone.
+    """
+    storage, name = field_file.storage, field_file.name
+    path = _storage_path(storage, name)
+    if path is not None:
+        if not os.path.exists(path):
+            raise FileNotFoundError(name)
+        return path
+
+    entry = _entry_path(name)
+    fingerprint = _fingerprint(storage, name)
+    if _read_fingerprint(entry) == fingerprint and os.path.exists(entry):
+        os.utime(entry)
+        return entry
+
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    # One download per object across threads and processes on this node.
+    with file_lock(entry + LOCK_SUFFIX):
+        if _read_fingerprint(entry) != fingerprint or not os.path.exists(entry):
+            partial = entry + PARTIAL_SUFFIX
+            download = getattr(storage, 'download', None)
+            if download:
+                download(name, partial)
+            else:
+                with storage.open(name, 'rb') as src, open(partial, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(partial, entry)
+            _write_fingerprint(entry, fingerprint)
+    trim()
+    return entry
+
+
+def stage_copy(field_file):
+    """
+    A private copy of ``field_file``'s current content for an editor to
+    change. publish() it under the field's name once the edit is recorded,
+    or delete it to abandon the edit; the stored file is untouched until
+    then.
+    """
+    storage, name = field_file.storage, field_file.name
+    source = local_path(field_file)
+    fd, path = tempfile.mkstemp(
+        prefix='edit-', suffix=os.path.splitext(name)[1],
+        dir=staging_root(storage, os.path.dirname(name)),
+    )
+    os.close(fd)
+    shutil.copyfile(source, path)
+    return path
+
+
+def publish(storage, path, name):
+    """Move the finished local file ``path`` into ``storage`` as ``name``."""
+    local = _storage_path(storage, name)
+    if local is not None:
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        os.replace(path, local)
+        return
+    _upload(storage, path, name)
+    os.remove(path)
+
+
+def discard(name):
+    """Drop the cached copy of ``name`` (after the stored file is deleted)."""
+    entry = _entry_path(name)
+    for path in (entry, entry + FINGERPRINT_SUFFIX):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def trim(max_bytes=None):
+    """
+    Evict least recently used copies until the cache fits in ``max_bytes``
+    (SCRATCH_MAX_BYTES). Returns the number of bytes freed.
+    """
+    if max_bytes is None:
+        max_bytes = settings.SCRATCH_MAX_BYTES
+    entries = []
+    total = 0
+    try:
+        with os.scandir(os.path.join(settings.SCRATCH_DIR, OBJECTS_DIR)) as it:
+            for entry in it:
+                if entry.name.endswith((FINGERPRINT_SUFFIX, LOCK_SUFFIX, PARTIAL_SUFFIX)):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    except FileNotFoundError:
+        return 0
+    if total <= max_bytes:
+        return 0
+
+    freed = 0
+    cutoff = time.time() - settings.SCRATCH_MIN_AGE
+    for mtime, size, path in sorted(entries):
+        if total - freed <= max_bytes or mtime > cutoff:
+            break
+        for victim in (path, path + FINGERPRINT_SUFFIX):
+            try:
+                os.remove(victim)
+            except OSError:
+                pass
+        freed += size
+    return freed
@@ -0,0 +1,147 @@
+# files/spreadsheet.py
+"""
+Range-addressed, read-only access to XLSX workbooks for the editor grid.
+
+openpyxl's read-only mode streams sheet XML, but reaching row N still means
+parsing every row before it. To keep windowed reads cheap regardless of
+where they land, rows are cached in fixed-size blocks per sheet (keyed by
+the file's name and mtime, so edits invalidate naturally): the first read
+of a region streams the missing blocks once, later reads of any window in
+it are cache hits.
+"""
+import datetime
+import decimal
+import hashlib
+import os
+
+from django.core.cache import cache
+
+ROW_BLOCK_SIZE = 500
+MAX_RANGE_CELLS = 20000
+BLOCK_CACHE_TIMEOUT = 60 * 60
+
+
+class RangeError(ValueError):
+    pass
+
+
+def _load(path):
+    from openpyxl import load_workbook
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_range(cell_range):
+    """
+    'A1:Z200' -> (min_row, min_col, max_row, max_col), 1-based and inclusive.
+    """
+    from openpyxl.utils.cell import range_boundaries
+
+    try:
+        min_col, min_row, max_col, max_row = range_boundaries(cell_range.upper())
+    except (ValueError, TypeError):
+        raise RangeError(f"Invalid range: {cell_range!r}")
+    if None in (min_col, min_row, max_col, max_row):
+        raise RangeError("Range must have both corners, e.g. A1:Z200.")
+    if (max_row - min_row + 1) * (max_col - min_col + 1) > MAX_RANGE_CELLS:
+        raise RangeError(f"Range too large; at most {MAX_RANGE_CELLS} cells per request.")
+    return min_row, min_col, max_row, max_col
+
+
+def list_sheets(path):
+    """
+    Sheet names and dimensions as recorded in each sheet's <dimension> element.
+    """
+    from openpyxl.utils import get_column_letter
+
+    wb = _load(path)
+    try:
+        sheets = []
+        for index, ws in enumerate(wb.worksheets):
+            max_row, max_column = ws.max_row, ws.max_column
+            sheets.append({
+                'index': index,
+                'name': ws.title,
+                'dimensions': f"A1:{get_column_letter(max_column)}{max_row}" if max_row and max_column else None,
+                'max_row': max_row,
+                'max_column': max_column,
+            })
+        return sheets
+    finally:
+        wb.close()
+
+
+def _block_key(path, sheet_index, block):
+    stat = os.stat(path)
+    ident = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}:{sheet_index}:{block}"
+    return "sheet-block:" + hashlib.md5(ident.encode()).hexdigest()
+
+
+def read_range(path, sheet_index, cell_range):
+    """
+    Values of ``cell_range`` on sheet ``sheet_index`` as a list of rows,
+    padded with None so every row has the requested width.
+    """
+    min_row, min_col, max_row, max_col = parse_range(cell_range)
+    first_block = (min_row - 1) // ROW_BLOCK_SIZE
+    last_block = (max_row - 1) // ROW_BLOCK_SIZE
+
+    keys = {block: _block_key(path, sheet_index, block) for block in range(first_block, last_block + 1)}
+    cached = cache.get_many(list(keys.values()))
+    blocks = {block: cached[key] for block, key in keys.items() if key in cached}
+
+    missing = [block for block in keys if block not in blocks]
+    if missing:
+        blocks.update(_stream_blocks(path, sheet_index, missing[0], missing[-1]))
+
+    width = max_col - min_col + 1
+    rows = []
+    for row_number in range(min_row, max_row + 1):
+        block = blocks[(row_number - 1) // ROW_BLOCK_SIZE]
+        offset = (row_number - 1) % ROW_BLOCK_SIZE
+        values = block[offset] if offset < len(block) else []
+        window = list(values[min_col - 1:max_col])
+        rows.append(window + [None] * (width - len(window)))
+    return {
+        'range': cell_range.upper(),
+        'min_row': min_row,
+        'min_col': min_col,
+        'rows': rows,
+    }
+
+
+def _stream_blocks(path, sheet_index, first_block, last_block):
+    """
+    One streaming pass over rows of ``first_block``..``last_block``; every
+    block touched is cached (blocks between them that were already cached are
+    simply re-stored).
+    """
+    wb = _load(path)
+    try:
+        try:
+            ws = wb.worksheets[sheet_index]
+        except IndexError:
+            raise RangeError(f"No sheet with index {sheet_index}.")
+        start_row = first_block * ROW_BLOCK_SIZE + 1
+        end_row = (last_block + 1) * ROW_BLOCK_SIZE
+        blocks = {block: [] for block in range(first_block, last_block + 1)}
+        for offset, values in enumerate(ws.iter_rows(min_row=start_row, max_row=end_row, values_only=True)):
+            block = first_block + offset // ROW_BLOCK_SIZE
+            blocks[block].append([_json_value(v) for v in values])
+    finally:
+        wb.close()
+
+    cache.set_many(
+        {_block_key(path, sheet_index, block): rows for block, rows in blocks.items()},
+        timeout=BLOCK_CACHE_TIMEOUT,
+    )
+    return blocks
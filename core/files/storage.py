@@ -0,0 +1,226 @@
+# files/storage.py
+"""
+Media storage backends and download responses.
+
+S3Storage keeps originals and converted PDFs in an S3-compatible bucket
+(AWS S3, MinIO, ...), so any node can serve any file. boto3 is optional and
+only imported once the backend is actually used. Files above
+S3_MULTIPART_THRESHOLD are sent as multipart uploads whose parts go up in
+parallel, and downloads are redirects to short-lived presigned URLs, so the
+bytes never pass through a worker.
+
+Code that needs a real file on disk (converters, the DOCX/XLSX editors,
+spreadsheet reads) goes through files.scratch rather than FieldFile.path,
+which only FileSystemStorage implements.
+"""
+import mimetypes
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+from django.utils.http import content_disposition_header
+
+# _open() keeps objects up to this size in memory before spilling to disk.
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+def _is_missing(error):
+    return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+
+@deconstructible
+class S3Storage(Storage):
+    """
+    Storage in an S3 bucket. Options default to the S3_* settings; pass
+    ``endpoint_url`` (S3_ENDPOINT_URL) to use MinIO or another S3-compatible
+    server instead of AWS.
+    """
+
+    def __init__(self, bucket=None, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 presign_seconds=None, multipart_threshold=None, multipart_chunk_size=None, max_concurrency=None):
+        self.bucket = bucket or settings.S3_BUCKET
+        self.endpoint_url = endpoint_url or settings.S3_ENDPOINT_URL
+        self.region = region or settings.S3_REGION
+        self.access_key = access_key or settings.S3_ACCESS_KEY_ID
+        self.secret_key = secret_key or settings.S3_SECRET_ACCESS_KEY
+        self.presign_seconds = presign_seconds or settings.S3_PRESIGNED_URL_SECONDS
+        self.multipart_threshold = multipart_threshold or settings.S3_MULTIPART_THRESHOLD
+        self.multipart_chunk_size = multipart_chunk_size or settings.S3_MULTIPART_CHUNK_SIZE
+        self.max_concurrency = max_concurrency or settings.S3_MAX_CONCURRENCY
+        if not self.bucket:
+            raise ImproperlyConfigured("S3Storage needs S3_BUCKET.")
+
+    @cached_property
+    def client(self):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImproperlyConfigured("S3Storage needs the boto3 package (pip install boto3).")
+        return boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url or None,
+            region_name=self.region,
+            # Empty keys fall back to boto3's own lookup (environment, instance role).
+            aws_access_key_id=self.access_key or None,
+            aws_secret_access_key=self.secret_key or None,
+            config=Config(
+                signature_version='s3v4',
+                # Room for every multipart thread plus request threads.
+                max_pool_connections=self.max_concurrency * 2,
+                # MinIO and most self-hosted servers want bucket-in-path URLs.
+                s3={'addressing_style': 'path' if self.endpoint_url else 'auto'},
+            ),
+        )
+
+    @cached_property
+    def transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_chunk_size,
+            max_concurrency=self.max_concurrency,
+            use_threads=True,
+        )
+
+    def _head(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as e:
+            if _is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+
+    # -------------------------
+    # Transfers
+    # -------------------------
+    def upload(self, path, name):
+        """Upload the local file ``path`` to ``name``, replacing any object there."""
+        self.client.upload_file(
+            path, self.bucket, name,
+            ExtraArgs={'ContentType': mimetypes.guess_type(name)[0] or 'application/octet-stream'},
+            Config=self.transfer_config,
+        )
+
+    def download(self, name, path):
+        """Download ``name`` to the local file ``path`` (large objects in parallel ranges)."""
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.download_file(self.bucket, name, path, Config=self.transfer_config)
+        except ClientError as e:
+            if _is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+
+    def _save(self, name, content):
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk; upload_file reads the parts
+            # from the file in parallel.
+            self.upload(content.temporary_file_path(), name)
+            return name
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        self.client.upload_fileobj(
+            content, self.bucket, name,
+            ExtraArgs={'ContentType': mimetypes.guess_type(name)[0] or 'application/octet-stream'},
+            Config=self.transfer_config,
+        )
+        return name
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError("S3Storage files are read-only; save a new file instead.")
+        from botocore.exceptions import ClientError
+
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        try:
+            self.client.download_fileobj(self.bucket, name, spool, Config=self.transfer_config)
+        except ClientError as e:
+            spool.close()
+            if _is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+        spool.seek(0)
+        return File(spool, name=name)
+
+    # -------------------------
+    # Storage API
+    # -------------------------
+    def delete(self, name):
+        if name:
+            self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def exists(self, name):
+        try:
+            self._head(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def size(self, name):
+        return self._head(name)['ContentLength']
+
+    def get_modified_time(self, name):
+        modified = self._head(name)['LastModified']
+        return modified if settings.USE_TZ else timezone.make_naive(modified)
+
+    def fingerprint(self, name):
+        """Changes whenever the object's content does (its ETag)."""
+        return self._head(name)['ETag'].strip('"')
+
+    def listdir(self, path):
+        prefix = f"{path.rstrip('/')}/" if path else ''
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            directories += [p['Prefix'][len(prefix):].rstrip('/') for p in page.get('CommonPrefixes', ())]
+            files += [o['Key'][len(prefix):] for o in page.get('Contents', ())]
+        return directories, files
+
+    def scan(self, prefix):
+        """(name, size, mtime) of every object under ``prefix``, 1000 per request."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', ()):
+                yield obj['Key'], obj['Size'], obj['LastModified'].timestamp()
+
+    def url(self, name, content_disposition=None, content_type=None):
+        """
+        Presigned GET URL valid for S3_PRESIGNED_URL_SECONDS; the response
+        headers can be overridden so browsers get the right filename.
+        """
+        params = {'Bucket': self.bucket, 'Key': name}
+        if content_disposition:
+            params['ResponseContentDisposition'] = content_disposition
+        if content_type:
+            params['ResponseContentType'] = content_type
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.presign_seconds)
+
+
+def serve(field_file, filename, as_attachment=False, content_type=None):
+    """
+    Download response for a stored file: a redirect to a presigned URL when
+    the storage can sign one, otherwise the file streamed by this worker.
+    """
+    storage = field_file.storage
+    if isinstance(storage, S3Storage):
+        return HttpResponseRedirect(storage.url(
+            field_file.name,
+            content_disposition=content_disposition_header(as_attachment, filename),
+            content_type=content_type,
+        ))
+    try:
+        handle = storage.open(field_file.name, 'rb')
+    except FileNotFoundError:
+        raise Http404("File not found on server.")
+    return FileResponse(handle, as_attachment=as_attachment, filename=filename, content_type=content_type)
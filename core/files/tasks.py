@@ -0,0 +1,61 @@
+# files/tasks.py
+"""
+Side effects that should not hold up a request (notification fan-out,
+PDF regeneration). ``defer`` queues a callable to run once the current
+transaction commits, so work never sees rows that were rolled back, and
+hands it to a small in-process thread pool. With
+``BACKGROUND_TASK_WORKERS = 0`` tasks run inline on commit instead.
+"""
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_TASK_WORKERS,
+                    thread_name_prefix="files-task",
+                )
+    return _executor
+
+
+def _run(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+
+
+def _run_in_worker(fn, args, kwargs):
+    # Worker threads keep their own DB connection; drop it if it went stale.
+    close_old_connections()
+    try:
+        _run(fn, args, kwargs)
+    finally:
+        close_old_connections()
+
+
+def submit(fn, *args, **kwargs):
+    """Run ``fn`` now, in the background pool when one is configured."""
+    if settings.BACKGROUND_TASK_WORKERS <= 0:
+        _run(fn, args, kwargs)
+        return None
+    return _get_executor().submit(_run_in_worker, fn, args, kwargs)
+
+
+def defer(fn, *args, **kwargs):
+    """Run ``fn`` in the background after the current transaction commits."""
+    transaction.on_commit(lambda: submit(fn, *args, **kwargs))
@@ -0,0 +1,109 @@
+# files/telemetry.py
+"""
+Conversion telemetry: one ConversionEvent per attempt, rolled up into
+cumulative (Prometheus-style) runtime histograms per input extension and
+size bucket.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q, Sum, Avg
+from django.utils import timezone
+
+from .models import ConversionEvent
+
+# Upper bounds (bytes) for input size buckets.
+SIZE_BUCKETS = [
+    (100 * 1024, '<100KB'),
+    (1024 * 1024, '100KB-1MB'),
+    (10 * 1024 * 1024, '1MB-10MB'),
+]
+LARGEST_SIZE_BUCKET = '>10MB'
+
+# Upper bounds (milliseconds) for runtime histogram buckets.
+RUNTIME_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+def size_bucket(size):
+    for limit, label in SIZE_BUCKETS:
+        if size < limit:
+            return label
+    return LARGEST_SIZE_BUCKET
+
+
+def record_conversion(file_obj, extension, input_size, outcome,
+                      converter='', queue_wait_ms=0.0, runtime_ms=0.0, output_size=0):
+    return ConversionEvent.objects.create(
+        file_id=file_obj.pk if file_obj else None,
+        extension=extension,
+        size_bucket=size_bucket(input_size),
+        input_size=input_size,
+        output_size=output_size,
+        converter=converter,
+        queue_wait_ms=queue_wait_ms,
+        runtime_ms=runtime_ms,
+        outcome=outcome,
+    )
+
+
+def conversion_histograms(days=None):
+    """
+    One row per (extension, size bucket, converter) with counts per outcome,
+    runtime and queue-wait totals, and cumulative runtime bucket counts, in a
+    single GROUP BY query. Rows are ordered by total runtime, i.e. by how much
+    conversion time each document type costs us.
+    """
+    events = ConversionEvent.objects.all()
+    if days is not None:
+        events = events.filter(created_at__gte=timezone.now() - timedelta(days=days))
+
+    buckets = {f"le_{limit}": Count('id', filter=Q(runtime_ms__lte=limit)) for limit in RUNTIME_BUCKETS_MS}
+    rows = (
+        events.values('extension', 'size_bucket', 'converter')
+        .annotate(
+            count=Count('id'),
+            failed=Count('id', filter=Q(outcome=ConversionEvent.Outcomes.FAILED)),
+            reused=Count('id', filter=Q(outcome=ConversionEvent.Outcomes.REUSED)),
+            runtime_ms_sum=Sum('runtime_ms'),
+            queue_wait_ms_avg=Avg('queue_wait_ms'),
+            output_bytes_sum=Sum('output_size'),
+            **buckets,
+        )
+        .order_by('-runtime_ms_sum')
+    )
+
+    histograms = []
+    for row in rows:
+        row['buckets'] = {str(limit): row.pop(f"le_{limit}") for limit in RUNTIME_BUCKETS_MS}
+        row['buckets']['+Inf'] = row['count']
+        histograms.append(row)
+    return histograms
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _labels(row):
+    return (
+        f'extension="{_label_value(row["extension"])}",'
+        f'size="{_label_value(row["size_bucket"])}",'
+        f'converter="{_label_value(row["converter"])}"'
+    )
+
+
+def prometheus_text(histograms):
+    """
+    Render histograms in the Prometheus text exposition format.
+    """
+    name = 'file_editor_conversion_runtime_ms'
+    lines = [f"# TYPE {name} histogram"]
+    for row in histograms:
+        labels = _labels(row)
+        for limit, count in row['buckets'].items():
+            lines.append(f'{name}_bucket{{{labels},le="{limit}"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {row['runtime_ms_sum'] or 0}")
+        lines.append(f"{name}_count{{{labels}}} {row['count']}")
+    lines.append("# TYPE file_editor_conversion_failures_total counter")
+    for row in histograms:
+        lines.append(f"file_editor_conversion_failures_total{{{_labels(row)}}} {row['failed']}")
+    return "\n".join(lines) + "\n"
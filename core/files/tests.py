@@ -1,3 +1,1309 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
 
-# Create your tests here.
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from users.models import Profile
+from .admission import Overloaded, admit, admission_stats
+from .models import (
+    UploadedFile,
+    UploadedFileVersion,
+    Comment,
+    Notification,
+    FileStatus,
+    StatusCounter,
+    UserActivity,
+    UserStorage,
+    ConversionEvent,
+    AWAITING_REVIEW,
+)
+from . import converters, docx_patch, formats, scratch, views
+from .cache import (
+    COMMENTS_BLOCK,
+    VERSIONS_BLOCK,
+    bump_fragment_generation,
+    file_card_key,
+    fragment_generation,
+)
+from .converters import convert_pdf
+from .formats import get_handler
+from .locks import SingleFlight, file_lock
+from .ingest import QUOTA_EXCEEDED_MESSAGE, SNIFF_BYTES, cached_text, sniff_type
+from .quota import remaining_quota, storage_totals
+from .pdf_optimize import first_page_bytes, optimize_pdf
+from .telemetry import conversion_histograms, prometheus_text, record_conversion, size_bucket
+from .notifications import apply_action, encode_cursor, notify_users
+from .review import claim, transition
+from .views import _run_conversion
+
+
+class FilesTestCase(TestCase):
+    """
+    Media, scratch space and admission locks in a temporary directory;
+    deferred tasks run inline when the captured on_commit callbacks run.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        root = tempfile.mkdtemp(prefix='files-tests-')
+        cls.addClassCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'),
+            SCRATCH_DIR=os.path.join(root, 'scratch'),
+            ADMISSION_DIR=os.path.join(root, 'admission'),
+            BACKGROUND_TASK_WORKERS=0,
+            PDF_LINEARIZE=False,
+        )
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        self.owner = self.make_user('owner', Profile.Roles.AUDITOR)
+        self.reviewer = self.make_user('reviewer', Profile.Roles.SUPER_REVIEWER)
+        self.client.force_login(self.owner)
+
+    def make_user(self, username, role=Profile.Roles.VIEWER):
+        user = User.objects.create_user(username, password='x')
+        user.profile.role = role
+        user.profile.save()
+        return user
+
+    def upload(self, name='notes.txt', content=b'hello\n'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/upload/', {'file': SimpleUploadedFile(name, content)})
+        return UploadedFile.objects.latest('pk')
+
+    def edit(self, file_obj, text, **extra):
+        data = {'edited_text': text, 'change_type': 'minor', **extra}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/{file_obj.pk}/edit/', data)
+
+    def stored_bytes(self, file_obj):
+        file_obj.refresh_from_db()
+        with open(file_obj.file.path, 'rb') as f:
+            return f.read()
+
+
+# -------------------------
+# Fragment caching
+# -------------------------
+class FragmentCacheTests(FilesTestCase):
+    def test_card_key_covers_what_moves_without_a_signal(self):
+        file_obj = self.upload()
+        key = file_card_key(file_obj)
+        for field, value in (('version_number', Decimal('1.1')), ('status', FileStatus.APPROVED), ('comment_count', 3)):
+            changed = UploadedFile.objects.get(pk=file_obj.pk)
+            setattr(changed, field, value)
+            self.assertNotEqual(file_card_key(changed), key, field)
+
+    def test_cards_are_served_from_cache_until_the_file_changes(self):
+        file_obj = self.upload('first.txt')
+        self.assertContains(self.client.get('/'), 'first.txt')
+
+        # A queryset update sends no signal and the name is not in the key.
+        UploadedFile.objects.filter(pk=file_obj.pk).update(filename='second.txt')
+        self.assertContains(self.client.get('/'), 'first.txt')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UploadedFile.objects.get(pk=file_obj.pk).save_content()
+        self.assertContains(self.client.get('/'), 'second.txt')
+
+        # Comment counts and reviews move by queryset update; both are in the key.
+        self.client.post(f'/{file_obj.pk}/comment/', {'text': 'hi'})
+        self.assertContains(self.client.get('/'), '1 comment •')
+        transition(UploadedFile.objects.get(pk=file_obj.pk), FileStatus.APPROVED, self.reviewer)
+        self.assertContains(self.client.get('/'), FileStatus.APPROVED.label)
+
+    def test_generation_bumps_survive_eviction(self):
+        first = fragment_generation(1, COMMENTS_BLOCK)
+        versions = fragment_generation(1, VERSIONS_BLOCK)
+        self.assertEqual(fragment_generation(1, COMMENTS_BLOCK), first)
+
+        bump_fragment_generation(1, COMMENTS_BLOCK)
+        bumped = fragment_generation(1, COMMENTS_BLOCK)
+        self.assertGreater(bumped, first)
+        self.assertEqual(fragment_generation(1, VERSIONS_BLOCK), versions)
+
+        cache.clear()
+        bump_fragment_generation(1, COMMENTS_BLOCK)
+        self.assertGreater(fragment_generation(1, COMMENTS_BLOCK), bumped)
+
+
+# -------------------------
+# Storage accounting and quotas
+# -------------------------
+class StorageUsageTests(FilesTestCase):
+    def usage(self):
+        storage = UserStorage.objects.get(user=self.owner)
+        return storage.file_count, storage.upload_bytes, storage.converted_bytes
+
+    def assertUsageMatchesDisk(self):
+        files = list(UploadedFile.objects.filter(owner=self.owner))
+        on_disk = (
+            len(files),
+            sum(os.path.getsize(f.file.path) for f in files),
+            sum(os.path.getsize(f.converted.path) for f in files if f.converted),
+        )
+        self.assertEqual(self.usage(), on_disk)
+        for f in files:
+            self.assertEqual(f.file_size, os.path.getsize(f.file.path))
+
+    def test_sizes_follow_uploads_conversions_edits_and_deletes(self):
+        first, second = self.upload('a.txt', b'12345'), self.upload('b.txt', b'1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/{first.pk}/convert/')
+        self.assertTrue(UploadedFile.objects.get(pk=first.pk).converted)
+        self.assertUsageMatchesDisk()
+
+        self.edit(first, 'a much longer text than before')
+        self.assertUsageMatchesDisk()
+        self.assertEqual(first.versions.latest('pk').file_size, UploadedFile.objects.get(pk=first.pk).file_size)
+
+        self.client.post(f'/{second.pk}/delete/')
+        self.assertUsageMatchesDisk()
+
+    def test_rebuild_repairs_drift(self):
+        self.upload()
+        before = self.usage()
+        UserStorage.objects.update(file_count=7, upload_bytes=0)
+        UploadedFile.objects.update(file_size=0)
+        call_command('rebuild_storage_usage', stdout=io.StringIO())
+        self.assertEqual(self.usage(), before)
+        self.assertUsageMatchesDisk()
+
+    def test_quota_credits_the_file_being_replaced(self):
+        file_obj = self.upload('a.txt', b'x' * 100)
+        with override_settings(USER_UPLOAD_QUOTA_BYTES=sum(self.usage()[1:]) + 10):
+            self.assertEqual(remaining_quota(self.owner), 10)
+            self.assertEqual(remaining_quota(self.owner, credit=100), 110)
+
+            response = self.client.post('/upload/', {'file': SimpleUploadedFile('b.txt', b'x' * 50)})
+            self.assertContains(response, QUOTA_EXCEEDED_MESSAGE)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/{file_obj.pk}/edit/', {
+                    'file': SimpleUploadedFile('a.txt', b'y' * 50), 'change_type': 'minor',
+                })
+        self.assertEqual(self.stored_bytes(file_obj), b'y' * 50)
+        self.assertUsageMatchesDisk()
+
+    def test_totals_come_from_the_aggregates(self):
+        self.upload('a.txt', b'123')
+        other = self.make_user('other', Profile.Roles.AUDITOR)
+        UserStorage.adjust(other.pk, files=2, upload_bytes=10, converted_bytes=1)
+        totals = storage_totals()
+        self.assertEqual(totals['files'], 3)
+        self.assertEqual(totals['upload_bytes'], 13)
+
+
+# -------------------------
+# Orphaned media collector
+# -------------------------
+class GcMediaTests(FilesTestCase):
+    def media_file(self, name, content=b'orphan', age=7200):
+        path = os.path.join(settings.MEDIA_ROOT, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        if age:
+            stamp = os.path.getmtime(path) - age
+            os.utime(path, (stamp, stamp))
+        return path
+
+    def gc(self, *args):
+        out = io.StringIO()
+        call_command('gc_media', *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def test_dry_run_reports_without_deleting(self):
+        orphan = self.media_file('uploads/lost.txt')
+        self.assertIn("[dry run] 1 orphan(s)", self.gc())
+        self.assertTrue(os.path.exists(orphan))
+
+    def test_apply_removes_only_old_unreferenced_files(self):
+        file_obj = self.upload()
+        os.utime(file_obj.file.path, (0, 0))
+        old = self.media_file('edits/old.html')
+        new = self.media_file('converted/new.pdf', age=0)
+        staged = self.media_file('converted/.staging/job-1/partial.pdf')
+
+        self.gc('--apply')
+
+        self.assertFalse(os.path.exists(old))
+        for kept in (file_obj.file.path, new, staged):
+            self.assertTrue(os.path.exists(kept), kept)
+
+    def test_quarantine_moves_orphans(self):
+        self.media_file('uploads/lost.txt', b'keep me')
+        target = os.path.join(settings.MEDIA_ROOT, '..', 'quarantine')
+        self.gc('--quarantine', target)
+        with open(os.path.join(target, 'uploads', 'lost.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'keep me')
+
+    def test_linked_pdf_output_counts_as_new(self):
+        # As if gc scanned between a conversion's publish and its save.
+        original = self.media_file('uploads/report.pdf', b'%PDF-1.4 old upload')
+        converted_dir = os.path.join(settings.MEDIA_ROOT, 'converted')
+        os.makedirs(converted_dir)
+        output = convert_pdf(original, converted_dir)
+
+        self.gc('--apply')
+
+        self.assertTrue(os.path.exists(output))
+
+    def test_files_referenced_after_the_scan_are_kept(self):
+        orphan = self.media_file('uploads/late.txt')
+        scan = UploadedFile.objects.values_list
+
+        def scan_then_reference(*fields, **kwargs):
+            rows = scan(*fields, **kwargs)
+            if fields == ('file', 'converted'):
+                UploadedFile.objects.create(file='uploads/late.txt', owner=self.owner)
+            return rows
+
+        with mock.patch.object(UploadedFile.objects, 'values_list', side_effect=scan_then_reference, autospec=False):
+            self.gc('--apply')
+        self.assertTrue(os.path.exists(orphan))
+
+
+# -------------------------
+# Conversion staging
+# -------------------------
+class ConversionStagingTests(FilesTestCase):
+    def test_outputs_are_unique_per_file_and_version_and_leave_no_staging(self):
+        first, second = self.upload('notes.txt', b'one'), self.upload('notes.txt', b'two')
+        for file_obj in (first, second):
+            self.client.post(f'/{file_obj.pk}/convert/')
+            file_obj.refresh_from_db()
+
+        self.assertEqual(first.converted.name, f'converted/{os.path.splitext(os.path.basename(first.file.name))[0]}-{first.pk}-v1.0.pdf')
+        self.assertNotEqual(first.converted.name, second.converted.name)
+        converted_dir = os.path.join(settings.MEDIA_ROOT, 'converted')
+        self.assertEqual(sorted(os.listdir(converted_dir)), sorted(['.locks', '.staging', *(
+            os.path.basename(f.converted.name) for f in (first, second)
+        )]))
+        self.assertEqual(os.listdir(os.path.join(converted_dir, '.staging')), [])
+
+    @mock.patch.object(converters, 'LIBREOFFICE_PROFILES', 1)
+    def test_libreoffice_profiles_are_bounded(self):
+        job_dir = os.path.join(settings.SCRATCH_DIR, 'job-1')
+        warm = os.path.join(settings.SCRATCH_DIR, 'libreoffice', 'profile-0')
+        with converters._libreoffice_profile(job_dir) as profile:
+            self.assertEqual(profile, warm)
+            with converters._libreoffice_profile(job_dir) as overflow:
+                self.assertEqual(overflow, os.path.join(job_dir, 'profile'))
+        with converters._libreoffice_profile(job_dir) as profile:
+            self.assertEqual(profile, warm)
+
+
+# -------------------------
+# In-process converters
+# -------------------------
+UNICODE_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf'
+
+
+class TextConversionTests(FilesTestCase):
+    def convert(self, name, content):
+        job_dir = tempfile.mkdtemp(prefix='job-')
+        self.addCleanup(shutil.rmtree, job_dir, ignore_errors=True)
+        path = os.path.join(job_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        with mock.patch.object(converters, 'convert_with_libreoffice', return_value='soffice.pdf') as soffice:
+            output = converters.get_converter(os.path.splitext(name)[1])(path, job_dir)
+        return output, soffice.called
+
+    def test_latin1_text_is_drawn_in_process(self):
+        output, used_soffice = self.convert('notes.txt', 'Café déjà vu, £10\n'.encode('utf-8'))
+        self.assertFalse(used_soffice)
+        with open(output, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
+    @override_settings(TEXT_PDF_FONT=None)
+    def test_text_beyond_latin1_goes_to_libreoffice_without_a_font(self):
+        self.assertTrue(self.convert('greek.txt', 'Καλημέρα'.encode('utf-8'))[1])
+
+    def test_other_encodings_go_to_libreoffice(self):
+        self.assertTrue(self.convert('legacy.txt', 'Grüße'.encode('cp1252') + b'\x81')[1])
+
+    @unittest.skipUnless(os.path.exists(UNICODE_FONT), "DejaVu Sans Mono is not installed")
+    def test_unicode_font_draws_what_it_covers(self):
+        with override_settings(TEXT_PDF_FONT=UNICODE_FONT):
+            self.assertFalse(self.convert('greek.txt', 'Καλημέρα κόσμε\nПривет'.encode('utf-8'))[1])
+            # Right-to-left text needs LibreOffice's bidi and shaping.
+            self.assertTrue(self.convert('arabic.txt', 'مرحبا بالعالم'.encode('utf-8'))[1])
+            # No glyphs in this font.
+            self.assertTrue(self.convert('cjk.txt', '你好'.encode('utf-8'))[1])
+
+    def test_markup_and_tables_are_laid_out_by_libreoffice(self):
+        for extension in converters.LAYOUT_TEXT_EXTENSIONS:
+            self.assertIs(converters.get_converter(extension), converters.convert_with_libreoffice)
+        self.assertIs(converters.get_converter('.md'), converters.convert_text)
+
+
+# -------------------------
+# Conversion coalescing
+# -------------------------
+class CoalescingTests(FilesTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started, joined, release = threading.Event(), threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def convert():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'pdf'
+
+        def wait_for_result(future, timeout=None):
+            joined.set()
+            return original_result(future, timeout)
+
+        original_result = Future.result
+        with mock.patch.object(Future, 'result', wait_for_result):
+            leader = threading.Thread(target=lambda: results.append(flight.do('key', convert)))
+            leader.start()
+            started.wait(5)
+            follower = threading.Thread(target=lambda: results.append(flight.do('key', convert)))
+            follower.start()
+            joined.wait(5)
+            release.set()
+            leader.join(5)
+            follower.join(5)
+
+        self.assertEqual((calls, results), ([1], ['pdf', 'pdf']))
+        self.assertEqual(flight.do('key', lambda: 'again'), 'again')
+
+    def test_file_lock_excludes_other_holders(self):
+        path = os.path.join(settings.SCRATCH_DIR, 'locks', 'one.lock')
+        with file_lock(path) as held:
+            self.assertTrue(held)
+            with file_lock(path, blocking=False) as other:
+                self.assertFalse(other)
+        with file_lock(path, blocking=False) as other:
+            self.assertTrue(other)
+
+    def test_unchanged_content_reuses_the_pdf(self):
+        file_obj = self.upload()
+        with mock.patch('files.views._run_conversion', wraps=views._run_conversion) as run:
+            self.assertTrue(views._convert_to_pdf(file_obj)[0])
+            self.assertTrue(views._convert_to_pdf(UploadedFile.objects.get(pk=file_obj.pk))[0])
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(
+            list(ConversionEvent.objects.values_list('outcome', flat=True).order_by('pk')),
+            [ConversionEvent.Outcomes.SUCCESS, ConversionEvent.Outcomes.REUSED],
+        )
+
+        # New content is converted again (by the edit's background task).
+        self.edit(file_obj, 'changed')
+        self.assertEqual(ConversionEvent.objects.latest('pk').outcome, ConversionEvent.Outcomes.SUCCESS)
+
+
+# -------------------------
+# Conversion telemetry
+# -------------------------
+class TelemetryTests(FilesTestCase):
+    def event(self, extension, runtime_ms, outcome=ConversionEvent.Outcomes.SUCCESS, size=10):
+        return record_conversion(None, extension, size, outcome, converter='convert_x', runtime_ms=runtime_ms)
+
+    def test_size_buckets(self):
+        self.assertEqual(
+            [size_bucket(n) for n in (0, 100 * 1024, 1024 * 1024, 50 * 1024 * 1024)],
+            ['<100KB', '100KB-1MB', '1MB-10MB', '>10MB'],
+        )
+
+    def test_histograms_are_cumulative_and_most_expensive_first(self):
+        for runtime in (40, 300, 70000):
+            self.event('.docx', runtime)
+        self.event('.docx', 90, ConversionEvent.Outcomes.FAILED)
+        self.event('.txt', 5)
+        old = self.event('.txt', 5)
+        ConversionEvent.objects.filter(pk=old.pk).update(created_at=old.created_at - timedelta(days=3))
+
+        docx, txt = conversion_histograms()
+        self.assertEqual((docx['extension'], docx['count'], docx['failed']), ('.docx', 4, 1))
+        self.assertEqual(
+            (docx['buckets']['50'], docx['buckets']['100'], docx['buckets']['500'], docx['buckets']['60000'], docx['buckets']['+Inf']),
+            (1, 2, 3, 3, 4),
+        )
+        self.assertEqual(txt['count'], 2)
+        self.assertEqual([row['count'] for row in conversion_histograms(days=1)], [4, 1])
+
+        text = prometheus_text(conversion_histograms())
+        self.assertIn('file_editor_conversion_runtime_ms_bucket{extension=".docx",size="<100KB",converter="convert_x",le="100"} 2', text)
+        self.assertIn('file_editor_conversion_failures_total{extension=".docx",size="<100KB",converter="convert_x"} 1', text)
+
+        out = io.StringIO()
+        call_command('conversion_report', stdout=out)
+        self.assertEqual([line.split()[0] for line in out.getvalue().splitlines()], ['ext', '.docx', '.txt'])
+
+    def test_every_attempt_is_recorded(self):
+        good, bad = self.upload('a.txt'), self.upload('b.png', b'not an image')
+        for file_obj in (good, bad, good):
+            views._convert_to_pdf(UploadedFile.objects.get(pk=file_obj.pk))
+        self.assertEqual(
+            list(ConversionEvent.objects.values_list('extension', 'converter', 'outcome').order_by('pk')),
+            [
+                ('.txt', 'convert_text', ConversionEvent.Outcomes.SUCCESS),
+                ('.png', 'convert_image', ConversionEvent.Outcomes.FAILED),
+                ('.txt', '', ConversionEvent.Outcomes.REUSED),
+            ],
+        )
+
+
+# -------------------------
+# Fast web view PDFs
+# -------------------------
+def _pdf(pages=1):
+    import pikepdf
+
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
+
+
+@unittest.skipUnless(importlib.util.find_spec('pikepdf'), "needs pikepdf")
+@mock.patch('files.pdf_optimize.shutil.which', return_value=None)
+class PdfOptimizeTests(FilesTestCase):
+    def write(self, content):
+        path = os.path.join(settings.SCRATCH_DIR, 'input.pdf')
+        os.makedirs(settings.SCRATCH_DIR, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_small_files_are_left_alone(self, which):
+        path = self.write(_pdf())
+        self.assertEqual(optimize_pdf(path), path)
+        self.assertIsNone(first_page_bytes(path))
+
+    def test_forced_output_is_linearized(self, which):
+        path = self.write(_pdf(pages=3))
+        output = optimize_pdf(path, force=True)
+        self.assertNotEqual(output, path)
+        self.assertLess(first_page_bytes(output), os.path.getsize(output))
+
+    def test_failed_optimisation_keeps_the_input(self, which):
+        path = self.write(_pdf())
+        with mock.patch('files.pdf_optimize._optimize_with_pikepdf', side_effect=RuntimeError('boom')), \
+                self.assertLogs('files.pdf_optimize', 'ERROR'):
+            self.assertEqual(optimize_pdf(path, force=True), path)
+        self.assertEqual(os.listdir(settings.SCRATCH_DIR), ['input.pdf'])
+
+    @override_settings(PDF_LINEARIZE=True)
+    @mock.patch('files.pdf_optimize.MIN_LINEARIZE_BYTES', 0)
+    def test_conversions_publish_the_linearized_pdf(self, which):
+        file_obj = self.upload('doc.pdf', _pdf(pages=2))
+        self.assertTrue(views._convert_to_pdf(file_obj)[0])
+        file_obj.refresh_from_db()
+        self.assertIsNotNone(first_page_bytes(file_obj.converted.path))
+        self.assertIsNone(first_page_bytes(file_obj.file.path))
+
+
+# -------------------------
+# Spreadsheet grid
+# -------------------------
+def _workbook(sheets):
+    """XLSX bytes with one sheet per ``{title: rows}`` entry."""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title)
+        for row in rows:
+            ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@mock.patch('files.spreadsheet.ROW_BLOCK_SIZE', 2)
+class SpreadsheetGridTests(FilesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_obj = self.upload('book.xlsx', _workbook({
+            'Data': [['a', 1], ['b', 2.5], ['c', datetime(2026, 1, 2)], ['d'], ['e', None, 'wide']],
+            'Notes': [['only']],
+        }))
+
+    def cells(self, sheet=0, cell_range=None):
+        params = {'range': cell_range} if cell_range else {}
+        return self.client.get(f'/{self.file_obj.pk}/sheets/{sheet}/cells/', params)
+
+    def test_sheet_list(self):
+        sheets = self.client.get(f'/{self.file_obj.pk}/sheets/').json()['sheets']
+        self.assertEqual(
+            [(sheet['name'], sheet['dimensions']) for sheet in sheets],
+            [('Data', 'A1:C5'), ('Notes', 'A1:A1')],
+        )
+
+    def test_windows_are_padded_and_span_blocks(self):
+        data = self.cells(cell_range='b2:c5').json()
+        self.assertEqual((data['range'], data['min_row'], data['min_col'], data['sheet']), ('B2:C5', 2, 2, 0))
+        self.assertEqual(data['rows'], [[2.5, None], ['2026-01-02T00:00:00', None], [None, None], [None, 'wide']])
+        self.assertEqual(self.cells(1, 'A1:B2').json()['rows'], [['only', None], [None, None]])
+
+    def test_cached_blocks_serve_later_windows_until_the_file_changes(self):
+        self.cells(cell_range='A1:B4')
+        with mock.patch('files.spreadsheet._load', side_effect=AssertionError('streamed again')):
+            self.assertEqual(self.cells(cell_range='A3:A4').json()['rows'], [['c'], ['d']])
+
+        with open(self.file_obj.file.path, 'wb') as f:
+            f.write(_workbook({'Data': [['new']]}))
+        self.assertEqual(self.cells(cell_range='A1:A1').json()['rows'], [['new']])
+
+    def test_bad_requests(self):
+        for sheet, cell_range in ((0, 'nonsense'), (0, 'A:A'), (0, 'A1:ZZ1000'), (5, 'A1:A1')):
+            self.assertEqual(self.cells(sheet, cell_range).status_code, 400, cell_range)
+
+        text = self.upload('notes.txt')
+        self.assertEqual(self.client.get(f'/{text.pk}/sheets/').status_code, 404)
+        self.client.force_login(self.reviewer)
+        self.assertEqual(self.cells().status_code, 403)
+
+
+# -------------------------
+# DOCX paragraph patching
+# -------------------------
+def _docx(*paragraphs):
+    """
+    A minimal package: each paragraph is a list of runs, a run is text with
+    '\n' for w:br. Carries an uncompressed media part alongside.
+    """
+    def run(text):
+        parts = []
+        for index, line in enumerate(text.split('\n')):
+            if index:
+                parts.append('<w:br/>')
+            if line:
+                parts.append(f'<w:t xml:space="preserve">{line}</w:t>')
+        return f'<w:r><w:rPr><w:b/></w:rPr>{"".join(parts)}</w:r>'
+
+    body = ''.join(f'<w:p>{"".join(run(text) for text in runs)}</w:p>' for runs in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        zf.writestr('word/document.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}<w:sectPr/></w:body></w:document>'
+        ))
+        zf.writestr(zipfile.ZipInfo('word/media/image1.png', (2020, 1, 2, 3, 4, 6)), b'\x89PNG' + bytes(range(256)))
+    return buffer.getvalue()
+
+
+class DocxPatchTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def write(self, content):
+        path = os.path.join(self.dir, 'doc.docx')
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def members(self, path):
+        with zipfile.ZipFile(path) as zf:
+            return {
+                info.filename: (info.compress_type, info.date_time, zf.read(info))
+                for info in zf.infolist()
+            }
+
+    def assertOnlyDocumentChanged(self, before, path):
+        after = self.members(path)
+        self.assertEqual(list(after), list(before))
+        for name in before:
+            if name != 'word/document.xml':
+                self.assertEqual(after[name], before[name], name)
+
+    def test_unchanged_text_leaves_the_file_alone(self):
+        path = self.write(_docx(['One'], ['Two\n'], ['\nThree'], ['a\n\nb'], []))
+        text = docx_patch.extract_text(path)
+        with open(path, 'rb') as f:
+            original = f.read()
+
+        self.assertEqual(docx_patch.patch_docx(path, text), 0)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+    def test_trailing_and_double_breaks_round_trip(self):
+        path = self.write(_docx(['Two\n'], ['\nThree'], ['a\n\nb'], ['x\ny']))
+        text = docx_patch.extract_text(path)
+        self.assertEqual(docx_patch.split_paragraphs(text), ['Two\u2028', '\u2028Three', 'a\u2028\u2028b', 'x\ny'])
+
+        before = self.members(path)
+        self.assertEqual(docx_patch.patch_docx(path, text.replace('x\ny', 'x\nz')), 1)
+        self.assertEqual(docx_patch.split_paragraphs(docx_patch.extract_text(path)), ['Two\u2028', '\u2028Three', 'a\u2028\u2028b', 'x\nz'])
+        self.assertOnlyDocumentChanged(before, path)
+
+    def test_edit_keeps_run_formatting(self):
+        path = self.write(_docx(['One'], ['Two'], ['Three']))
+        before = self.members(path)
+
+        self.assertEqual(docx_patch.patch_docx(path, 'One\n\nTwo, edited\n\nThree'), 1)
+
+        self.assertEqual(docx_patch.extract_text(path), 'One\n\nTwo, edited\n\nThree')
+        self.assertEqual(self.members(path)['word/document.xml'][2].count(b'<w:b/>'), 3)
+        self.assertOnlyDocumentChanged(before, path)
+
+    def test_insert_and_remove_paragraphs(self):
+        path = self.write(_docx(['One'], ['Two'], ['Three']))
+        before = self.members(path)
+
+        self.assertEqual(docx_patch.patch_docx(path, 'Zero\n\nOne\n\nThree\n\nFour'), 3)
+
+        self.assertEqual(docx_patch.extract_text(path), 'Zero\n\nOne\n\nThree\n\nFour')
+        self.assertOnlyDocumentChanged(before, path)
+
+
+# -------------------------
+# Edits commit atomically; side effects run after commit
+# -------------------------
+class EditCommitTests(FilesTestCase):
+    def test_reviewers_are_notified_only_after_commit(self):
+        file_obj = self.upload()
+        before = Notification.objects.filter(recipient=self.reviewer).count()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(f'/{file_obj.pk}/edit/', {'edited_text': 'changed', 'change_type': 'minor'})
+        self.assertEqual(Notification.objects.filter(recipient=self.reviewer).count(), before)
+        self.assertTrue(callbacks)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Notification.objects.filter(recipient=self.reviewer).count(), before + 1)
+
+    def test_approval_fan_out_runs_after_commit(self):
+        file_obj = self.upload()
+        self.make_user('viewer')
+        self.client.force_login(self.reviewer)
+        approvals = Notification.objects.filter(notification_type=Notification.Types.FILE_APPROVED)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(f'/{file_obj.pk}/status/approve/')
+        self.assertFalse(approvals.exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(approvals.count(), User.objects.filter(is_active=True).count())
+
+    def test_failed_edit_changes_nothing(self):
+        file_obj = self.upload(content=b'original\n')
+
+        with mock.patch('files.views.FileChange.record', side_effect=RuntimeError('boom')):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(
+                    f'/{file_obj.pk}/edit/', {'edited_text': 'changed', 'change_type': 'major'},
+                )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.stored_bytes(file_obj), b'original\n')
+        self.assertEqual(file_obj.version_label, '1.0')
+        self.assertEqual(UploadedFileVersion.objects.filter(file=file_obj).count(), 1)
+        staging = os.path.join(os.path.dirname(file_obj.file.path), '.staging')
+        self.assertEqual(os.listdir(staging), [])
+
+    def test_edit_records_version_and_resets_review(self):
+        file_obj = self.upload()
+        transition(file_obj, FileStatus.REJECTED, self.reviewer)
+
+        self.edit(file_obj, 'changed')
+
+        self.assertEqual(self.stored_bytes(file_obj), b'changed')
+        self.assertEqual(file_obj.version_label, '1.1')
+        self.assertEqual(file_obj.status, FileStatus.PENDING)
+        self.assertEqual(file_obj.file_size, len(b'changed'))
+        self.assertEqual(UploadedFileVersion.objects.filter(file=file_obj).count(), 2)
+
+
+# -------------------------
+# file_detail with paginated history panes
+# -------------------------
+class FileDetailTests(FilesTestCase):
+    def detail_queries(self, file_obj):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(f'/{file_obj.pk}/').status_code, 200)
+        return len(queries)
+
+    def test_detail_cost_does_not_grow_with_history(self):
+        file_obj = self.upload()
+        before = self.detail_queries(file_obj)
+        for n in range(5):
+            self.client.post(f'/{file_obj.pk}/comment/', {'text': f'c{n}'})
+            self.edit(file_obj, f'text {n}', edit_comment=f'e{n}')
+        self.assertEqual(self.detail_queries(file_obj), before)
+
+    @mock.patch('files.views.DETAIL_PAGE_SIZE', 2)
+    def test_panes_page_newest_first(self):
+        file_obj = self.upload()
+        for n in range(3):
+            self.client.post(f'/{file_obj.pk}/comment/', {'text': f'comment {n}'})
+
+        first = self.client.get(f'/{file_obj.pk}/comments/').content.decode()
+        self.assertLess(first.index('comment 2'), first.index('comment 1'))
+        self.assertNotIn('comment 0', first)
+        self.assertIn(f'/{file_obj.pk}/comments/?page=2', first)
+        last = self.client.get(f'/{file_obj.pk}/comments/', {'page': 2}).content.decode()
+        self.assertIn('comment 0', last)
+        self.assertNotIn('?page=', last)
+
+        self.assertContains(self.client.get(f'/{file_obj.pk}/versions/'), '1.0')
+        self.assertEqual(self.client.get('/999/versions/').status_code, 404)
+
+    def test_panes_are_cached_until_the_history_changes(self):
+        file_obj = self.upload()
+        self.client.post(f'/{file_obj.pk}/comment/', {'text': 'original'})
+        self.assertContains(self.client.get(f'/{file_obj.pk}/comments/'), 'original')
+
+        Comment.objects.filter(file=file_obj).update(text='rewritten')
+        self.assertContains(self.client.get(f'/{file_obj.pk}/comments/'), 'original')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/{file_obj.pk}/comment/', {'text': 'another'})
+        page = self.client.get(f'/{file_obj.pk}/comments/').content.decode()
+        self.assertIn('rewritten', page)
+        self.assertIn('another', page)
+
+
+# -------------------------
+# Streaming ingest
+# -------------------------
+class RejectEverything:
+    """UPLOAD_SCANNER factory for the tests: refuses any upload."""
+
+    def feed(self, chunk):
+        pass
+
+    def verdict(self):
+        return "test scanner says no"
+
+
+class IngestTests(FilesTestCase):
+    def test_sniff_type(self):
+        self.assertEqual(sniff_type(b'%PDF-1.7 ...'), 'application/pdf')
+        self.assertEqual(sniff_type(b'\x89PNG\r\n\x1a\n....'), 'image/png')
+        self.assertEqual(sniff_type(_xlsx(['a'])[:SNIFF_BYTES]), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertEqual(sniff_type('héllo'.encode('utf-8')[:2]), 'text/plain')
+        self.assertEqual(sniff_type(b'\x00\x01'), 'application/octet-stream')
+        self.assertEqual(sniff_type(b''), 'application/x-empty')
+
+    def test_upload_is_profiled_while_it_streams(self):
+        content = b'hello ingest\n' * 1000
+        file_obj = self.upload('notes.txt', content)
+
+        self.assertEqual(file_obj.content_sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(file_obj.detected_type, 'text/plain')
+        self.assertEqual(file_obj.file_size, len(content))
+        self.assertEqual(cached_text(file_obj.content_sha256), content.decode())
+
+    @override_settings(UPLOAD_INGEST_STAGES=['files.ingest.HashStage'])
+    def test_stages_come_from_settings(self):
+        file_obj = self.upload('notes.txt', b'only hashed')
+        self.assertEqual(file_obj.content_sha256, hashlib.sha256(b'only hashed').hexdigest())
+        self.assertEqual(file_obj.detected_type, '')
+
+    @override_settings(UPLOAD_SCANNER='files.tests.RejectEverything')
+    def test_scanner_verdict_rejects_the_upload(self):
+        response = self.client.post('/upload/', {'file': SimpleUploadedFile('notes.txt', b'x')})
+        self.assertContains(response, "test scanner says no")
+        self.assertFalse(UploadedFile.objects.exists())
+
+    @override_settings(USER_UPLOAD_QUOTA_BYTES=10)
+    def test_quota_is_enforced_mid_stream(self):
+        response = self.client.post('/upload/', {'file': SimpleUploadedFile('notes.txt', b'x' * 11)})
+        self.assertContains(response, QUOTA_EXCEEDED_MESSAGE)
+        self.assertFalse(UploadedFile.objects.exists())
+
+    def test_handler_is_installed_only_for_permitted_uploads(self):
+        file_obj = self.upload()
+        self.client.force_login(self.make_user('viewer'))
+        with mock.patch('files.views.install_ingest_handler') as install:
+            upload = self.client.post('/upload/', {'file': SimpleUploadedFile('x.txt', b'x')})
+            replace = self.client.post(f'/{file_obj.pk}/edit/', {'file': SimpleUploadedFile('x.txt', b'x')})
+        self.assertEqual((upload.status_code, replace.status_code), (403, 403))
+        install.assert_not_called()
+
+
+# -------------------------
+# Reviewer queue: status counters and compare-and-set transitions
+# -------------------------
+class ReviewQueueTests(FilesTestCase):
+    def assertCountersMatch(self):
+        recount = {status: UploadedFile.objects.filter(status=status).count() for status in FileStatus.values}
+        self.assertEqual(StatusCounter.totals(), recount)
+
+    def test_counters_follow_uploads_reviews_edits_and_deletes(self):
+        files = [self.upload(f'f{n}.txt') for n in range(3)]
+        self.assertCountersMatch()
+
+        claim(self.reviewer, files[0].pk)
+        transition(UploadedFile.objects.get(pk=files[1].pk), FileStatus.APPROVED, self.reviewer)
+        self.assertCountersMatch()
+
+        self.edit(files[1], 'changed')
+        self.assertCountersMatch()
+
+        self.client.post(f'/{files[2].pk}/delete/')
+        self.assertCountersMatch()
+
+    def test_transition_from_a_stale_status_changes_nothing(self):
+        file_obj = self.upload()
+        stale = UploadedFile.objects.get(pk=file_obj.pk)
+        self.assertTrue(transition(UploadedFile.objects.get(pk=file_obj.pk), FileStatus.IN_REVIEW, self.reviewer))
+
+        self.assertFalse(transition(stale, FileStatus.REJECTED, self.reviewer))
+        file_obj.refresh_from_db()
+        self.assertEqual(file_obj.status, FileStatus.IN_REVIEW)
+        self.assertCountersMatch()
+
+    def test_a_file_is_claimed_once(self):
+        file_obj = self.upload()
+        other = self.make_user('other', Profile.Roles.SUPER_REVIEWER)
+
+        self.assertEqual(claim(self.reviewer, file_obj.pk), file_obj)
+        self.assertIsNone(claim(other, file_obj.pk))
+        self.assertIsNone(claim(other))
+        file_obj.refresh_from_db()
+        self.assertEqual(file_obj.reviewed_by, self.reviewer)
+
+    def test_claim_next_skips_claimed_files(self):
+        first, second = self.upload('a.txt'), self.upload('b.txt')
+        self.assertEqual(claim(self.reviewer), first)
+        self.assertEqual(claim(self.reviewer), second)
+        self.assertIsNone(claim(self.reviewer))
+        self.assertCountersMatch()
+
+    def test_conversion_keeps_a_decision_made_while_it_ran(self):
+        file_obj = self.upload()
+        loaded = UploadedFile.objects.get(pk=file_obj.pk)
+        transition(UploadedFile.objects.get(pk=file_obj.pk), FileStatus.APPROVED, self.reviewer)
+
+        success, _ = _run_conversion(loaded, loaded.content_sha256, 0)
+
+        self.assertTrue(success)
+        file_obj.refresh_from_db()
+        self.assertTrue(file_obj.converted)
+        self.assertEqual(file_obj.status, FileStatus.APPROVED)
+        self.assertEqual(file_obj.reviewed_by, self.reviewer)
+        self.assertCountersMatch()
+
+
+# -------------------------
+# Format handler registry
+# -------------------------
+class FormatRegistryTests(FilesTestCase):
+    def test_lookup_by_extension(self):
+        self.assertIsInstance(get_handler('.DOCX'), formats.DocxFormat)
+        self.assertIs(get_handler('.txt').converter('.txt'), converters.convert_text)
+        unknown = get_handler('.odt')
+        self.assertEqual((unknown.preview, unknown.editable), (None, False))
+        self.assertIs(unknown.converter('.odt'), converters.convert_with_libreoffice)
+
+    def test_availability_is_checked_without_importing(self):
+        class Exotic(formats.FormatHandler):
+            requires = ('no_such_module_for_tests',)
+
+        self.assertFalse(Exotic().available())
+        self.assertTrue(get_handler('.xlsx').available())
+
+    def test_views_load_without_the_format_libraries(self):
+        script = (
+            "import sys, django; django.setup(); import core.urls, files.views; "
+            "print(sorted(m for m in ('openpyxl', 'lxml', 'docx', 'PIL', 'fpdf') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'core.settings'}, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_xlsx_round_trip(self):
+        file_obj = self.upload('book.xlsx', _workbook({'Sheet': [['a', 'b'], ['c', None]]}))
+        handler = get_handler('.xlsx')
+        path = file_obj.file.path
+        self.assertEqual(handler.read(file_obj, path), ('a,b\nc,\n', 'a,b\nc,\n'))
+        handler.write(file_obj, path, 'x,y\n')
+        self.assertEqual(handler.read(file_obj, path)[0].splitlines()[0], 'x,y')
+
+
+# -------------------------
+# Media storage and scratch cache
+# -------------------------
+class RemoteLikeStorage(Storage):
+    """Files under MEDIA_ROOT behind a storage without path(), like S3Storage."""
+
+    def __init__(self):
+        self.local = FileSystemStorage()
+
+    def _open(self, name, mode='rb'):
+        return self.local.open(name, mode)
+
+    def size(self, name):
+        return self.local.size(name)
+
+    def get_modified_time(self, name):
+        return self.local.get_modified_time(name)
+
+
+class StorageTests(FilesTestCase):
+    def remote_file(self, name, content):
+        storage = RemoteLikeStorage()
+        storage.local.save(name, ContentFile(content))
+        return SimpleNamespace(storage=storage, name=name)
+
+    def test_local_storage_is_used_in_place(self):
+        file_obj = self.upload()
+        self.assertEqual(scratch.local_path(file_obj.file), file_obj.file.path)
+
+    def test_remote_objects_are_cached_until_they_change(self):
+        field_file = self.remote_file('uploads/a.txt', b'one')
+        with mock.patch.object(RemoteLikeStorage, '_open', wraps=field_file.storage._open) as opened:
+            path = scratch.local_path(field_file)
+            self.assertEqual(scratch.local_path(field_file), path)
+            self.assertEqual(opened.call_count, 1)
+
+            with open(os.path.join(settings.MEDIA_ROOT, 'uploads/a.txt'), 'wb') as f:
+                f.write(b'changed')
+            with open(scratch.local_path(field_file), 'rb') as f:
+                self.assertEqual(f.read(), b'changed')
+            self.assertEqual(opened.call_count, 2)
+
+        scratch.discard(field_file.name)
+        self.assertFalse(os.path.exists(path))
+
+    def test_trim_evicts_least_recently_used_copies(self):
+        paths = [scratch.local_path(self.remote_file(f'uploads/{n}.txt', b'x' * 10)) for n in range(3)]
+        for age, path in zip((300, 200, 100), paths):
+            os.utime(path, (time.time() - age,) * 2)
+
+        with override_settings(SCRATCH_MIN_AGE=150):
+            self.assertEqual(scratch.trim(max_bytes=25), 10)
+            self.assertEqual(scratch.trim(max_bytes=5), 10)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, False, True])
+
+    def test_stored_files_are_removed_after_the_row_delete_commits(self):
+        file_obj = self.upload()
+        path = file_obj.file.path
+        with self.captureOnCommitCallbacks() as callbacks:
+            file_obj.delete()
+        self.assertTrue(os.path.exists(path))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_or_repeated_delete_keeps_the_files(self):
+        file_obj = self.upload()
+        stale = UploadedFile.objects.get(pk=file_obj.pk)
+        with mock.patch.object(StatusCounter, 'shift', side_effect=RuntimeError('boom')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+                file_obj.delete()
+        self.assertTrue(os.path.exists(file_obj.file.path))
+
+        UploadedFile.objects.filter(pk=file_obj.pk).update(file='uploads/other.txt')
+        with self.captureOnCommitCallbacks(execute=True):
+            UploadedFile.objects.get(pk=file_obj.pk).delete()
+            self.assertEqual(stale.delete(), (0, {}))
+        self.assertTrue(os.path.exists(file_obj.file.path))
+
+    def test_bulk_deletes_keep_counters_and_remove_files(self):
+        files = [self.upload(f'f{n}.txt') for n in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            _, deleted = UploadedFile.objects.filter(pk__in=[f.pk for f in files[:2]]).delete()
+        self.assertEqual(deleted['files.UploadedFile'], 2)
+        self.assertEqual(self.owner.storage.file_count, 1)
+        self.assertEqual(StatusCounter.totals()[FileStatus.PENDING], 1)
+        self.assertEqual([os.path.exists(f.file.path) for f in files], [False, False, True])
+
+        admin_user = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/files/uploadedfile/', {
+                'action': 'delete_selected', '_selected_action': [files[2].pk], 'post': 'yes',
+            })
+        self.assertFalse(UploadedFile.objects.exists())
+        self.assertEqual(StatusCounter.totals()[FileStatus.PENDING], 0)
+        self.assertFalse(os.path.exists(files[2].file.path))
+        self.owner.storage.refresh_from_db()
+        self.assertEqual(self.owner.storage.file_count, 0)
+
+
+# -------------------------
+# Admission control
+# -------------------------
+ONE_SLOT = {'convert': {'slots': 1, 'queue': 0}, 'edit': {'slots': 1, 'queue': 0}}
+
+
+def _xlsx(*rows):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@override_settings(ADMISSION_POOLS=ONE_SLOT, ADMISSION_QUEUE_TIMEOUT=0.2)
+class AdmissionTests(FilesTestCase):
+    def test_full_pool_rejects_and_counts(self):
+        with admit('edit'):
+            with self.assertRaises(Overloaded) as raised:
+                with admit('edit'):
+                    pass
+        self.assertEqual(raised.exception.retry_after, settings.ADMISSION_RETRY_AFTER)
+        stats = admission_stats()['edit']
+        self.assertEqual((stats['admitted_total'], stats['rejected_total'], stats['in_flight']), (1, 1, 0))
+
+    @override_settings(ADMISSION_POOLS={'convert': {'slots': 1, 'queue': 1}, 'edit': {'slots': 1, 'queue': 1}})
+    def test_queued_request_times_out(self):
+        with admit('edit'):
+            with self.assertRaises(Overloaded):
+                with admit('edit'):
+                    pass
+        self.assertEqual(admission_stats()['edit']['timed_out_total'], 1)
+
+    def test_busy_heavy_edit_gets_503_and_keeps_the_file(self):
+        file_obj = self.upload('sheet.xlsx', _xlsx(['a', 'b']))
+        before = self.stored_bytes(file_obj)
+
+        with admit('edit'):
+            response = self.client.post(f'/{file_obj.pk}/edit/', {'edited_text': 'x,y', 'change_type': 'minor'})
+            cells = self.client.get(f'/{file_obj.pk}/sheets/0/cells/', {'range': 'A1:B1'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.ADMISSION_RETRY_AFTER))
+        self.assertEqual(cells.status_code, 503)
+        self.assertIn('retry_after', cells.json())
+        self.assertEqual(self.stored_bytes(file_obj), before)
+        self.assertEqual(file_obj.version_label, '1.0')
+
+        response = self.edit(file_obj, 'x,y')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(f'/{file_obj.pk}/sheets/0/cells/', {'range': 'A1:B1'}).json()['rows'], [['x', 'y']])
+
+    def test_text_edits_are_not_gated(self):
+        file_obj = self.upload()
+        with admit('edit'):
+            response = self.edit(file_obj, 'changed')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stored_bytes(file_obj), b'changed')
+
+
+# -------------------------
+# Per-user activity counters
+# -------------------------
+class UserActivityTests(FilesTestCase):
+    def assertActivityMatches(self):
+        expected = {}
+        for user in User.objects.all():
+            pending = UploadedFile.objects.filter(owner=user, status__in=AWAITING_REVIEW).count()
+            unread = Notification.objects.filter(recipient=user, is_read=False).count()
+            if pending or unread:
+                expected[user.pk] = (pending, unread)
+        stored = {
+            row.user_id: (row.pending_reviews, row.unread_notifications)
+            for row in UserActivity.objects.all()
+            if row.pending_reviews or row.unread_notifications
+        }
+        self.assertEqual(stored, expected)
+
+    def review(self, file_obj, action):
+        self.client.force_login(self.reviewer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/{file_obj.pk}/status/{action}/')
+        self.client.force_login(self.owner)
+
+    def test_counters_follow_reviews_inbox_actions_and_deletes(self):
+        files = [self.upload(f'f{n}.txt') for n in range(4)]
+        self.assertActivityMatches()
+
+        self.review(files[0], 'approve')
+        self.review(files[1], 'reject')
+        self.assertActivityMatches()
+
+        ids = list(self.owner.notifications.values_list('id', flat=True))
+        apply_action(self.owner, 'mark_read', ids=ids[:1])
+        apply_action(self.owner, 'mark_unread', ids=ids[:1])
+        apply_action(self.reviewer, 'dismiss', ids=list(self.reviewer.notifications.values_list('id', flat=True)[:2]))
+        apply_action(self.owner, 'mark_read', up_to=encode_cursor(self.owner.notifications.first()))
+        self.assertActivityMatches()
+
+        self.edit(files[2], 'changed')
+        self.client.post(f'/{files[3].pk}/delete/')
+        self.assertActivityMatches()
+
+    def notify_owner(self, file_obj, message, notif_type=Notification.Types.GENERAL, days_old=0):
+        notify_users(User.objects.filter(pk=self.owner.pk), self.reviewer, notif_type, message, file_obj)
+        notification = Notification.objects.latest('id')
+        if days_old:
+            Notification.objects.filter(pk=notification.pk).update(
+                created_at=notification.created_at - timedelta(days=days_old),
+            )
+        return notification
+
+    def test_compaction_collapses_old_unread_rows_per_type(self):
+        file_obj = self.upload()
+        for n in range(3):
+            self.notify_owner(file_obj, f"update {n}", days_old=100)
+        self.notify_owner(file_obj, "approved", Notification.Types.FILE_APPROVED, days_old=100)
+        for n in range(2):
+            self.notify_owner(file_obj, f"fresh {n}")
+        read = self.notify_owner(file_obj, "seen", days_old=100)
+        apply_action(self.owner, 'mark_read', ids=[read.pk])
+
+        call_command('prune_notifications', stdout=io.StringIO())
+
+        remaining = Notification.objects.filter(recipient=self.owner).order_by('id')
+        self.assertEqual(
+            [(n.message, n.digest_count) for n in remaining],
+            [("update 2", 2), ("approved", 0), ("fresh 0", 0), ("fresh 1", 0)],
+        )
+        self.assertFalse(Notification.objects.filter(pk=read.pk).exists())
+        self.assertActivityMatches()
+
+    def test_digest_count_carries_over_between_runs(self):
+        file_obj = self.upload()
+        for n in range(3):
+            self.notify_owner(file_obj, f"update {n}", days_old=100)
+        call_command('prune_notifications', stdout=io.StringIO())
+        for n in range(2):
+            self.notify_owner(file_obj, f"later {n}", days_old=95)
+        call_command('prune_notifications', stdout=io.StringIO())
+
+        digest = Notification.objects.get(recipient=self.owner, related_file=file_obj)
+        self.assertEqual((digest.message, digest.digest_count), ("later 1", 4))
+        self.assertFalse(digest.is_read)
+        self.assertActivityMatches()
+
+    def test_failed_fan_out_leaves_no_rows_or_counts(self):
+        file_obj = self.upload()
+        before = Notification.objects.count()
+        with mock.patch.object(UserActivity, 'adjust', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                notify_users(User.objects.all(), self.reviewer, Notification.Types.GENERAL, "hello", file_obj)
+        self.assertEqual(Notification.objects.count(), before)
+        self.assertActivityMatches()
+
+    def test_rebuild_repairs_drift(self):
+        self.upload()
+        UserActivity.objects.update(pending_reviews=99, unread_notifications=99)
+        call_command('rebuild_user_activity', stdout=io.StringIO())
+        self.assertActivityMatches()
+
+
+# -------------------------
+# Per-file activity columns
+# -------------------------
+class FileActivityTests(FilesTestCase):
+    def assertActivityMatches(self):
+        for file_obj in UploadedFile.objects.all():
+            self.assertEqual(
+                (file_obj.comment_count, file_obj.version_count),
+                (Comment.objects.filter(file=file_obj).count(), UploadedFileVersion.objects.filter(file=file_obj).count()),
+            )
+
+    def test_counts_follow_comments_edits_and_replacements(self):
+        file_obj = self.upload()
+        self.assertActivityMatches()
+
+        self.client.post(f'/{file_obj.pk}/comment/', {'text': 'first'})
+        self.edit(file_obj, 'changed', edit_comment='why')
+        self.edit(file_obj, 'again')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/{file_obj.pk}/edit/', {
+                'file': SimpleUploadedFile('notes.txt', b'replaced'),
+                'change_type': 'major',
+                'edit_comment': 'new upload',
+            })
+
+        self.assertActivityMatches()
+        file_obj.refresh_from_db()
+        self.assertEqual((file_obj.comment_count, file_obj.version_count), (3, 4))
+        self.assertEqual(self.client.get(f'/{file_obj.pk}/').context['file'].comment_count, 3)
+
+    def test_save_content_keeps_counts_and_review_state(self):
+        file_obj = self.upload()
+        stale = UploadedFile.objects.get(pk=file_obj.pk)
+        self.client.post(f'/{file_obj.pk}/comment/', {'text': 'hi'})
+        transition(UploadedFile.objects.get(pk=file_obj.pk), FileStatus.APPROVED, self.reviewer)
+
+        stale.filename = 'renamed.txt'
+        stale.save_content()
+
+        file_obj.refresh_from_db()
+        self.assertEqual(file_obj.filename, 'renamed.txt')
+        self.assertEqual(file_obj.comment_count, 1)
+        self.assertEqual(file_obj.status, FileStatus.APPROVED)
+
+    def test_full_save_writes_the_status_and_shifts_counters_from_the_row(self):
+        file_obj = self.upload()
+        stale = UploadedFile.objects.get(pk=file_obj.pk)
+        transition(UploadedFile.objects.get(pk=file_obj.pk), FileStatus.APPROVED, self.reviewer)
+
+        stale.status = FileStatus.REJECTED
+        stale.save()
+
+        file_obj.refresh_from_db()
+        self.assertEqual(file_obj.status, FileStatus.REJECTED)
+        totals = StatusCounter.totals()
+        self.assertEqual((totals[FileStatus.APPROVED], totals[FileStatus.REJECTED]), (0, 1))
+        self.assertEqual(UserActivity.objects.get(user=self.owner).pending_reviews, 0)
+
+    def test_sort_by_activity(self):
+        older, newer = self.upload('a.txt'), self.upload('b.txt')
+        UploadedFile.objects.filter(pk=newer.pk).update(last_activity_at=older.last_activity_at - timedelta(hours=1))
+        self.client.post(f'/{older.pk}/comment/', {'text': 'bump'})
+
+        by_upload = [f.pk for f in self.client.get('/').context['files']]
+        by_activity = [f.pk for f in self.client.get('/', {'sort': 'activity'}).context['files']]
+        self.assertEqual(by_upload, [newer.pk, older.pk])
+        self.assertEqual(by_activity, [older.pk, newer.pk])
+
+    def test_rebuild_repairs_drift(self):
+        file_obj = self.upload()
+        self.client.post(f'/{file_obj.pk}/comment/', {'text': 'hi'})
+        UploadedFile.objects.update(comment_count=50, version_count=50)
+
+        call_command('rebuild_file_activity', stdout=io.StringIO())
+
+        self.assertActivityMatches()
+        file_obj.refresh_from_db()
+        self.assertEqual(
+            file_obj.last_activity_at,
+            Comment.objects.filter(file=file_obj).latest('created_at').created_at,
+        )
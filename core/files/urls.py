@@ -7,7 +7,11 @@ urlpatterns = [
     path('', views.file_list, name='file_list'),
     path('upload/', views.file_upload, name='file_upload'),
     path('<int:pk>/', views.file_detail, name='file_detail'),
+    path('<int:pk>/versions/', views.file_versions, name='file_versions'),
+    path('<int:pk>/comments/', views.file_comments, name='file_comments'),
     path('<int:file_id>/edit/', views.file_edit, name='file_edit'),
+    path('<int:pk>/sheets/', views.sheet_list, name='sheet_list'),
+    path('<int:pk>/sheets/<int:sheet>/cells/', views.sheet_cells, name='sheet_cells'),
     path('<int:pk>/delete/', views.file_delete, name='file_delete'),
     path('<int:pk>/comment/', views.add_comment, name='add_comment'),
     path('<int:pk>/convert/', views.convert_to_pdf, name='convert_to_pdf'),
@@ -15,5 +19,7 @@ urlpatterns = [
     path('<int:pk>/view-pdf/', views.view_pdf, name='view_pdf'),  # ✅ NEW: For PDF.js viewer
     path('<int:pk>/download-pdf/', views.download_pdf, name='download_pdf'),  # ✅ Renamed for clarity
     path('<int:pk>/status/<str:action>/', views.update_file_status, name='update_file_status'),
+    path('review/', views.review_queue, name='review_queue'),
+    path('review/claim/', views.review_claim, name='review_claim'),
     path('notifications/', views.notifications_list, name='notifications'),
 ]
\ No newline at end of file
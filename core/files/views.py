@@ -1,16 +1,24 @@
+import hashlib
+import mimetypes
 import os
-import subprocess
+import shutil
+import tempfile
+import time
+import logging
+from contextlib import nullcontext
 from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse, Http404, HttpResponseForbidden, HttpResponse
+from django.http import Http404, HttpResponseForbidden, HttpResponse, JsonResponse
+from django.core.exceptions import PermissionDenied
 from django.conf import settings
 from django.contrib import messages
 from django.views.decorators.clickjacking import xframe_options_exempt
-from django.core.files import File
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.db import transaction
-from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
 
 from users.models import Profile
 from .models import (
@@ -18,33 +26,32 @@ from .models import (
     Comment,
     UploadedFileVersion,
     Notification,
+    FileChange,
+    ConversionEvent,
+    StatusCounter,
     FileStatus,
     ChangeTypes,
 )
 from .forms import UploadFileForm, CommentForm
+from .cache import fragment_generation, VERSIONS_BLOCK, COMMENTS_BLOCK
+from .quota import refresh_storage_usage
+from .ingest import install_ingest_handler
+from .converters import ConversionError
+from .formats import get_handler
+from .locks import SingleFlight, file_lock
+from .telemetry import record_conversion
+from .spreadsheet import list_sheets, read_range, RangeError
+from .pdf_optimize import optimize_pdf
+from .admission import Overloaded, admit, shed_load
+from . import scratch
+from .storage import serve
+from .tasks import defer
+from .review import queue_page, transition, claim, QUEUE_STATUSES
+from .notifications import notify_users, notify_super_reviewers, inbox_page, apply_action, encode_cursor
+from .extensions import TEXT_EXTENSIONS, EXCEL_EXTENSIONS
+
+logger = logging.getLogger(__name__)
 
-# Optional: docx / excel support
-try:
-    from docx import Document
-    DOCX_SUPPORTED = True
-except Exception:
-    DOCX_SUPPORTED = False
-
-try:
-    from openpyxl import load_workbook
-    EXCEL_SUPPORTED = True
-except Exception:
-    EXCEL_SUPPORTED = False
-
-
-# -------------------------
-# Helper: extension checks
-# -------------------------
-TEXT_EXTENSIONS = {'.txt', '.md', '.py', '.json', '.csv', '.html', '.css', '.js'}
-IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
-PDF_EXTENSIONS = {'.pdf'}
-DOCX_EXTENSIONS = {'.docx'}
-EXCEL_EXTENSIONS = {'.xlsx'}
 
 
 # -------------------------
@@ -73,98 +80,143 @@ def can_upload_files(user):
     return user.is_authenticated and (is_program_super_user(user) or is_auditor(user))
 
 
-def notify_users(user_qs, sender, notif_type, message, file_obj):
-    for recipient in user_qs:
-        Notification.objects.create(
-            recipient=recipient,
-            sender=sender,
-            notification_type=notif_type,
-            message=message,
-            related_file=file_obj,
-        )
-
-
-def notify_super_reviewers(file_obj, sender, notif_type, message,version):
-    reviewers = User.objects.filter(profile__role=Profile.Roles.SUPER_REVIEWER, is_active=True)
-    notify_users(reviewers, sender, notif_type, message, file_obj)
-
-
 # -------------------------
 # List / Upload / Detail
 # -------------------------
 @login_required
 def file_list(request):
-    files = UploadedFile.objects.all().order_by('-uploaded_at')
-    return render(request, 'file_list.html', {'files': files, 'FileStatus': FileStatus})
+    # ?sort=activity walks file_activity_idx; the default is newest upload first.
+    sort = 'activity' if request.GET.get('sort') == 'activity' else 'uploaded'
+    order = ('-last_activity_at', '-id') if sort == 'activity' else ('-uploaded_at',)
+    files = UploadedFile.objects.select_related('owner').order_by(*order)
+    return render(request, 'file_list.html', {
+        'files': files,
+        'sort': sort,
+        'FileStatus': FileStatus,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    })
 
 
+# The ingest handler has to be installed before CSRF checking reads
+# request.POST, so these views are CSRF-exempt on the outside and protected
+# on the inside. Permission is checked first, so an unauthorized upload is
+# refused before its body is read or profiled.
+@csrf_exempt
 @login_required
 def file_upload(request):
     if not can_upload_files(request.user):
         return HttpResponseForbidden("You are not allowed to upload files.")
+    ingest = install_ingest_handler(request) if request.method == 'POST' else None
+    return _file_upload(request, ingest)
 
+
+@csrf_protect
+def _file_upload(request, ingest):
+    error = None
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
-        if form.is_valid():
-            file_inst = form.save(commit=False)
-            file_inst.owner = request.user
-            file_inst.status = FileStatus.PENDING
-            file_inst.version_number = Decimal('1.0')
-            file_inst.reviewed_at = None
-            file_inst.reviewed_by = None
-            file_inst.save()
-            UploadedFileVersion.objects.create(
-                file=file_inst,
-                version_label=file_inst.version_label,
-                change_type=ChangeTypes.MAJOR,
-                comment="Initial upload",
-                created_by=request.user,
-            )
+        if ingest and ingest.rejected:
+            error = ingest.rejected
+        elif form.is_valid():
+            with transaction.atomic():
+                file_inst = form.save(commit=False)
+                if ingest:
+                    ingest.apply(file_inst)
+                file_inst.owner = request.user
+                file_inst.status = FileStatus.PENDING
+                file_inst.version_number = Decimal('1.0')
+                file_inst.reviewed_at = None
+                file_inst.reviewed_by = None
+                file_inst.save()
+                refresh_storage_usage(file_inst, new_file=True)
+                UploadedFileVersion.objects.create(
+                    file=file_inst,
+                    version_label=file_inst.version_label,
+                    change_type=ChangeTypes.MAJOR,
+                    comment="Initial upload",
+                    created_by=request.user,
+                    file_size=file_inst.file_size,
+                )
+                UploadedFile.record_activity(file_inst.pk, versions=1)
+                FileChange.record(file_inst, FileChange.Actions.CREATED)
 
-            notify_super_reviewers(
-                file_inst,
-                request.user,
-                Notification.Types.FILE_SUBMITTED,
-                f"{request.user.username} uploaded {file_inst.filename} (version {file_inst.version_label}).",
-                file_inst,
-            )
+                defer(
+                    notify_super_reviewers,
+                    file_inst,
+                    request.user,
+                    Notification.Types.FILE_SUBMITTED,
+                    f"{request.user.username} uploaded {file_inst.filename} (version {file_inst.version_label}).",
+                    file_inst,
+                )
 
             messages.success(request, "File uploaded.")
             return redirect('file_list')
     else:
         form = UploadFileForm()
-    return render(request, 'file_upload.html', {'form': form})
+    return render(request, 'file_upload.html', {'form': form, 'error': error})
 
 
 def file_detail(request, pk):
     """
-    Standard file detail view - shows file info, comments, and PDF preview
+    Standard file detail view - shows file info, comments, and PDF preview.
+    Version history and comments are fetched page by page from
+    file_versions / file_comments, so the page itself costs a fixed number
+    of queries however long the history is.
     """
-    file_obj = get_object_or_404(UploadedFile, pk=pk)
-    
-    comments = file_obj.comments.all().order_by('-created_at')
+    file_obj = get_object_or_404(UploadedFile.objects.select_related('owner', 'reviewed_by'), pk=pk)
+
     comment_form = CommentForm() if request.user.is_authenticated and request.user == file_obj.owner else None
-    versions = file_obj.versions.select_related('created_by')
 
     can_download_original = request.user.is_authenticated and request.user == file_obj.owner
     can_review = is_program_super_user(request.user)
 
     return render(request, 'file_detail.html', {
         'file': file_obj,
-        'comments': comments,
         'comment_form': comment_form,
-        'versions': versions,
         'can_download_original': can_download_original,
         'can_review': can_review,
         'FileStatus': FileStatus,
     })
 
 
+DETAIL_PAGE_SIZE = 20
+
+
+def _history_page(request, pk, queryset, template_name, block):
+    if not UploadedFile.objects.filter(pk=pk).exists():
+        raise Http404("File not found.")
+    page = Paginator(queryset, DETAIL_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, template_name, {
+        'file_id': pk,
+        'page_obj': page,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'generation': fragment_generation(pk, block),
+    })
+
+
+def file_versions(request, pk):
+    """One page of version history, as an HTML fragment for file_detail."""
+    versions = (
+        UploadedFileVersion.objects.filter(file_id=pk)
+        .select_related('created_by')
+        .order_by('-created_at', '-id')
+    )
+    return _history_page(request, pk, versions, 'files/versions_page.html', VERSIONS_BLOCK)
+
+
+def file_comments(request, pk):
+    """One page of comments, newest first, as an HTML fragment for file_detail."""
+    comments = (
+        Comment.objects.filter(file_id=pk)
+        .select_related('user')
+        .order_by('-created_at', '-id')
+    )
+    return _history_page(request, pk, comments, 'files/comments_page.html', COMMENTS_BLOCK)
+
+
 # -------------------------
 # PDF Serving Views
 # -------------------------
-from django.views.decorators.csrf import csrf_exempt
-
 @login_required
 @xframe_options_exempt
 def view_pdf(request, pk):
@@ -175,25 +227,16 @@ def view_pdf(request, pk):
       - 200 with the PDF stream, or
       - 404 if the converted PDF does not exist.
     """
-    from django.http import FileResponse
-
     file_obj = get_object_or_404(UploadedFile, pk=pk)
 
     # Expect a converted PDF to be present
     if not file_obj.converted:
         raise Http404("PDF not yet converted")
 
-    pdf_path = file_obj.converted.path
-
-    if not os.path.exists(pdf_path):
-        raise Http404("PDF file not found on server")
-
-    # Let Django stream the file; PDF.js works fine with this.
-    response = FileResponse(open(pdf_path, "rb"), content_type="application/pdf")
-    response["Content-Disposition"] = (
-        f'inline; filename="{file_obj.file_name_if_converted or "document.pdf"}"'
-    )
-    return response
+    # Streamed by Django, or a presigned redirect with object storage (the
+    # bucket then needs CORS for PDF.js's range requests).
+    return serve(file_obj.converted, file_obj.file_name_if_converted or "document.pdf",
+                 content_type="application/pdf")
 
 
 @login_required
@@ -205,22 +248,10 @@ def download_pdf(request, pk):
     
     if not file_obj.converted:
         raise Http404("PDF not found. Convert first.")
-    
-    try:
-        pdf_path = file_obj.converted.path
-        if not os.path.exists(pdf_path):
-            raise Http404("PDF file not found on server")
-        
-        response = FileResponse(
-            open(pdf_path, 'rb'),
-            content_type='application/pdf'
-        )
-        # Force download
-        response['Content-Disposition'] = f'attachment; filename="{file_obj.file_name_if_converted or "download.pdf"}"'
-        return response
-        
-    except Exception as e:
-        raise Http404(f"Error: {str(e)}")
+
+    # Force download
+    return serve(file_obj.converted, file_obj.file_name_if_converted or "download.pdf",
+                 as_attachment=True, content_type='application/pdf')
 
 
 @login_required
@@ -229,23 +260,37 @@ def download_original(request, pk):
     if request.user != file_obj.owner:
         return HttpResponseForbidden("Only the uploader can download the original file.")
 
-    file_path = file_obj.file.path
-    if not os.path.exists(file_path):
-        raise Http404("Original file not found on server.")
-
-    response = FileResponse(open(file_path, 'rb'), content_type='application/octet-stream')
-    response['Content-Disposition'] = f'attachment; filename="{file_obj.filename}"'
-    return response
+    # Text files keep a text content type so they can be compressed in transit.
+    name = file_obj.file.name
+    content_type = 'application/octet-stream'
+    if os.path.splitext(name)[1].lower() in TEXT_EXTENSIONS:
+        content_type = mimetypes.guess_type(name)[0] or 'text/plain'
+    return serve(file_obj.file, file_obj.filename, as_attachment=True, content_type=content_type)
 
 
 # -------------------------
 # Edit view — full support
 # -------------------------
+@csrf_exempt
 @login_required
+@shed_load()
 def file_edit(request, file_id):
+    ingest = None
+    if request.method == 'POST' and request.content_type == 'multipart/form-data':
+        row = UploadedFile.objects.filter(pk=file_id).values_list('owner_id', 'file_size', 'converted_size').first()
+        # Only the owner may replace the file (_file_edit refuses everyone
+        # else); a replacement frees the current original and converted PDF.
+        if row and row[0] == request.user.pk:
+            ingest = install_ingest_handler(request, credit=row[1] + row[2])
+    return _file_edit(request, file_id, ingest)
+
+
+@csrf_protect
+def _file_edit(request, file_id, ingest):
     """
     - Shows preview depending on file extension.
-    - Allows in-place editing for TEXT_EXTENSIONS via textarea (editable_text).
+    - Allows in-place editing via textarea (editable_text) for formats whose
+      handler in files.formats is editable.
     - Allows owner to replace file via UploadFileForm.
     """
     file_obj = get_object_or_404(UploadedFile, pk=file_id)
@@ -253,64 +298,15 @@ def file_edit(request, file_id):
     if request.user != file_obj.owner:
         return HttpResponseForbidden("You are not allowed to edit this file.")
 
-    # derive extension and path
+    # derive extension
     filename = file_obj.file.name
     extension = os.path.splitext(filename)[1].lower()
-    file_path = file_obj.file.path
-
-    # preview flags and content
-    editable_text = None
-    text_preview = None
-    image_preview = False
-    pdf_preview = False
-
-    # prepare previews/content
-    if extension in TEXT_EXTENSIONS:
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                editable_text = f.read()
-                text_preview = editable_text
-        except Exception as e:
-            text_preview = f"Unable to read file: {e}"
-
-    elif extension in IMAGE_EXTENSIONS:
-        image_preview = True
-
-    elif extension in PDF_EXTENSIONS:
-        pdf_preview = True
-
-    elif extension in DOCX_EXTENSIONS and DOCX_SUPPORTED:
-        # Basic DOCX editing: flatten paragraphs into text
-        try:
-            doc = Document(file_path)
-            paragraphs = [p.text for p in doc.paragraphs]
-            editable_text = "\n\n".join(paragraphs)
-            text_preview = editable_text
-        except Exception as e:
-            text_preview = f"Unable to read DOCX content: {e}"
-            editable_text = None
 
-    elif extension in EXCEL_EXTENSIONS and EXCEL_SUPPORTED:
-        # Basic Excel editing: render first sheet as CSV-like text
-        try:
-            wb = load_workbook(file_path)
-            ws = wb.active
-            rows_as_text = []
-            for row in ws.iter_rows():
-                values = []
-                for cell in row:
-                    v = "" if cell.value is None else str(cell.value)
-                    # simple escaping for commas
-                    if "," in v:
-                        v = f"\"{v}\""
-                    values.append(v)
-                # join cells by comma
-                rows_as_text.append(",".join(values))
-            editable_text = "\n".join(rows_as_text)
-            text_preview = editable_text
-        except Exception as e:
-            text_preview = f"Unable to read Excel content: {e}"
-            editable_text = None
+    # preview flags, from the format handler for this extension
+    handler = get_handler(extension)
+    image_preview = handler.preview == 'image'
+    pdf_preview = handler.preview == 'pdf'
+    spreadsheet_grid = handler.preview == 'grid' and handler.available()
 
     # POST handling
     if request.method == 'POST':
@@ -319,8 +315,6 @@ def file_edit(request, file_id):
             messages.error(request, "Select whether this edit is minor or major.")
             return redirect('file_edit', file_id=file_id)
 
-        reconvert_after_edit = False
-
         # Handle inline edits for supported types
         if 'edited_text' in request.POST:
             if request.user != file_obj.owner:
@@ -331,131 +325,117 @@ def file_edit(request, file_id):
             # Optional comment attached to this edit
             edit_comment_text = request.POST.get('edit_comment', '').strip()
 
+            staged_path = None
             try:
-                if extension in TEXT_EXTENSIONS:
-                    # Save plain text directly back to the file
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(new_text)
-
-                elif extension in DOCX_EXTENSIONS and DOCX_SUPPORTED:
-                    # Rebuild a simple DOCX document from the edited text
-                    doc = Document()
-                    for block in new_text.split("\n\n"):
-                        doc.add_paragraph(block.replace("\r\n", "\n"))
-                    doc.save(file_path)
-
-                elif extension in EXCEL_EXTENSIONS and EXCEL_SUPPORTED:
-                    # Rebuild an Excel workbook from CSV-like text
-                    wb = load_workbook(file_path)
-                    ws = wb.active
-
-                    # Clear existing content
-                    for row in ws.iter_rows():
-                        for cell in row:
-                            cell.value = None
-
-                    # Populate from edited text
-                    import csv
-                    from io import StringIO
-
-                    reader = csv.reader(StringIO(new_text))
-                    for r_idx, row in enumerate(reader, start=1):
-                        for c_idx, value in enumerate(row, start=1):
-                            ws.cell(row=r_idx, column=c_idx, value=value)
-
-                    wb.save(file_path)
-
-                else:
+                if not (handler.editable and handler.available()):
                     messages.error(request, "Inline editing not supported for this file type.")
                     return redirect('file_detail', pk=file_id)
-
-                # Update metadata / versioning
-                file_obj.bump_version(change_type)
-                file_obj.status = FileStatus.PENDING
-                file_obj.reviewed_at = None
-                file_obj.reviewed_by = None
-                file_obj.save()
-
-                UploadedFileVersion.objects.create(
-                    file=file_obj,
-                    version_label=file_obj.version_label,
-                    change_type=change_type,
-                    comment=edit_comment_text,
-                    created_by=request.user,
-                )
-
-                if edit_comment_text:
-                    Comment.objects.create(
+                # The editor works on a staged copy; the stored file is only
+                # replaced as the last step of the transaction below.
+                with _edit_admission(handler):
+                    staged_path = scratch.stage_copy(file_obj.file)
+                    file_obj.content_sha256 = handler.write(file_obj, staged_path, new_text)
+
+                # Update metadata / versioning in one transaction; reviewer
+                # notifications and PDF regeneration run after it commits.
+                with transaction.atomic():
+                    file_obj.resubmit(change_type)
+                    refresh_storage_usage(file_obj, file_size=os.path.getsize(staged_path))
+
+                    UploadedFileVersion.objects.create(
                         file=file_obj,
-                        user=request.user,
-                        text=f"[Version {file_obj.version_label}] {edit_comment_text}",
+                        version_label=file_obj.version_label,
+                        change_type=change_type,
+                        comment=edit_comment_text,
+                        created_by=request.user,
+                        file_size=file_obj.file_size,
                     )
+                    FileChange.record(file_obj, FileChange.Actions.EDITED)
+
+                    if edit_comment_text:
+                        Comment.objects.create(
+                            file=file_obj,
+                            user=request.user,
+                            text=f"[Version {file_obj.version_label}] {edit_comment_text}",
+                        )
+                    UploadedFile.record_activity(file_obj.pk, comments=1 if edit_comment_text else 0, versions=1)
+
+                    defer(
+                        notify_super_reviewers,
+                        file_obj,
+                        request.user,
+                        Notification.Types.FILE_SUBMITTED,
+                        f"{request.user.username} updated {file_obj.filename} to version {file_obj.version_label} ({change_type}).",
+                        file_obj,
+                    )
+                    if file_obj.converted:
+                        defer(_reconvert, file_obj.pk)
+                    scratch.publish(file_obj.file.storage, staged_path, file_obj.file.name)
 
                 messages.success(request, f"Changes saved (version {file_obj.version_label}).")
-                reconvert_after_edit = True
-
-                notify_super_reviewers(
-                    file_obj,
-                    request.user,
-                    Notification.Types.FILE_SUBMITTED,
-                    f"{request.user.username} updated {file_obj.filename} to version {file_obj.version_label} ({change_type}).",
-                    file_obj,
-                )
+                if file_obj.converted:
+                    messages.info(request, "The PDF is being regenerated in the background.")
+            except Overloaded:
+                raise  # @shed_load answers 503 with Retry-After
             except Exception as e:
                 messages.error(request, f"Failed to save changes: {e}")
-
-            if reconvert_after_edit and file_obj.converted:
-                success, feedback = _convert_with_libreoffice(file_obj)
-                if success:
-                    messages.success(request, f"PDF regenerated: {feedback}")
-                else:
-                    messages.warning(request, f"File saved, but PDF conversion failed: {feedback}")
+            finally:
+                if staged_path and os.path.exists(staged_path):
+                    os.remove(staged_path)
 
             return redirect('file_detail', pk=file_id)
 
         # Handle file replacement
         form = UploadFileForm(request.POST, request.FILES, instance=file_obj)
+        if ingest and ingest.rejected:
+            messages.error(request, ingest.rejected)
+            return redirect('file_edit', file_id=file_id)
         if form.is_valid():
-            # Remove old converted PDF if present
-            try:
-                if file_obj.converted and file_obj.converted.path and os.path.exists(file_obj.converted.path):
-                    os.remove(file_obj.converted.path)
-                    file_obj.converted = None
-                    file_obj.file_name_if_converted = ''
-            except Exception:
-                pass
-
-            file_inst = form.save(commit=False)
-            file_inst.owner = request.user
-            file_inst.status = FileStatus.PENDING
-            file_inst.reviewed_at = None
-            file_inst.reviewed_by = None
-            file_inst.bump_version(change_type)
-            file_inst.save()
-
-            note = request.POST.get('edit_comment', '').strip()
-            UploadedFileVersion.objects.create(
-                file=file_inst,
-                version_label=file_inst.version_label,
-                change_type=change_type,
-                comment=note,
-                created_by=request.user,
-            )
-
-            if note:
-                Comment.objects.create(
+            # The old converted PDF no longer matches; drop it once the
+            # replacement is committed.
+            stale_pdf = None
+            if file_obj.converted:
+                stale_pdf = file_obj.converted.name
+                file_obj.converted = None
+                file_obj.file_name_if_converted = ''
+
+            with transaction.atomic():
+                file_inst = form.save(commit=False)
+                if ingest:
+                    ingest.apply(file_inst)
+                file_inst.owner = request.user
+                file_inst.resubmit(change_type)
+                refresh_storage_usage(file_inst)
+
+                note = request.POST.get('edit_comment', '').strip()
+                UploadedFileVersion.objects.create(
                     file=file_inst,
-                    user=request.user,
-                    text=f"[Version {file_inst.version_label}] {note}",
+                    version_label=file_inst.version_label,
+                    change_type=change_type,
+                    comment=note,
+                    created_by=request.user,
+                    file_size=file_inst.file_size,
                 )
+                FileChange.record(file_inst, FileChange.Actions.REPLACED)
 
-            notify_super_reviewers(
-                file_inst,
-                request.user,
-                Notification.Types.FILE_SUBMITTED,
-                f"{request.user.username} replaced {file_inst.filename} (version {file_inst.version_label}).",
-                file_inst,
-            )
+                if note:
+                    Comment.objects.create(
+                        file=file_inst,
+                        user=request.user,
+                        text=f"[Version {file_inst.version_label}] {note}",
+                    )
+                UploadedFile.record_activity(file_inst.pk, comments=1 if note else 0, versions=1)
+
+                if stale_pdf:
+                    transaction.on_commit(lambda: _delete_quietly(stale_pdf))
+                defer(
+                    notify_super_reviewers,
+                    file_inst,
+                    request.user,
+                    Notification.Types.FILE_SUBMITTED,
+                    f"{request.user.username} replaced {file_inst.filename} (version {file_inst.version_label}).",
+                    file_inst,
+                )
 
             messages.success(request, f"File replaced. New version: {file_inst.version_label}.")
             return redirect('file_detail', pk=file_id)
@@ -465,6 +445,19 @@ def file_edit(request, file_id):
     else:
         form = UploadFileForm(instance=file_obj)
 
+    # Editable content, read only when the page is actually rendered.
+    editable_text = None
+    text_preview = None
+    if handler.editable and handler.available():
+        # Editors work on a local copy (the stored file itself on local disk).
+        with _edit_admission(handler):
+            try:
+                file_path = scratch.local_path(file_obj.file)
+            except OSError as e:
+                text_preview = f"Unable to read file: {e}"
+            else:
+                editable_text, text_preview = handler.read(file_obj, file_path)
+
     return render(request, 'edit_file.html', {
         'file': file_obj,
         'form': form,
@@ -473,10 +466,56 @@ def file_edit(request, file_id):
         'text_preview': text_preview,
         'image_preview': image_preview,
         'pdf_preview': pdf_preview,
+        'spreadsheet_grid': spreadsheet_grid,
         'ChangeTypes': ChangeTypes,
     })
 
 
+def _edit_admission(handler):
+    """Whole-document formats take a slot in the 'edit' admission pool."""
+    return admit('edit') if handler.heavy else nullcontext()
+
+
+# -------------------------
+# Spreadsheet grid API
+# -------------------------
+def _owned_spreadsheet_path(request, pk):
+    file_obj = get_object_or_404(UploadedFile, pk=pk)
+    if request.user != file_obj.owner:
+        raise PermissionDenied("Only the owner can read the spreadsheet cells.")
+    if os.path.splitext(file_obj.file.name)[1].lower() not in EXCEL_EXTENSIONS:
+        raise Http404("Not a spreadsheet")
+    try:
+        return scratch.local_path(file_obj.file)
+    except FileNotFoundError:
+        raise Http404("Spreadsheet not found on server")
+
+
+@login_required
+@shed_load(json=True)
+def sheet_list(request, pk):
+    path = _owned_spreadsheet_path(request, pk)
+    with admit('edit'):
+        sheets = list_sheets(path)
+    return JsonResponse({'sheets': sheets})
+
+
+@login_required
+@shed_load(json=True)
+def sheet_cells(request, pk, sheet):
+    """
+    Values for one window of a sheet: ?range=A1:Z200 (the default).
+    """
+    path = _owned_spreadsheet_path(request, pk)
+    try:
+        with admit('edit'):
+            data = read_range(path, sheet, request.GET.get('range', 'A1:Z200'))
+    except RangeError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    data['sheet'] = sheet
+    return JsonResponse(data)
+
+
 # -------------------------
 # Delete
 # -------------------------
@@ -486,21 +525,12 @@ def file_delete(request, pk):
     if request.user != file_obj.owner:
         return HttpResponseForbidden("You are not allowed to delete this file.")
 
-    # delete converted PDF if exists
-    try:
-        if file_obj.converted and file_obj.converted.path and os.path.exists(file_obj.converted.path):
-            os.remove(file_obj.converted.path)
-    except Exception:
-        pass
-
-    # delete original file
-    try:
-        if os.path.exists(file_obj.file.path):
-            os.remove(file_obj.file.path)
-    except Exception:
-        pass
-
-    file_obj.delete()
+    # UploadedFile.delete removes the original and converted PDF from disk.
+    # The feed entry and the delete commit together, so the feed never
+    # reports a file as deleted that is still there.
+    with transaction.atomic():
+        FileChange.record(file_obj, FileChange.Actions.DELETED)
+        file_obj.delete()
     messages.success(request, "File deleted.")
     return redirect('file_list')
 
@@ -508,87 +538,189 @@ def file_delete(request, pk):
 # -------------------------
 # Convert to PDF
 # -------------------------
-def _convert_with_libreoffice(file_obj):
+CONVERTED_DIR = 'converted'
+
+
+def _converted_storage_name(file_obj):
     """
-    Shared helper that runs LibreOffice headless conversion and updates the model.
+    converted/<base>-<pk>-v<version>.pdf: unique per file and version, so two
+    files that share a base name never collide.
+    """
+    base_name = os.path.splitext(os.path.basename(file_obj.file.name))[0]
+    return f"{CONVERTED_DIR}/{base_name}-{file_obj.pk}-v{file_obj.version_label}.pdf"
+
+
+LOCKS_DIR = '.locks'
+
+_conversions = SingleFlight()
+
+
+def _sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _convert_to_pdf(file_obj, background=False):
+    """
+    Shared helper that converts the file to PDF and updates the model.
     Returns (success: bool, message: str)
+
+    Concurrent requests for the same file and content are coalesced: threads
+    in this process share one in-flight conversion, and other processes wait
+    on a per-file lock and then reuse the PDF if it already matches. Actual
+    conversions run in a 'convert' admission slot and raise Overloaded when
+    none frees up in time (background tasks wait for one instead).
     """
-    input_path = file_obj.file.path
-    output_dir = os.path.join(settings.MEDIA_ROOT, 'converted')
-    os.makedirs(output_dir, exist_ok=True)
+    requested_at = time.perf_counter()
+    # Uploads and text edits record the hash as the bytes go by; only files
+    # rewritten by the DOCX/XLSX editors need hashing here.
+    digest = file_obj.content_sha256
+    if not digest:
+        try:
+            digest = _sha256_of(scratch.local_path(file_obj.file))
+        except OSError as e:
+            return False, f"Original file could not be read: {e}"
+    return _conversions.do(
+        (file_obj.pk, digest),
+        lambda: _convert_exclusive(file_obj.pk, digest, requested_at, background),
+    )
 
-    print(f"[DEBUG] Converting file: {input_path}")
-    print(f"[DEBUG] Output directory: {output_dir}")
 
-    try:
-        result = subprocess.run([
-            'soffice', '--headless', '--convert-to', 'pdf',
-            input_path, '--outdir', output_dir
-        ], check=True, capture_output=True, timeout=120)
+def _reconvert(pk):
+    """Background task: regenerate the PDF of an edited file."""
+    file_obj = UploadedFile.objects.filter(pk=pk).first()
+    if file_obj is None:
+        return
+    success, feedback = _convert_to_pdf(file_obj, background=True)
+    if not success:
+        logger.warning("PDF regeneration for file %s failed: %s", pk, feedback)
 
-        print(f"[DEBUG] LibreOffice stdout: {result.stdout.decode(errors='ignore')}")
-        print(f"[DEBUG] LibreOffice stderr: {result.stderr.decode(errors='ignore')}")
 
-    except subprocess.TimeoutExpired:
-        return False, "Conversion timed out after 120 seconds."
-    except subprocess.CalledProcessError as e:
-        error_output = e.stderr.decode(errors='ignore') if e.stderr else 'No error output'
-        print(f"[DEBUG] LibreOffice error: {error_output}")
-        return False, f"Conversion failed with error code {e.returncode}"
-    except Exception as e:
-        print(f"[DEBUG] Exception: {str(e)}")
-        return False, f"Conversion failed: {e}"
+def _delete_quietly(name):
+    try:
+        UploadedFile._meta.get_field('converted').storage.delete(name)
+    except Exception:
+        logger.warning("Could not delete stale PDF %s", name, exc_info=True)
+
+
+def _convert_exclusive(pk, digest, requested_at, background=False):
+    lock_path = os.path.join(settings.MEDIA_ROOT, CONVERTED_DIR, LOCKS_DIR, f"{pk}.lock")
+    with file_lock(lock_path):
+        queue_wait_ms = (time.perf_counter() - requested_at) * 1000
+        # Re-read under the lock: another process may have just converted it.
+        file_obj = UploadedFile.objects.filter(pk=pk).first()
+        if file_obj is None:
+            return False, "File no longer exists."
+        if (file_obj.converted and file_obj.converted_sha256 == digest
+                and file_obj.converted.storage.exists(file_obj.converted.name)):
+            record_conversion(
+                file_obj, _extension_of(file_obj), file_obj.file_size, ConversionEvent.Outcomes.REUSED,
+                queue_wait_ms=queue_wait_ms, output_size=file_obj.converted_size,
+            )
+            return True, f"PDF is already up to date ({file_obj.converted_size} bytes)"
+        with admit('convert', background=background):
+            queue_wait_ms = (time.perf_counter() - requested_at) * 1000
+            return _run_conversion(file_obj, digest, queue_wait_ms)
 
-    base_name = os.path.splitext(os.path.basename(input_path))[0]
-    converted_name = f"{base_name}.pdf"
-    converted_full = os.path.join(output_dir, converted_name)
 
-    print(f"[DEBUG] Looking for converted file: {converted_full}")
-    print(f"[DEBUG] File exists: {os.path.exists(converted_full)}")
+def _extension_of(file_obj):
+    return os.path.splitext(file_obj.file.name)[1].lower()
 
-    if not os.path.exists(converted_full):
-        return False, f"Conversion did not produce a PDF at: {converted_full}"
 
-    file_size = os.path.getsize(converted_full)
-    print(f"[DEBUG] Converted PDF size: {file_size} bytes")
+def _run_conversion(file_obj, digest, queue_wait_ms):
+    """
+    The converter registered for the extension (LibreOffice for Office
+    formats) reads a local copy of the original and writes into a private
+    per-job directory; the result is then published to storage in one step
+    (an atomic rename on local disk, an upload otherwise).
+    """
+    extension = _extension_of(file_obj)
+    converter = get_handler(extension).converter(extension)
+    storage = file_obj.converted.storage
+    job_dir = tempfile.mkdtemp(prefix=f"job-{file_obj.pk}-", dir=scratch.staging_root(storage, CONVERTED_DIR))
 
-    if file_size == 0:
-        return False, "Conversion produced an empty PDF file."
+    outcome = ConversionEvent.Outcomes.FAILED
+    runtime_ms = 0.0
+    file_size = 0
 
     try:
-        # Remove old converted file if it exists
-        if file_obj.converted:
-            try:
-                old_path = file_obj.converted.path
-                if old_path and os.path.exists(old_path):
-                    os.remove(old_path)
-            except Exception:
-                pass
+        try:
+            input_path = scratch.local_path(file_obj.file)
+        except OSError as e:
+            return False, f"Original file could not be read: {e}"
+        logger.debug("Converting %s with %s in %s", input_path, converter.__name__, job_dir)
+
+        started = time.perf_counter()
+        try:
+            staged_pdf = converter(input_path, job_dir)
+        except ConversionError as e:
+            return False, str(e)
+        except Exception as e:
+            logger.exception("Converter %s crashed on %s", converter.__name__, input_path)
+            return False, f"Conversion failed: {e}"
+        finally:
+            runtime_ms = (time.perf_counter() - started) * 1000
 
-        with open(converted_full, 'rb') as f:
-            file_obj.converted.save(converted_name, File(f), save=False)
+        base_name = os.path.splitext(os.path.basename(file_obj.file.name))[0]
 
-        file_obj.file_name_if_converted = converted_name
-        file_obj.save()
+        if not os.path.exists(staged_pdf):
+            return False, "Conversion did not produce a PDF."
 
-        print(f"[DEBUG] Model updated successfully")
-        print(f"[DEBUG] file_obj.converted.name: {file_obj.converted.name}")
-        print(f"[DEBUG] file_obj.converted.path: {file_obj.converted.path}")
+        if settings.PDF_LINEARIZE:
+            staged_pdf = optimize_pdf(staged_pdf)
 
-    except Exception as e:
-        print(f"[DEBUG] Model save exception: {str(e)}")
-        return False, f"Failed to save converted file to database: {e}"
+        file_size = os.path.getsize(staged_pdf)
+        if file_size == 0:
+            return False, "Conversion produced an empty PDF file."
 
-    return True, f"Converted to PDF successfully! ({file_size} bytes)"
+        try:
+            old_name = file_obj.converted.name if file_obj.converted else None
+            new_name = _converted_storage_name(file_obj)
+            scratch.publish(storage, staged_pdf, new_name)
+
+            file_obj.converted.name = new_name
+            file_obj.converted_sha256 = digest
+            file_obj.file_name_if_converted = f"{base_name}.pdf"
+            # Only the conversion's own columns: file_obj was loaded before a
+            # conversion that can take seconds, and a reviewer may have
+            # claimed or decided the file since.
+            file_obj.save(update_fields=['converted', 'converted_sha256', 'file_name_if_converted'])
+
+            # Drop the previous version's PDF only once the new one is in place.
+            if old_name and old_name != new_name:
+                try:
+                    file_obj.converted.storage.delete(old_name)
+                except OSError:
+                    pass
+
+            refresh_storage_usage(file_obj)
+            FileChange.record(file_obj, FileChange.Actions.CONVERTED)
+        except Exception as e:
+            logger.exception("Saving converted PDF for file %s failed", file_obj.pk)
+            return False, f"Failed to save converted file to database: {e}"
+
+        outcome = ConversionEvent.Outcomes.SUCCESS
+        return True, f"Converted to PDF successfully! ({file_size} bytes)"
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        record_conversion(
+            file_obj, extension, file_obj.file_size, outcome,
+            converter=converter.__name__, queue_wait_ms=queue_wait_ms,
+            runtime_ms=runtime_ms, output_size=file_size,
+        )
 
 
 @login_required
+@shed_load()
 def convert_to_pdf(request, pk):
     file_obj = get_object_or_404(UploadedFile, pk=pk)
     if request.user != file_obj.owner:
         return HttpResponseForbidden("No permission to convert.")
 
-    success, feedback = _convert_with_libreoffice(file_obj)
+    success, feedback = _convert_to_pdf(file_obj)
     if success:
         messages.success(request, feedback)
     else:
@@ -613,28 +745,34 @@ def update_file_status(request, pk, action):
         raise Http404("Unknown action")
 
     new_status = status_map[action]
-    file_obj.status = new_status
-    file_obj.reviewed_by = request.user
-    file_obj.reviewed_at = timezone.now()
-    file_obj.save()
+    # Notifications (to every active user on approval) go out in the
+    # background once the decision has committed.
+    with transaction.atomic():
+        if not transition(file_obj, new_status, request.user):
+            messages.error(request, "Another reviewer changed this file's status first. Reload and try again.")
+            return redirect('file_detail', pk=pk)
+        if action == 'approve':
+            defer(
+                notify_users,
+                User.objects.filter(is_active=True),
+                request.user,
+                Notification.Types.FILE_APPROVED,
+                f"{file_obj.filename} has been approved.",
+                file_obj,
+            )
+        elif action == 'reject':
+            defer(
+                notify_users,
+                User.objects.filter(id=file_obj.owner_id),
+                request.user,
+                Notification.Types.FILE_REJECTED,
+                f"{file_obj.filename} was rejected.",
+                file_obj,
+            )
 
     if action == 'approve':
-        notify_users(
-            User.objects.filter(is_active=True),
-            request.user,
-            Notification.Types.FILE_APPROVED,
-            f"{file_obj.filename} has been approved.",
-            file_obj,
-        )
         messages.success(request, "File approved.")
     elif action == 'reject':
-        notify_users(
-            User.objects.filter(id=file_obj.owner_id),
-            request.user,
-            Notification.Types.FILE_REJECTED,
-            f"{file_obj.filename} was rejected.",
-            file_obj,
-        )
         messages.warning(request, "File rejected.")
     else:
         messages.info(request, "File moved to in-review.")
@@ -642,47 +780,106 @@ def update_file_status(request, pk, action):
     return redirect('file_detail', pk=pk)
 
 
+# -------------------------
+# Reviewer queue
+# -------------------------
+@login_required
+def review_queue(request):
+    """
+    Work queue for super reviewers: pending (or in-review / "mine") files,
+    oldest first, with status totals from StatusCounter.
+    """
+    if not is_program_super_user(request.user):
+        return HttpResponseForbidden("Only program super users can review files.")
+
+    view = request.GET.get('view', FileStatus.PENDING)
+    if view == 'mine':
+        status, reviewer = FileStatus.IN_REVIEW, request.user
+    elif view in QUEUE_STATUSES:
+        status, reviewer = view, None
+    else:
+        raise Http404("Unknown queue.")
+
+    try:
+        files, next_cursor = queue_page(status, request.GET.get('cursor') or None, reviewer=reviewer)
+    except ValueError:
+        raise Http404("Invalid page.")
+
+    return render(request, 'review_queue.html', {
+        'files': files,
+        'next_cursor': next_cursor,
+        'view': view,
+        'counts': StatusCounter.totals(),
+        'FileStatus': FileStatus,
+    })
+
+
+@login_required
+def review_claim(request):
+    """Claim a specific pending file (``file``) or the oldest one."""
+    if not is_program_super_user(request.user):
+        return HttpResponseForbidden("Only program super users can review files.")
+    if request.method != 'POST':
+        raise Http404("Invalid method")
+
+    pk = request.POST.get('file')
+    file_obj = claim(request.user, int(pk) if pk and pk.isdigit() else None)
+    if file_obj is None:
+        if pk:
+            messages.warning(request, "That file was already claimed by another reviewer.")
+        else:
+            messages.info(request, "No pending files to claim.")
+        return redirect('review_queue')
+
+    messages.success(request, f"You are now reviewing {file_obj.filename}.")
+    return redirect('file_detail', pk=file_obj.pk)
+
+
 @login_required
 def notifications_list(request):
-    notifications = request.user.notifications.select_related('sender', 'related_file').order_by('-created_at')
+    """
+    Inbox, newest first, one keyset page at a time (?cursor=...). Bulk
+    actions apply to the checked ids, or with ``up_to`` to every
+    notification up to and including that one.
+    """
+    cursor = request.GET.get('cursor') or None
 
     if request.method == 'POST':
         action = request.POST.get('action')
-        notification_id = request.POST.get('notification_id')
+        ids = request.POST.getlist('ids')
+        up_to = request.POST.get('up_to') or None
 
         if action == 'read_all':
-            count = notifications.filter(is_read=False).update(is_read=True)
-            if count:
-                messages.success(request, f"Marked {count} notification(s) as read.")
-            else:
+            action, ids = 'mark_read', None
+            if not up_to:
                 messages.info(request, "No unread notifications.")
-            return redirect('notifications')
+                return redirect('notifications')
 
-        if not notification_id:
+        try:
+            count = apply_action(request.user, action, ids=ids, up_to=up_to)
+        except ValueError:
             messages.error(request, "Invalid notification request.")
-            return redirect('notifications')
-
-        notif = get_object_or_404(Notification, pk=notification_id, recipient=request.user)
-
-        if action == 'mark_read':
-            if not notif.is_read:
-                notif.is_read = True
-                notif.save(update_fields=['is_read'])
-            messages.success(request, "Notification marked as read.")
-        elif action == 'mark_unread':
-            if notif.is_read:
-                notif.is_read = False
-                notif.save(update_fields=['is_read'])
-            messages.success(request, "Notification marked as unread.")
-        elif action == 'dismiss':
-            notif.delete()
-            messages.success(request, "Notification dismissed.")
         else:
-            messages.error(request, "Unknown notification action.")
+            verb = {'mark_read': "marked as read", 'mark_unread': "marked as unread", 'dismiss': "dismissed"}[action]
+            if count:
+                messages.success(request, f"{count} notification(s) {verb}.")
+            else:
+                messages.info(request, "Nothing to update.")
 
-        return redirect('notifications')
+        url = reverse('notifications')
+        return redirect(f"{url}?cursor={cursor}" if cursor else url)
 
-    return render(request, 'notifications.html', {'notifications': notifications})
+    try:
+        notifications, next_cursor = inbox_page(request.user, cursor)
+    except ValueError:
+        raise Http404("Invalid page.")
+
+    return render(request, 'notifications.html', {
+        'notifications': notifications,
+        'next_cursor': next_cursor,
+        'cursor': cursor,
+        'newest_cursor': encode_cursor(notifications[0]) if notifications and not cursor else None,
+    })
 
 
 # -------------------------
@@ -702,7 +899,10 @@ def add_comment(request, pk):
         comment = form.save(commit=False)
         comment.file = file_obj
         comment.user = request.user
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            UploadedFile.record_activity(file_obj.pk, comments=1)
+            FileChange.record(file_obj, FileChange.Actions.COMMENTED)
         messages.success(request, "Comment added.")
     else:
         messages.error(request, "Comment failed.")
@@ -1,3 +1,39 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from files.models import UserActivity
+from .views import directory_page
+
+
+class DirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for n in range(7):
+            User.objects.create_user(f'user{n}', password='x')
+        profile = User.objects.get(username='user3').profile
+        profile.display_name = 'Zed Example'
+        profile.save()
+        UserActivity.adjust(User.objects.get(username='user5').pk, pending_reviews=2, unread_notifications=1)
+
+    def test_keyset_pages_cover_every_user_once(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = directory_page(cursor=cursor, limit=3)
+            seen.extend(user.username for user in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(User.objects.values_list('username', flat=True)))
+
+    def test_search_matches_username_or_display_name(self):
+        self.assertEqual([u.username for u in directory_page('zed')[0]], ['user3'])
+        self.assertEqual([u.username for u in directory_page('USER6')[0]], ['user6'])
+
+    def test_stats_come_from_maintained_counters(self):
+        user = directory_page('user5')[0][0]
+        self.assertEqual((user.files_uploaded, user.pending_reviews, user.unread_notifications), (0, 2, 1))
+
+    def test_pages_need_login_and_reject_bad_cursors(self):
+        self.assertEqual(self.client.get('/users/').status_code, 302)
+        self.client.force_login(User.objects.get(username='user0'))
+        self.assertEqual(self.client.get('/users/').status_code, 200)
+        self.assertEqual(self.client.get('/users/', {'cursor': 'zzzz'}).status_code, 404)
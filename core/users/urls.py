@@ -5,6 +5,4 @@ from . import views
 urlpatterns = [
     path('', views.user_list, name='user_list'),
     path('profile/<int:user_id>/', views.profile_detail, name='profile_detail'),
-    path('notifications/', views.notifications_list, name='notifications'),
-    path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='notification_mark_read'),
 ]
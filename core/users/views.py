@@ -1,32 +1,68 @@
 # users/views.py
 
-from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.auth.models import User
+from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.http import Http404
 
-from files.models import Notification
+from files.models import UploadedFile
+from files.pagination import encode_key, decode_key, InvalidCursor
 
-def user_list(request):
-    users = User.objects.all().order_by('username')
-    return render(request, 'users/user_list.html', {'users': users})
+DIRECTORY_PAGE_SIZE = 50
+PROFILE_FILES_SHOWN = 50
 
-def profile_detail(request, user_id):
-    user = get_object_or_404(User, id=user_id)
-    return render(request, 'users/profile_detail.html', {'profile_user': user})
+
+def _with_stats(users):
+    """
+    Per-user counts from the maintained UserStorage / UserActivity rows: one
+    LEFT JOIN each, however many users are on the page.
+    """
+    return users.select_related('profile').annotate(
+        files_uploaded=Coalesce('storage__file_count', 0),
+        pending_reviews=Coalesce('activity__pending_reviews', 0),
+        unread_notifications=Coalesce('activity__unread_notifications', 0),
+    )
+
+
+def directory_page(query='', cursor=None, limit=DIRECTORY_PAGE_SIZE):
+    """
+    Users ordered by username, keyset-paged, optionally filtered by a
+    username / display name substring. Returns (users, next_cursor).
+    """
+    users = _with_stats(User.objects.all()).order_by('username')
+    if query:
+        users = users.filter(Q(username__icontains=query) | Q(profile__display_name__icontains=query))
+    if cursor:
+        users = users.filter(username__gt=decode_key(cursor))
+
+    rows = list(users[:limit + 1])
+    page = rows[:limit]
+    next_cursor = encode_key(page[-1].username) if len(rows) > limit else None
+    return page, next_cursor
 
 
 @login_required
-def notifications_list(request):
-    notifications = request.user.notifications.select_related('sender', 'related_file')
-    if request.method == 'POST':
-        request.user.notifications.filter(is_read=False).update(is_read=True)
-        return redirect('notifications')
-    return render(request, 'users/notifications.html', {'notifications': notifications})
+def user_list(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        users, next_cursor = directory_page(query, request.GET.get('cursor') or None)
+    except InvalidCursor:
+        raise Http404("Invalid page.")
+    return render(request, 'users/user_list.html', {
+        'users': users,
+        'query': query,
+        'next_cursor': next_cursor,
+    })
 
 
 @login_required
-def mark_notification_read(request, notification_id):
-    notification = get_object_or_404(Notification, pk=notification_id, recipient=request.user)
-    notification.is_read = True
-    notification.save()
-    return redirect('notifications')
+def profile_detail(request, user_id):
+    user = get_object_or_404(_with_stats(User.objects.all()), id=user_id)
+    files = (
+        UploadedFile.objects.filter(owner=user)
+        .only('id', 'filename', 'uploaded_at', 'converted')
+        .order_by('-uploaded_at')[:PROFILE_FILES_SHOWN]
+    )
+    return render(request, 'users/profile_detail.html', {'profile_user': user, 'files': files})